@@ -0,0 +1,190 @@
+"""
+Attendance storage migration
+Converts records that still hold ISO-string date/in_time/out_time into
+BSON Dates plus the integer day key (see models.Attendance), then drops the
+old string-date indexes.
+
+Runs in _id-ordered batches with one guarded update per record, so it is
+safe to stop and rerun, and a record changed mid-batch is simply left for
+the next pass. The API runs it at startup before building indexes.
+
+dedupe_attendance() merges records that share an (employee_id, day), left
+behind by the old racy mark-in, so the unique day index can be built.
+
+With several uvicorn workers only one runs these steps at startup: it holds
+a MigrationLock while the others wait for it to finish.
+
+Usage (from backend/):
+    python attendance_migration.py migrate
+    python attendance_migration.py status   # count records still in the old format
+    python attendance_migration.py dedupe   # merge duplicate employee-days
+"""
+
+import asyncio
+import sys
+from datetime import datetime, timedelta
+
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+import sync_utils
+from models import Attendance
+
+MIGRATION_BATCH_SIZE = 1000
+# A worker that died mid-migration stops blocking the others after this
+MIGRATION_LOCK_LEASE = timedelta(minutes=10)
+
+LEGACY_QUERY = {"$or": [
+    {"day": {"$exists": False}},
+    {"date": {"$type": "string"}},
+    {"in_time": {"$type": "string"}},
+    {"out_time": {"$type": "string"}}
+]}
+
+# Indexes over the old string dates, superseded by employee_day_unique / day
+LEGACY_INDEXES = ["employee_date_unique", "date"]
+
+
+async def count_legacy(attendance_collection) -> int:
+    return await attendance_collection.count_documents(LEGACY_QUERY)
+
+
+async def migrate_attendance(attendance_collection, batch_size: int = MIGRATION_BATCH_SIZE) -> int:
+    """Convert legacy records in place; returns how many were updated"""
+    migrated = 0
+    skipped = 0
+    last_id = None
+
+    while True:
+        query = LEGACY_QUERY if last_id is None else {"$and": [LEGACY_QUERY, {"_id": {"$gt": last_id}}]}
+        batch = await attendance_collection.find(query).sort("_id", 1).limit(batch_size).to_list(length=None)
+        if not batch:
+            break
+        last_id = batch[-1]["_id"]
+
+        operations = []
+        for document in batch:
+            try:
+                native = Attendance.from_legacy(document).to_mongo()
+            except (KeyError, TypeError, ValueError) as e:
+                skipped += 1
+                print(f"⚠️  Skipping attendance record {document['_id']}: {e}")
+                continue
+
+            # Only if nobody rewrote the record since we read it
+            guard = {"_id": document["_id"]}
+            for field in ("date", "in_time", "out_time"):
+                guard[field] = document.get(field)
+            operations.append(UpdateOne(guard, {"$set": native}))
+
+        if operations:
+            result = await attendance_collection.bulk_write(operations, ordered=False)
+            migrated += result.modified_count
+
+    if migrated or skipped:
+        print(f"✅ Migrated {migrated} attendance records to native dates ({skipped} skipped)")
+
+    if await count_legacy(attendance_collection) == 0:
+        existing = await attendance_collection.index_information()
+        for name in LEGACY_INDEXES:
+            if name in existing:
+                await attendance_collection.drop_index(name)
+                print(f"✅ Dropped legacy attendance index {name}")
+
+    return migrated
+
+
+def merge_day(records: list) -> dict:
+    """$set for the record kept for a day: earliest IN and latest OUT of records"""
+    in_time = min((r["in_time"] for r in records if r.get("in_time")), default=None)
+    out_time = max((r["out_time"] for r in records if r.get("out_time")), default=None)
+    merged = {"updated_at": sync_utils.now()}
+    if in_time:
+        merged.update(in_time=in_time, status="present")
+    if out_time:
+        merged["out_time"] = out_time
+    if in_time and out_time:
+        merged["hours_worked"] = round((out_time - in_time).total_seconds() / 3600, 2)
+    return merged
+
+
+async def dedupe_attendance(attendance_collection, tombstones=None) -> int:
+    """
+    Merge duplicate employee-days into their oldest record, which keeps the
+    earliest IN and latest OUT; returns how many duplicates were removed.
+    Does nothing once the unique day index exists.
+    """
+    if "employee_day_unique" in await attendance_collection.index_information():
+        return 0
+
+    # Records migrate_attendance() could not convert have no day to group on
+    unparseable = await attendance_collection.count_documents({"day": None})
+    if unparseable:
+        print(f"⚠️  {unparseable} attendance records have no day and were not deduplicated; "
+              "fix them and rerun `python attendance_migration.py migrate`")
+
+    removed = 0
+    duplicates = attendance_collection.aggregate([
+        {"$match": {"day": {"$ne": None}}},
+        {"$group": {"_id": {"employee_id": "$employee_id", "day": "$day"}, "ids": {"$push": "$_id"}}},
+        {"$match": {"ids.1": {"$exists": True}}}
+    ], allowDiskUse=True)
+
+    async for group in duplicates:
+        records = await attendance_collection.find({"_id": {"$in": group["ids"]}}).sort("_id", 1).to_list(length=None)
+        keeper, extras = records[0], records[1:]
+
+        extra_ids = [r["_id"] for r in extras]
+        await attendance_collection.update_one({"_id": keeper["_id"]}, {"$set": merge_day(records)})
+        await attendance_collection.delete_many({"_id": {"$in": extra_ids}})
+        if tombstones is not None:
+            await tombstones.record("attendance", keeper["employee_id"], extra_ids)
+        removed += len(extra_ids)
+
+    if removed:
+        print(f"✅ Merged {removed} duplicate attendance records")
+    return removed
+
+
+class MigrationLock:
+    """Lease in a Mongo collection, so one process at a time runs the startup migration"""
+
+    def __init__(self, collection, name: str = "attendance"):
+        self.collection = collection
+        self.name = name
+
+    async def acquire(self) -> bool:
+        now = datetime.utcnow()
+        try:
+            await self.collection.insert_one({"_id": self.name, "expires_at": now + MIGRATION_LOCK_LEASE})
+            return True
+        except DuplicateKeyError:
+            # Take over a lease its holder never released
+            taken = await self.collection.find_one_and_update(
+                {"_id": self.name, "expires_at": {"$lt": now}},
+                {"$set": {"expires_at": now + MIGRATION_LOCK_LEASE}}
+            )
+            return taken is not None
+
+    async def release(self):
+        await self.collection.delete_one({"_id": self.name})
+
+    async def wait(self, poll_seconds: float = 1.0):
+        """Block until whoever holds the lock releases it or its lease runs out"""
+        while await self.collection.find_one({"_id": self.name, "expires_at": {"$gte": datetime.utcnow()}}):
+            await asyncio.sleep(poll_seconds)
+
+
+if __name__ == "__main__":
+    from database import attendance_collection, sync_tombstones_collection
+
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+    if command == "migrate":
+        asyncio.run(migrate_attendance(attendance_collection))
+    elif command == "status":
+        print(f"{asyncio.run(count_legacy(attendance_collection))} attendance records in the old format")
+    elif command == "dedupe":
+        asyncio.run(dedupe_attendance(attendance_collection, sync_utils.Tombstones(sync_tombstones_collection)))
+        print("Rebuild the summaries afterwards: python rollup_utils.py rebuild")
+    else:
+        print(__doc__)
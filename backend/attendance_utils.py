@@ -0,0 +1,177 @@
+"""
+Attendance aggregation utility
+Builds the single server-side pipeline behind the admin attendance views.
+
+Attendance documents store date/in_time/out_time as BSON Dates (naive
+server-local times, like datetime.now()) plus an integer day key,
+YYYYMMDD, which range queries and the unique index use. The API keeps
+returning ISO strings, see render_day() and serialize_record().
+"""
+
+from datetime import date, datetime
+
+
+def day_key(day: date) -> int:
+    return day.year * 10000 + day.month * 100 + day.day
+
+
+def day_key_from_iso(date_str: str) -> int:
+    return day_key(date.fromisoformat(date_str[:10]))
+
+
+def iso_from_day_key(key: int) -> str:
+    return f"{key // 10000:04d}-{key // 100 % 100:02d}-{key % 100:02d}"
+
+
+def day_fields(day: date) -> dict:
+    """The day and date fields of the record for a calendar day"""
+    return {"day": day_key(day), "date": datetime(day.year, day.month, day.day)}
+
+
+def day_range_query(start_date_str: str, end_date_str: str) -> dict:
+    """Filter for [start, end) given as ISO dates"""
+    return {"day": {"$gte": day_key_from_iso(start_date_str), "$lt": day_key_from_iso(end_date_str)}}
+
+
+def parse_timestamp(value):
+    """datetime from a stored value (legacy records hold ISO strings)"""
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(value)
+
+
+def render_day(record: dict) -> dict:
+    """date back to the plain YYYY-MM-DD clients expect (it is stored as midnight)"""
+    if isinstance(record.get("date"), datetime):
+        record["date"] = record["date"].date().isoformat()
+    return record
+
+
+def serialize_record(record: dict) -> dict:
+    """Render every Date field as an ISO string, for non-JSON output like CSV"""
+    render_day(record)
+    for field in ("in_time", "out_time"):
+        if isinstance(record.get(field), datetime):
+            record[field] = record[field].isoformat()
+    return record
+
+
+# Mirrors calculate_hours(): keep a stored hours_worked, otherwise derive it
+# from in_time/out_time, and count open records as 0 hours
+HOURS_WORKED_EXPR = {
+    "$cond": {
+        "if": {"$and": [{"$gt": ["$in_time", None]}, {"$gt": ["$out_time", None]}]},
+        "then": {
+            "$cond": {
+                "if": {"$gt": [{"$ifNull": ["$hours_worked", 0]}, 0]},
+                "then": "$hours_worked",
+                "else": {
+                    "$ifNull": [
+                        {"$round": [
+                            {"$divide": [{"$subtract": ["$out_time", "$in_time"]}, 3600000]},
+                            2
+                        ]},
+                        0.0
+                    ]
+                }
+            }
+        },
+        "else": 0.0
+    }
+}
+
+
+def record_hours(record: dict) -> float:
+    """HOURS_WORKED_EXPR for a record already in memory"""
+    in_time, out_time = parse_timestamp(record.get("in_time")), parse_timestamp(record.get("out_time"))
+    if in_time is None or out_time is None:
+        return 0.0
+    if (record.get("hours_worked") or 0) > 0:
+        return record["hours_worked"]
+    return round((out_time - in_time).total_seconds() / 3600, 2)
+
+
+def hours_until_expr(out_time: datetime) -> dict:
+    """Update-pipeline expression for the hours between the stored in_time and out_time"""
+    return {
+        "$ifNull": [
+            {"$round": [
+                {"$divide": [{"$subtract": [out_time, "$in_time"]}, 3600000]},
+                2
+            ]},
+            0.0
+        ]
+    }
+
+
+def build_attendance_pipeline(start_date_str: str, end_date_str: str) -> list:
+    """
+    One pass over the date range: records are grouped per employee
+    (newest first) together with their summary totals
+    """
+    return [
+        {"$match": day_range_query(start_date_str, end_date_str)},
+        {"$sort": {"day": -1}},
+        {"$addFields": {"hours_worked": HOURS_WORKED_EXPR}},
+        {"$group": {
+            "_id": "$employee_id",
+            "records": {"$push": "$$ROOT"},
+            "total_hours": {"$sum": "$hours_worked"},
+            "present_days": {"$sum": {"$cond": [{"$eq": ["$status", "present"]}, 1, 0]}},
+            "total_days": {"$sum": 1}
+        }}
+    ]
+
+
+def format_attendance_record(record: dict) -> dict:
+    """Add the display times used by the dashboard"""
+    if record.get("in_time"):
+        record["in_time_display"] = record["in_time"].strftime("%I:%M %p")
+    else:
+        record["in_time_display"] = "-"
+
+    if record.get("out_time"):
+        record["out_time_display"] = record["out_time"].strftime("%I:%M %p")
+    else:
+        record["out_time_display"] = "-"
+
+    return render_day(record)
+
+
+async def fetch_attendance_groups(attendance_collection, start_date_str: str, end_date_str: str) -> dict:
+    """Run the attendance pipeline once, keyed by employee_id"""
+    grouped = {}
+    cursor = attendance_collection.aggregate(
+        build_attendance_pipeline(start_date_str, end_date_str),
+        allowDiskUse=True
+    )
+    async for group in cursor:
+        grouped[group["_id"]] = group
+    return grouped
+
+
+def join_attendance(employees: list, grouped: dict, summaries: dict = None) -> list:
+    """
+    In-memory join of the grouped attendance against the employee list.
+    Employees without records still get an empty entry.
+    summaries (from the rollups) replaces the totals computed by the pipeline.
+    """
+    empty = {"total_hours": 0.0, "present_days": 0, "total_days": 0}
+    attendance_data = []
+    for employee in employees:
+        group = grouped.get(employee["id"])
+        records = [format_attendance_record(r) for r in group["records"]] if group else []
+
+        attendance_data.append({
+            "employee_id": employee["id"],
+            "employee_name": employee["name"],
+            "email": employee["email"],
+            "records": records,
+            "summary": summaries.get(employee["id"], empty) if summaries is not None else {
+                "total_hours": round(group["total_hours"], 2) if group else 0.0,
+                "present_days": group["present_days"] if group else 0,
+                "total_days": group["total_days"] if group else 0
+            }
+        })
+
+    return attendance_data
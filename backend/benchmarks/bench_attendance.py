@@ -0,0 +1,105 @@
+"""
+Benchmark: GET /attendance/all month view, per-employee queries vs one aggregation
+Run from backend/:  python -m benchmarks.bench_attendance [--output FILE]
+Uses a scratch database on MONGODB_URL that is dropped afterwards.
+"""
+
+import argparse
+import asyncio
+import time
+from datetime import date, datetime, timedelta
+
+from database import client
+from attendance_utils import day_fields, day_range_query, fetch_attendance_groups, join_attendance, format_attendance_record
+from benchmarks.results import save_results
+
+BENCH_DB = "myapp_db_bench"
+EMPLOYEE_COUNTS = [10, 100, 1000]
+DAYS = 22
+RUNS = 5
+
+
+async def seed(db, employee_count: int):
+    await db.employees.delete_many({})
+    await db.attendance.delete_many({})
+
+    await db.employees.insert_many([
+        {"id": i, "name": f"Employee {i}", "email": f"emp{i}@example.com", "password_hash": "x"}
+        for i in range(1, employee_count + 1)
+    ])
+
+    first_day = date.today().replace(day=1)
+    records = []
+    for i in range(1, employee_count + 1):
+        for d in range(DAYS):
+            day = first_day + timedelta(days=d)
+            in_time = datetime(day.year, day.month, day.day, 9, 0)
+            out_time = in_time + timedelta(hours=8, minutes=i % 60)
+            records.append({
+                "employee_id": i,
+                **day_fields(day),
+                "in_time": in_time,
+                "out_time": out_time,
+                "status": "present"
+            })
+    await db.attendance.insert_many(records)
+
+
+async def per_employee_queries(db, start: str, end: str) -> list:
+    """The previous implementation: one attendance query per employee"""
+    attendance_data = []
+    async for employee in db.employees.find():
+        records = []
+        async for record in db.attendance.find({
+            "employee_id": employee["id"],
+            **day_range_query(start, end)
+        }).sort("day", -1):
+            records.append(format_attendance_record(record))
+        attendance_data.append({"employee_id": employee["id"], "records": records})
+    return attendance_data
+
+
+async def single_aggregation(db, start: str, end: str) -> list:
+    employees, grouped = await asyncio.gather(
+        db.employees.find({}, {"id": 1, "name": 1, "email": 1}).to_list(length=None),
+        fetch_attendance_groups(db.attendance, start, end)
+    )
+    return join_attendance(employees, grouped)
+
+
+async def timed(fn, *args) -> float:
+    best = float("inf")
+    for _ in range(RUNS):
+        started = time.perf_counter()
+        await fn(*args)
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+async def main(output: str = None):
+    db = client[BENCH_DB]
+    results = {}
+    first_day = date.today().replace(day=1)
+    start, end = first_day.isoformat(), (first_day + timedelta(days=32)).replace(day=1).isoformat()
+
+    print(f"{'employees':>10} {'per-employee (ms)':>18} {'aggregation (ms)':>17} {'speedup':>8}")
+    try:
+        for count in EMPLOYEE_COUNTS:
+            await seed(db, count)
+            legacy = await timed(per_employee_queries, db, start, end)
+            grouped = await timed(single_aggregation, db, start, end)
+            print(f"{count:>10} {legacy:>18.1f} {grouped:>17.1f} {legacy / grouped:>7.1f}x")
+            results[f"employees_{count}"] = {
+                "per_employee_ms": round(legacy, 3),
+                "aggregation_ms": round(grouped, 3)
+            }
+    finally:
+        await client.drop_database(BENCH_DB)
+
+    save_results("attendance", {"days": DAYS, **results}, output)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="GET /attendance/all query strategy benchmark")
+    parser.add_argument("--output", help="results file (default benchmarks/results/attendance-<timestamp>.json)")
+    asyncio.run(main(parser.parse_args().output))
@@ -0,0 +1,95 @@
+"""
+Benchmark: geofence checks, per-site haversine loop vs spatial index + NumPy batch
+Run from backend/:  python -m benchmarks.bench_geofence [--output FILE]
+Needs no database.
+"""
+
+import argparse
+import random
+import time
+
+import location_utils
+from location_utils import GeofenceSite, calculate_distance, check_locations, is_location_allowed, set_sites
+from benchmarks.results import save_results
+
+SITE_COUNTS = [2, 50, 500]
+POINTS = 10000
+RUNS = 3
+
+
+def make_sites(count: int, rng: random.Random) -> list:
+    # Spread across the Indian coastline's bounding box
+    return [
+        {
+            "name": f"Site {i}",
+            "latitude": rng.uniform(8.0, 23.0),
+            "longitude": rng.uniform(68.0, 89.0),
+            "radius_meters": rng.choice([100, 250, 500])
+        }
+        for i in range(count)
+    ]
+
+
+def legacy_check(sites: list, latitude: float, longitude: float):
+    """The previous implementation: haversine against every site in turn"""
+    for site in sites:
+        distance = calculate_distance(latitude, longitude, site["latitude"], site["longitude"])
+        if distance <= site["radius_meters"]:
+            return site["name"]
+    return None
+
+
+def best_of(fn) -> float:
+    best = float("inf")
+    for _ in range(RUNS):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def main(output: str = None):
+    rng = random.Random(42)
+    results = {"points": POINTS}
+    print(f"{'sites':>6} {'loop (ms)':>10} {'indexed (ms)':>13} {'batch (ms)':>11} {'mismatches':>11}")
+
+    for count in SITE_COUNTS:
+        sites = make_sites(count, rng)
+        set_sites([GeofenceSite.from_dict(site) for site in sites])
+
+        # Half the points land inside a site, half anywhere in the box
+        latitudes, longitudes = [], []
+        for i in range(POINTS):
+            if i % 2:
+                site = rng.choice(sites)
+                latitudes.append(site["latitude"] + rng.uniform(-0.002, 0.002))
+                longitudes.append(site["longitude"] + rng.uniform(-0.002, 0.002))
+            else:
+                latitudes.append(rng.uniform(8.0, 23.0))
+                longitudes.append(rng.uniform(68.0, 89.0))
+        points = list(zip(latitudes, longitudes))
+
+        loop = best_of(lambda: [legacy_check(sites, lat, lon) for lat, lon in points])
+        indexed = best_of(lambda: [is_location_allowed(lat, lon) for lat, lon in points])
+        batch = best_of(lambda: check_locations(latitudes, longitudes))
+
+        expected = [legacy_check(sites, lat, lon) for lat, lon in points]
+        actual = check_locations(latitudes, longitudes)["location_name"]
+        mismatches = sum(1 for a, b in zip(expected, actual) if a != b)
+
+        print(f"{count:>6} {loop:>10.1f} {indexed:>13.1f} {batch:>11.1f} {mismatches:>11}")
+        results[f"sites_{count}"] = {
+            "loop_ms": round(loop, 3),
+            "indexed_ms": round(indexed, 3),
+            "batch_ms": round(batch, 3),
+            "mismatches": mismatches
+        }
+
+    set_sites(location_utils.load_configured_sites())
+    save_results("geofence", results, output)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Geofence check benchmark")
+    parser.add_argument("--output", help="results file (default benchmarks/results/geofence-<timestamp>.json)")
+    main(parser.parse_args().output)
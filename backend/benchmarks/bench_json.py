@@ -0,0 +1,94 @@
+"""
+Benchmark: serializing a 10k-record attendance payload
+  legacy - stringify _id in a loop, jsonable_encoder, then JSONResponse's json.dumps
+  orjson - render_day (date back to YYYY-MM-DD) then MongoJSONResponse on the raw documents
+Run from backend/:  python -m benchmarks.bench_json [--records 10000] [--output FILE]
+Needs no database.
+"""
+
+import argparse
+import time
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from attendance_utils import day_fields, render_day
+from json_utils import MongoJSONResponse
+from benchmarks.results import save_results
+
+RUNS = 5
+
+
+def make_records(count: int) -> list:
+    first_day = datetime(2025, 1, 1)
+    records = []
+    for i in range(count):
+        day = (first_day + timedelta(days=i % 365)).date()
+        in_time = datetime(day.year, day.month, day.day, 9, i % 60)
+        records.append({
+            "_id": ObjectId(),
+            "employee_id": i % 500,
+            **day_fields(day),
+            "in_time": in_time,
+            "out_time": in_time + timedelta(hours=8, minutes=30),
+            "hours_worked": 8.5,
+            "status": "present"
+        })
+    return records
+
+
+def legacy_render(records: list) -> bytes:
+    # Stored ISO strings meant only _id needed converting before
+    for record in records:
+        record["_id"] = str(record["_id"])
+    return JSONResponse({"records": jsonable_encoder(records)}).body
+
+
+def orjson_render(records: list) -> bytes:
+    for record in records:
+        render_day(record)
+    return MongoJSONResponse({"records": records}).body
+
+
+def best_of(fn, records: list) -> float:
+    best = float("inf")
+    for _ in range(RUNS):
+        # Fresh copies, since the legacy path mutates the documents
+        batch = [dict(r) for r in records]
+        started = time.perf_counter()
+        fn(batch)
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Attendance payload serialization benchmark")
+    parser.add_argument("--records", type=int, default=10000)
+    parser.add_argument("--output", help="results file (default benchmarks/results/json-<timestamp>.json)")
+    args = parser.parse_args()
+
+    native = make_records(args.records)
+    legacy_records = [
+        {**r, "date": r["date"].date().isoformat(), "in_time": r["in_time"].isoformat(), "out_time": r["out_time"].isoformat()}
+        for r in native
+    ]
+
+    legacy_ms = best_of(legacy_render, legacy_records)
+    orjson_ms = best_of(orjson_render, native)
+    payload_bytes = len(orjson_render([dict(r) for r in native]))
+
+    print(f"{'records':>8} {'legacy (ms)':>12} {'orjson (ms)':>12} {'speedup':>8} {'payload (KB)':>13}")
+    print(f"{args.records:>8} {legacy_ms:>12.1f} {orjson_ms:>12.1f} {legacy_ms / orjson_ms:>7.1f}x {payload_bytes / 1024:>13.0f}")
+
+    save_results("json", {
+        "records": args.records,
+        "payload_bytes": payload_bytes,
+        "legacy_render_ms": round(legacy_ms, 3),
+        "orjson_render_ms": round(orjson_ms, 3)
+    }, args.output)
+
+
+if __name__ == "__main__":
+    main()
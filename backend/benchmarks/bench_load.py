@@ -0,0 +1,164 @@
+"""
+Load scenarios against the full FastAPI app, in-process over httpx's ASGI transport
+  mark_in_burst  - every employee marks in at once (the 9am rush)
+  attendance_all - admins refreshing GET /attendance/all?filter=month
+  public_pages   - visitors alternating GET /news and GET /jobs
+Run from backend/:  python -m benchmarks.bench_load [--employees 500] [--output FILE]
+Seeds a scratch database (BENCH_MONGODB_DB, default myapp_db_bench) on
+MONGODB_URL and drops it afterwards unless --keep is given.
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import time
+from datetime import date, datetime, timedelta
+
+# Point the app at the scratch database before database.py is imported
+BENCH_DB = os.getenv("BENCH_MONGODB_DB", "myapp_db_bench")
+os.environ["MONGODB_DB"] = BENCH_DB
+os.environ.setdefault("SMTP_EMAIL", "bench@example.com")
+os.environ.setdefault("SMTP_PASSWORD", "bench")
+os.environ.setdefault("SECRET_KEY", "bench-secret")
+
+import httpx
+
+import location_utils
+import main
+from database import client, connect_db, database
+from index_utils import ensure_indexes
+from attendance_utils import day_fields
+from benchmarks.results import save_results
+
+
+async def seed(employee_count: int, days: int, news_count: int, job_count: int):
+    await database.employees.insert_many([
+        {"id": i, "name": f"Employee {i}", "email": f"emp{i}@example.com", "password_hash": "x"}
+        for i in range(1, employee_count + 1)
+    ])
+
+    # History up to yesterday, so everyone can still mark in today
+    today = date.today()
+    records = []
+    for i in range(1, employee_count + 1):
+        for d in range(1, days + 1):
+            day = today - timedelta(days=d)
+            in_time = datetime(day.year, day.month, day.day, 9, 0)
+            out_time = in_time + timedelta(hours=8, minutes=i % 60)
+            records.append({
+                "employee_id": i,
+                **day_fields(day),
+                "in_time": in_time,
+                "out_time": out_time,
+                "status": "present"
+            })
+    if records:
+        await database.attendance.insert_many(records)
+
+    await database.news.insert_many([
+        {"title": f"News {i}", "description": "Lorem ipsum " * 40, "date": today.isoformat(), "image_path": None}
+        for i in range(news_count)
+    ])
+    await database.jobs.insert_many([
+        {"title": f"Job {i}", "description": "Lorem ipsum " * 40, "location": "Kochi"}
+        for i in range(job_count)
+    ])
+
+    await main.rollups.rebuild()
+    main.employee_directory.invalidate()
+
+
+async def run_scenario(http, requests: list, concurrency: int) -> dict:
+    """Fire (method, url, kwargs) requests with bounded concurrency and summarise latency"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def one(method, url, kwargs):
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            response = await http.request(method, url, **kwargs)
+            latencies.append((time.perf_counter() - started) * 1000)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(*request) for request in requests))
+    elapsed = time.perf_counter() - started
+
+    percentiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+    return {
+        "requests": len(requests),
+        "concurrency": concurrency,
+        "errors": errors,
+        "throughput_per_s": round(len(requests) / elapsed, 1),
+        "p50_ms": round(percentiles[49], 2),
+        "p95_ms": round(percentiles[94], 2),
+        "p99_ms": round(percentiles[98], 2),
+        "max_ms": round(max(latencies), 2)
+    }
+
+
+async def run(args) -> dict:
+    sites = location_utils._index.sites
+    site = next((s for s in sites if s.polygon is None), sites[0])
+
+    await client.drop_database(BENCH_DB)
+    await connect_db()
+    await ensure_indexes(database)
+    await seed(args.employees, args.days, news_count=50, job_count=20)
+
+    results = {"config": {
+        "employees": args.employees,
+        "days": args.days,
+        "concurrency": args.concurrency
+    }}
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as http:
+        results["mark_in_burst"] = await run_scenario(http, [
+            ("POST", "/attendance/mark-in", {"data": {
+                "employee_id": i, "latitude": site.latitude, "longitude": site.longitude
+            }})
+            for i in range(1, args.employees + 1)
+        ], args.concurrency)
+
+        results["attendance_all"] = await run_scenario(
+            http, [("GET", "/attendance/all?filter=month", {})] * args.requests, max(args.concurrency // 10, 1)
+        )
+
+        results["public_pages"] = await run_scenario(
+            http, [("GET", "/news" if i % 2 else "/jobs", {}) for i in range(args.requests * 5)], args.concurrency
+        )
+
+    return results
+
+
+async def async_main(args):
+    try:
+        results = await run(args)
+    finally:
+        if not args.keep:
+            await client.drop_database(BENCH_DB)
+
+    print(f"{'scenario':<16} {'requests':>9} {'errors':>7} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, numbers in results.items():
+        if name == "config":
+            continue
+        print(f"{name:<16} {numbers['requests']:>9} {numbers['errors']:>7} {numbers['throughput_per_s']:>9.1f} "
+              f"{numbers['p50_ms']:>9.2f} {numbers['p95_ms']:>9.2f} {numbers['p99_ms']:>9.2f}")
+
+    save_results("load", results, args.output)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="In-process load scenarios for the API")
+    parser.add_argument("--employees", type=int, default=500)
+    parser.add_argument("--days", type=int, default=20, help="days of attendance history per employee")
+    parser.add_argument("--requests", type=int, default=200, help="requests per read scenario (x5 for public pages)")
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--keep", action="store_true", help="leave the scratch database in place")
+    parser.add_argument("--output", help="results file (default benchmarks/results/load-<timestamp>.json)")
+    asyncio.run(async_main(parser.parse_args()))
@@ -0,0 +1,79 @@
+"""
+Benchmark: a burst of concurrent logins, bcrypt inline on the event loop vs
+on the password_utils pool. Reports throughput and the worst event-loop
+stall seen by a 10 ms heartbeat task (what every other request would feel).
+Run from backend/:  python -m benchmarks.bench_login [--output FILE]
+Needs no database. BCRYPT_ROUNDS / PASSWORD_HASH_WORKERS apply as in the API.
+"""
+
+import argparse
+import asyncio
+import time
+
+from password_utils import BCRYPT_ROUNDS, PASSWORD_HASH_WORKERS, pwd_context, shutdown, verify_password
+from benchmarks.results import save_results
+
+BURST_SIZES = [10, 50]
+HEARTBEAT_SECONDS = 0.01
+PASSWORD = "correct horse battery staple"
+
+
+async def heartbeat(stalls: list, stop: asyncio.Event):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(HEARTBEAT_SECONDS)
+        stalls.append(time.perf_counter() - started - HEARTBEAT_SECONDS)
+
+
+async def inline_login(stored: str):
+    # What a plain pwd_context.verify() inside the handler would do
+    await asyncio.sleep(0)
+    return pwd_context.verify(PASSWORD, stored)
+
+
+async def pooled_login(stored: str):
+    matches, _ = await verify_password(PASSWORD, stored)
+    return matches
+
+
+async def run_burst(login, stored: str, size: int):
+    stalls = []
+    stop = asyncio.Event()
+    monitor = asyncio.create_task(heartbeat(stalls, stop))
+    await asyncio.sleep(HEARTBEAT_SECONDS * 2)
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(login(stored) for _ in range(size)))
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    await monitor
+    assert all(results)
+    return size / elapsed, max(stalls) * 1000
+
+
+async def main(output: str = None):
+    stored = pwd_context.hash(PASSWORD)
+    results = {"bcrypt_rounds": BCRYPT_ROUNDS, "pool_workers": PASSWORD_HASH_WORKERS}
+    print(f"bcrypt rounds={BCRYPT_ROUNDS}, pool workers={PASSWORD_HASH_WORKERS}")
+    print(f"{'burst':>6} {'inline (logins/s)':>18} {'inline stall (ms)':>18} {'pooled (logins/s)':>18} {'pooled stall (ms)':>18}")
+
+    for size in BURST_SIZES:
+        inline_rate, inline_stall = await run_burst(inline_login, stored, size)
+        pooled_rate, pooled_stall = await run_burst(pooled_login, stored, size)
+        print(f"{size:>6} {inline_rate:>18.1f} {inline_stall:>18.1f} {pooled_rate:>18.1f} {pooled_stall:>18.1f}")
+        results[f"burst_{size}"] = {
+            "inline_logins_per_s": round(inline_rate, 2),
+            "inline_stall_ms": round(inline_stall, 3),
+            "pooled_logins_per_s": round(pooled_rate, 2),
+            "pooled_stall_ms": round(pooled_stall, 3)
+        }
+
+    shutdown()
+    save_results("login", results, output)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent login (bcrypt) benchmark")
+    parser.add_argument("--output", help="results file (default benchmarks/results/login-<timestamp>.json)")
+    asyncio.run(main(parser.parse_args().output))
@@ -0,0 +1,89 @@
+"""
+Micro-benchmarks for the per-request helpers in main.py
+calculate_hours, get_date_range, is_location_allowed and the _id
+stringification done for every document a list endpoint returns.
+Run from backend/:  python -m benchmarks.bench_micro [--output FILE]
+Needs no database (main is imported, but nothing connects).
+"""
+
+import argparse
+import os
+import timeit
+from datetime import datetime, timedelta
+
+# main.py validates these at import; nothing is sent or connected here
+os.environ.setdefault("MONGODB_URL", "mongodb://localhost:27017")
+os.environ.setdefault("SMTP_EMAIL", "bench@example.com")
+os.environ.setdefault("SMTP_PASSWORD", "bench")
+os.environ.setdefault("SECRET_KEY", "bench-secret")
+
+from bson import ObjectId
+
+import location_utils
+from main import calculate_hours, get_date_range
+from location_utils import is_location_allowed
+from benchmarks.results import save_results
+
+REPEAT = 5
+DOCUMENT_COUNT = 1000
+
+
+def ns_per_call(stmt, number: int) -> float:
+    """Best of REPEAT runs, in nanoseconds per call"""
+    return min(timeit.repeat(stmt, number=number, repeat=REPEAT)) / number * 1e9
+
+
+def stringify_ids(documents: list) -> list:
+    # The loop every list endpoint runs before returning Mongo documents
+    for document in documents:
+        document["_id"] = str(document["_id"])
+    return documents
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--output", help="results file (default benchmarks/results/micro-<timestamp>.json)")
+    args = parser.parse_args()
+
+    in_time = datetime(2025, 1, 15, 9, 0)
+    out_time = in_time + timedelta(hours=8, minutes=30)
+
+    sites = location_utils._index.sites
+    site = next((s for s in sites if s.polygon is None), sites[0])
+    inside = (site.latitude + 0.0001, site.longitude + 0.0001)
+    outside = (site.latitude + 1.0, site.longitude + 1.0)
+
+    documents = [{"_id": ObjectId(), "title": f"Item {i}"} for i in range(DOCUMENT_COUNT)]
+
+    results = {
+        "calculate_hours": {
+            "complete_ns": ns_per_call(lambda: calculate_hours(in_time, out_time), 100000),
+            "open_ns": ns_per_call(lambda: calculate_hours(in_time, None), 100000),
+            # Records not yet migrated to native dates
+            "iso_strings_ns": ns_per_call(lambda: calculate_hours(in_time.isoformat(), out_time.isoformat()), 100000),
+        },
+        "get_date_range": {
+            f"{filter_type}_ns": ns_per_call(lambda f=filter_type: get_date_range(f), 100000)
+            for filter_type in ("today", "week", "month")
+        },
+        "is_location_allowed": {
+            "inside_ns": ns_per_call(lambda: is_location_allowed(*inside), 10000),
+            "outside_ns": ns_per_call(lambda: is_location_allowed(*outside), 10000),
+        },
+        "stringify_ids": {
+            # Fresh copies each run, since the loop mutates the documents
+            f"{DOCUMENT_COUNT}_docs_ms": ns_per_call(
+                lambda: stringify_ids([dict(d) for d in documents]), 100
+            ) / 1e6,
+        },
+    }
+
+    for group, numbers in results.items():
+        for name, value in numbers.items():
+            print(f"{group + '.' + name:<40} {value:>12.1f}")
+
+    save_results("micro", results, args.output)
+
+
+if __name__ == "__main__":
+    main()
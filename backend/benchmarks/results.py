@@ -0,0 +1,96 @@
+"""
+Benchmark results: save runs as JSON and compare two of them
+Each file holds {"suite", "timestamp", "git_commit", "python", "platform", "results"}
+where results maps a benchmark name to its numbers; keys ending in _ms or
+_ns are timings (lower is better), keys ending in _per_s are rates (higher is better).
+
+Compare two runs from backend/ (exit code 1 when anything regressed):
+    python -m benchmarks.results compare benchmarks/results/micro-OLD.json benchmarks/results/micro-NEW.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+DEFAULT_THRESHOLD = 0.10
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True, cwd=os.path.dirname(__file__)
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def save_results(suite: str, results: dict, path: str = None) -> str:
+    """Write results to benchmarks/results/<suite>-<timestamp>.json (or path) and return the path"""
+    timestamp = datetime.utcnow()
+    if path is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(RESULTS_DIR, f"{suite}-{timestamp.strftime('%Y%m%dT%H%M%S')}.json")
+
+    with open(path, "w") as f:
+        json.dump({
+            "suite": suite,
+            "timestamp": timestamp.isoformat(),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "results": results
+        }, f, indent=2)
+    print(f"📄 Results saved to {path}")
+    return path
+
+
+def _metrics(results: dict, prefix: str = ""):
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            yield from _metrics(value, f"{name}.")
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield name, value
+
+
+def compare(old_path: str, new_path: str, threshold: float = DEFAULT_THRESHOLD) -> bool:
+    """Print the change for every shared timing/rate; returns True if any regressed past threshold"""
+    with open(old_path) as f:
+        old = dict(_metrics(json.load(f)["results"]))
+    with open(new_path) as f:
+        new = dict(_metrics(json.load(f)["results"]))
+
+    regressed = False
+    print(f"{'metric':<60} {'old':>12} {'new':>12} {'change':>8}")
+    for name in sorted(old.keys() & new.keys()):
+        lower_is_better = name.endswith(("_ms", "_ns"))
+        if not lower_is_better and not name.endswith("_per_s"):
+            continue
+        before, after = old[name], new[name]
+        if not before:
+            continue
+        change = (after - before) / before
+        worse = change > threshold if lower_is_better else change < -threshold
+        regressed = regressed or worse
+        flag = "  ❌" if worse else ""
+        print(f"{name:<60} {before:>12.3f} {after:>12.3f} {change:>+7.1%}{flag}")
+    return regressed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    compare_parser = subparsers.add_parser("compare")
+    compare_parser.add_argument("old")
+    compare_parser.add_argument("new")
+    compare_parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                                help="relative change counted as a regression (default 0.10)")
+    args = parser.parse_args()
+
+    sys.exit(1 if compare(args.old, args.new, args.threshold) else 0)
@@ -0,0 +1,140 @@
+"""
+Response cache utility
+Keeps pre-serialized JSON for public endpoints that only change when an
+admin writes, and answers conditional requests with 304 Not Modified.
+Compressed variants are built in a worker thread when an entry is stored
+and kept with it, so compression is paid once per change rather than once
+per request, and never on the event loop.
+"""
+
+import asyncio
+import hashlib
+import os
+import time
+from email.utils import formatdate, parsedate_to_datetime
+
+from fastapi import Request, Response
+
+from compression_utils import COMPRESSION_MIN_BYTES, compress, negotiate
+from json_utils import dumps
+
+# Other uvicorn workers don't see our invalidations, so entries also expire
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "30"))
+
+
+class CachedResponse:
+    """Serialized body, its compressed variants and its validators"""
+
+    def __init__(self, content, headers: dict = None, previous=None):
+        self.headers = headers or {}
+        self.body = dumps(content)
+        self.etag = '"' + hashlib.sha1(self.body).hexdigest() + '"'
+        # Keep the old date when a reload produced identical bytes
+        if previous is not None and previous.etag == self.etag:
+            self.last_modified = previous.last_modified
+            self.encoded = previous.encoded
+        else:
+            self.last_modified = int(time.time())
+            self.encoded = {}
+        self.last_modified_header = formatdate(self.last_modified, usegmt=True)
+        self.created = time.monotonic()
+
+    def is_not_modified(self, request: Request) -> bool:
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is not None:
+            tags = [tag.strip() for tag in if_none_match.split(",")]
+            # Any encoding of the same body counts as a match
+            tags = [tag[2:] if tag.startswith("W/") else tag for tag in tags]
+            return "*" in tags or any(tag in tags for tag in self._etags())
+
+        if_modified_since = request.headers.get("if-modified-since")
+        if if_modified_since:
+            try:
+                return parsedate_to_datetime(if_modified_since).timestamp() >= self.last_modified
+            except (TypeError, ValueError):
+                return False
+
+        return False
+
+    def _etags(self) -> list:
+        return [self.etag] + [self._variant_etag(encoding) for encoding in ("br", "gzip")]
+
+    def _variant_etag(self, encoding: str) -> str:
+        # Each representation needs its own strong validator
+        return self.etag[:-1] + "-" + encoding + '"'
+
+    def _precompress(self):
+        """Max-level variants for a stored entry; blocking, run it in a thread"""
+        if len(self.body) < COMPRESSION_MIN_BYTES:
+            return
+        for encoding in ("br", "gzip"):
+            if encoding not in self.encoded:
+                self.encoded[encoding] = compress(self.body, encoding, static=True)
+
+    def encode(self, encoding: str) -> bytes:
+        """Body compressed with encoding: the stored variant, or a fast one-off"""
+        body = self.encoded.get(encoding)
+        if body is None:
+            body = compress(self.body, encoding)
+        return body
+
+    def to_response(self, request: Request) -> Response:
+        encoding = None
+        if len(self.body) >= COMPRESSION_MIN_BYTES:
+            encoding = negotiate(request.headers.get("accept-encoding"))
+
+        response_headers = {
+            "ETag": self.etag,
+            "Last-Modified": self.last_modified_header,
+            "Cache-Control": "no-cache",
+            "Vary": "Accept-Encoding",
+            **self.headers
+        }
+        if encoding is not None:
+            body = self.encode(encoding)
+            response_headers["ETag"] = self._variant_etag(encoding)
+            response_headers["Content-Encoding"] = encoding
+        else:
+            body = self.body
+
+        if self.is_not_modified(request):
+            return Response(status_code=304, headers=response_headers)
+        return Response(content=body, media_type="application/json", headers=response_headers)
+
+
+class ResponseCache:
+    """In-process cache for one collection's responses, cleared on every write"""
+
+    def __init__(self, ttl: float = RESPONSE_CACHE_TTL_SECONDS):
+        self.ttl = ttl
+        self._entries = {}
+        self._previous = {}
+        self._generation = 0
+
+    async def get_or_load(self, key, loader) -> CachedResponse:
+        """
+        Return the cached entry for key, building it on a miss.
+        loader() returns (content, extra response headers).
+        A key of None builds the response without storing it.
+        """
+        if key is None:
+            content, headers = await loader()
+            return CachedResponse(content, headers)
+
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() - entry.created < self.ttl:
+            return entry
+
+        # A write that lands while we are loading makes this result stale
+        generation = self._generation
+        content, headers = await loader()
+        entry = CachedResponse(content, headers, self._previous.get(key))
+        if generation == self._generation:
+            await asyncio.to_thread(entry._precompress)
+            self._entries[key] = entry
+            self._previous[key] = entry
+        return entry
+
+    def invalidate(self):
+        self._generation += 1
+        self._entries.clear()
@@ -0,0 +1,172 @@
+"""
+Response compression utility
+Negotiated Brotli/gzip for JSON, text and CSV responses above a size
+threshold, including streamed ones (exports are compressed chunk by chunk).
+Brotli is used when the optional brotli package is installed, otherwise gzip.
+
+Cached responses (see cache_utils) keep their compressed variants next to
+the raw bytes, so /news and /jobs pay for compression once per change;
+responses that already carry a Content-Encoding pass through untouched.
+
+COMPRESSION_MIN_BYTES sets the threshold (default 1024).
+"""
+
+import asyncio
+import gzip
+import os
+import re
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+# Per-request compression favours speed; cached variants are built once, so squeeze harder
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4
+BROTLI_STATIC_QUALITY = 11
+# Larger one-shot bodies are compressed in a thread to keep the event loop free
+COMPRESS_IN_THREAD_BYTES = 256 * 1024
+
+COMPRESSIBLE_TYPE = re.compile(
+    r"^(text/|application/(json|javascript|xml|[\w.+-]*\+json|[\w.+-]*\+xml)|image/svg\+xml)"
+)
+
+
+def negotiate(accept_encoding: str):
+    """"br", "gzip" or None from an Accept-Encoding header, honouring q=0"""
+    if not accept_encoding:
+        return None
+
+    accepted = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip()] = quality
+
+    wildcard = accepted.get("*", 0.0)
+    candidates = ["br", "gzip"] if brotli is not None else ["gzip"]
+    best = max(candidates, key=lambda name: accepted.get(name, wildcard))
+    return best if accepted.get(best, wildcard) > 0 else None
+
+
+def compress(body: bytes, encoding: str, static: bool = False) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_STATIC_QUALITY if static else BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=9 if static else GZIP_LEVEL, mtime=0)
+
+
+class StreamCompressor:
+    """Incremental encoder; every chunk is flushed so streamed rows arrive promptly"""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, chunk: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._compressor.process(chunk) + self._compressor.flush()
+        return self._compressor.compress(chunk) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._compressor.finish()
+        return self._compressor.flush()
+
+
+class _CompressingSend:
+    """Wraps send() for one response, deciding at the first body message"""
+
+    def __init__(self, send, encoding: str, minimum_size: int):
+        self.send = send
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.start = None
+        self.passthrough = False
+        self.stream = None
+
+    async def __call__(self, message):
+        if self.passthrough:
+            return await self.send(message)
+
+        if message["type"] == "http.response.start":
+            headers = Headers(raw=message["headers"])
+            eligible = (
+                message["status"] == 200
+                and "content-encoding" not in headers
+                and COMPRESSIBLE_TYPE.match(headers.get("content-type", ""))
+            )
+            if not eligible:
+                self.passthrough = True
+                return await self.send(message)
+            self.start = message
+            return
+
+        if message["type"] != "http.response.body":
+            return await self.send(message)
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        headers = MutableHeaders(raw=self.start["headers"]) if self.start else None
+
+        if self.stream is not None:
+            chunk = self.stream.compress(body)
+            if not more_body:
+                chunk += self.stream.finish()
+            return await self.send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+        headers.add_vary_header("Accept-Encoding")
+
+        if not more_body:
+            # Whole body in one message
+            if len(body) < self.minimum_size:
+                await self.send(self.start)
+                return await self.send(message)
+
+            if len(body) >= COMPRESS_IN_THREAD_BYTES:
+                body = await asyncio.to_thread(compress, body, self.encoding)
+            else:
+                body = compress(body, self.encoding)
+            headers["Content-Encoding"] = self.encoding
+            headers["Content-Length"] = str(len(body))
+            await self.send(self.start)
+            return await self.send({"type": "http.response.body", "body": body, "more_body": False})
+
+        # Streaming response: compress as it goes, length unknown up front
+        self.stream = StreamCompressor(self.encoding)
+        headers["Content-Encoding"] = self.encoding
+        if "content-length" in headers:
+            del headers["Content-Length"]
+        await self.send(self.start)
+        await self.send({"type": "http.response.body", "body": self.stream.compress(body), "more_body": True})
+
+
+class CompressionMiddleware:
+    """ASGI middleware compressing eligible responses for clients that accept it"""
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding"))
+        if encoding is None:
+            return await self.app(scope, receive, send)
+
+        await self.app(scope, receive, _CompressingSend(send, encoding, self.minimum_size))
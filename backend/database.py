@@ -1,7 +1,13 @@
+import asyncio
 import os
+import threading
+import time
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
 from dotenv import load_dotenv
 
+from metrics_utils import MongoCommandMetrics
+
 load_dotenv()
 
 # Get MongoDB URL from environment variable
@@ -10,12 +16,166 @@ MONGODB_URL = os.getenv("MONGODB_URL")
 if not MONGODB_URL:
     raise ValueError("MONGODB_URL not found in .env file")
 
-# Create async MongoDB client
-client = AsyncIOMotorClient(MONGODB_URL)
+MONGODB_DB = os.getenv("MONGODB_DB", "myapp_db")
+
+# Pool sizing is per process: with N uvicorn workers the server sees up to
+# N * MONGODB_MAX_POOL_SIZE connections from this app.
+MONGODB_MAX_POOL_SIZE = int(os.getenv("MONGODB_MAX_POOL_SIZE", "50"))
+MONGODB_MIN_POOL_SIZE = int(os.getenv("MONGODB_MIN_POOL_SIZE", "5"))
+MONGODB_MAX_IDLE_TIME_MS = int(os.getenv("MONGODB_MAX_IDLE_TIME_MS", "300000"))
+MONGODB_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGODB_WAIT_QUEUE_TIMEOUT_MS", "5000"))
+MONGODB_CONNECT_TIMEOUT_MS = int(os.getenv("MONGODB_CONNECT_TIMEOUT_MS", "5000"))
+MONGODB_SOCKET_TIMEOUT_MS = int(os.getenv("MONGODB_SOCKET_TIMEOUT_MS", "30000"))
+MONGODB_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGODB_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+# zstd needs the zstandard package and snappy python-snappy; pymongo skips
+# (with a warning) any compressor that isn't installed, zlib is always there
+MONGODB_COMPRESSORS = os.getenv("MONGODB_COMPRESSORS", "zstd,snappy,zlib")
+MONGODB_READ_PREFERENCE = os.getenv("MONGODB_READ_PREFERENCE", "primary")
+
+
+class PoolStats(monitoring.ConnectionPoolListener):
+    """Connection pool counters per server, fed by pymongo's CMAP events"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._servers = {}
+
+    def _server(self, address) -> dict:
+        key = f"{address[0]}:{address[1]}"
+        server = self._servers.get(key)
+        if server is None:
+            server = self._servers[key] = {
+                "open": 0,
+                "in_use": 0,
+                "created": 0,
+                "closed": 0,
+                "checkouts": 0,
+                "checkout_failures": 0,
+                "max_wait_ms": 0.0,
+                "total_wait_ms": 0.0,
+                "cleared": 0
+            }
+        return server
+
+    def pool_created(self, event):
+        with self._lock:
+            self._server(event.address)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self._server(event.address)["cleared"] += 1
+
+    def pool_closed(self, event):
+        with self._lock:
+            self._servers.pop(f"{event.address[0]}:{event.address[1]}", None)
+
+    def connection_created(self, event):
+        with self._lock:
+            server = self._server(event.address)
+            server["open"] += 1
+            server["created"] += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            server = self._server(event.address)
+            server["open"] = max(server["open"] - 1, 0)
+            server["closed"] += 1
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self._server(event.address)["checkout_failures"] += 1
+
+    def connection_checked_out(self, event):
+        # duration is only reported by pymongo >= 4.7
+        wait_ms = getattr(event, "duration", None)
+        with self._lock:
+            server = self._server(event.address)
+            server["in_use"] += 1
+            server["checkouts"] += 1
+            if wait_ms is not None:
+                wait_ms *= 1000
+                server["total_wait_ms"] += wait_ms
+                server["max_wait_ms"] = max(server["max_wait_ms"], wait_ms)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            server = self._server(event.address)
+            server["in_use"] = max(server["in_use"] - 1, 0)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            servers = {}
+            for address, server in self._servers.items():
+                servers[address] = {
+                    **server,
+                    "available": server["open"] - server["in_use"],
+                    "max_wait_ms": round(server["max_wait_ms"], 2),
+                    "avg_wait_ms": round(server["total_wait_ms"] / server["checkouts"], 3) if server["checkouts"] else None
+                }
+                del servers[address]["total_wait_ms"]
+            return servers
+
+
+pool_stats = PoolStats()
+
+# Create async MongoDB client. Nothing connects until the first operation
+# (or connect_db() at startup), so importing this module stays cheap.
+client = AsyncIOMotorClient(
+    MONGODB_URL,
+    maxPoolSize=MONGODB_MAX_POOL_SIZE,
+    minPoolSize=MONGODB_MIN_POOL_SIZE,
+    maxIdleTimeMS=MONGODB_MAX_IDLE_TIME_MS,
+    waitQueueTimeoutMS=MONGODB_WAIT_QUEUE_TIMEOUT_MS,
+    connectTimeoutMS=MONGODB_CONNECT_TIMEOUT_MS,
+    socketTimeoutMS=MONGODB_SOCKET_TIMEOUT_MS,
+    serverSelectionTimeoutMS=MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+    compressors=MONGODB_COMPRESSORS,
+    readPreference=MONGODB_READ_PREFERENCE,
+    event_listeners=[pool_stats, MongoCommandMetrics()]
+)
 
 # Get database (will be created automatically when you insert data)
-database = client["myapp_db"]     #.get_database()  # Uses database from connection string
-# OR specify explicitly: database = client["employee_portal_db"]
+database = client[MONGODB_DB]
+
+
+async def connect_db():
+    """Check the server is reachable and open minPoolSize connections up front"""
+    started = time.perf_counter()
+    await client.admin.command("ping")
+    # Concurrent pings each need their own connection, so the first
+    # requests after a deploy don't pay for TCP/TLS handshakes
+    warm = max(MONGODB_MIN_POOL_SIZE - 1, 0)
+    if warm:
+        await asyncio.gather(*(client.admin.command("ping") for _ in range(warm)))
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    print(f"✅ MongoDB connected ({MONGODB_DB}), pool warmed to {MONGODB_MIN_POOL_SIZE} in {elapsed_ms:.0f} ms")
+
+
+def close_db():
+    client.close()
+    print("✅ MongoDB connections closed")
+
+
+def get_pool_stats() -> dict:
+    """Configured limits plus live per-server pool counters"""
+    return {
+        "database": MONGODB_DB,
+        "max_pool_size": MONGODB_MAX_POOL_SIZE,
+        "min_pool_size": MONGODB_MIN_POOL_SIZE,
+        "wait_queue_timeout_ms": MONGODB_WAIT_QUEUE_TIMEOUT_MS,
+        "read_preference": MONGODB_READ_PREFERENCE,
+        "compressors": MONGODB_COMPRESSORS.split(",") if MONGODB_COMPRESSORS else [],
+        "servers": pool_stats.snapshot()
+    }
 
 # Define collections
 admins_collection = database.get_collection("admins")
@@ -25,6 +185,14 @@ employees_collection = database.get_collection("employees")
 attendance_collection = database.get_collection("attendance")
 employee_links_collection = database.get_collection("employee_links")
 admin_links_collection = database.get_collection("admin_links")  # ← ADDED THIS
+mail_outbox_collection = database.get_collection("mail_outbox")
+attendance_rollups_collection = database.get_collection("attendance_rollups")
+geofence_sites_collection = database.get_collection("geofence_sites")
+reset_tokens_collection = database.get_collection("reset_tokens")
+revoked_tokens_collection = database.get_collection("revoked_tokens")
+rate_limits_collection = database.get_collection("rate_limits")
+sync_tombstones_collection = database.get_collection("sync_tombstones")
+migration_locks_collection = database.get_collection("migration_locks")
 
 # Helper function to convert MongoDB document to dict
 def document_helper(document) -> dict:
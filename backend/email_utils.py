@@ -1,13 +1,244 @@
+"""
+Outbound email queue
+Handlers enqueue mail into a durable Mongo outbox and return immediately.
+A small pool of background workers delivers it over persistent SMTP
+sessions, retrying failures with exponential backoff.
+
+Every MAIL_OUTBOX_POLL_SECONDS each process also sweeps the outbox: leases
+held by a worker that died are released and due mail is queued, so mail left
+by a crashed or stopped process is picked up by whoever is still running.
+
+stop() lets each worker finish the message in hand and waits at most
+MAIL_STOP_TIMEOUT_SECONDS; anything not yet claimed stays in the outbox.
+"""
+
+import asyncio
+import os
 import smtplib
+from datetime import datetime, timedelta
 from email.message import EmailMessage
 
-def send_email(to, subject, body):
-    msg = EmailMessage()
-    msg["From"] = "saniaelizabathmanoj@gmail.com"
-    msg["To"] = to
-    msg["Subject"] = subject
-    msg.set_content(body)
+from pymongo import ReturnDocument
+
+from metrics_utils import EMAIL_SECONDS
+
+SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "465"))
+SMTP_USE_SSL = os.getenv("SMTP_USE_SSL", "true").lower() == "true"
+
+MAIL_WORKERS = int(os.getenv("MAIL_WORKERS", "2"))
+MAIL_MAX_ATTEMPTS = int(os.getenv("MAIL_MAX_ATTEMPTS", "5"))
+MAIL_RETRY_BASE_SECONDS = float(os.getenv("MAIL_RETRY_BASE_SECONDS", "2"))
+MAIL_SESSION_IDLE_SECONDS = float(os.getenv("MAIL_SESSION_IDLE_SECONDS", "60"))
+MAIL_OUTBOX_POLL_SECONDS = float(os.getenv("MAIL_OUTBOX_POLL_SECONDS", "30"))
+MAIL_STOP_TIMEOUT_SECONDS = float(os.getenv("MAIL_STOP_TIMEOUT_SECONDS", "10"))
+
+# A message stuck in "sending" this long belongs to a worker that died
+SENDING_LEASE = timedelta(minutes=5)
+
+
+class SMTPSession:
+    """One reusable SMTP connection, opened lazily and reopened if dropped"""
+
+    def __init__(self, username: str, password: str):
+        self.username = username
+        self.password = password
+        self._server = None
+
+    def _connect(self):
+        if SMTP_USE_SSL:
+            server = smtplib.SMTP_SSL(SMTP_HOST, SMTP_PORT, timeout=30)
+        else:
+            server = smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=30)
+        server.ehlo()
+        if self.username and self.password and server.has_extn("auth"):
+            server.login(self.username, self.password)
+        self._server = server
+
+    def send(self, msg: EmailMessage):
+        """Blocking send; run it off the event loop"""
+        if self._server is None:
+            self._connect()
+        try:
+            self._server.send_message(msg)
+        except smtplib.SMTPServerDisconnected:
+            # The server closed an idle session - reconnect once and resend
+            self._connect()
+            self._server.send_message(msg)
+
+    def close(self):
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except Exception:
+                pass
+            self._server = None
+
+
+class MailQueue:
+    """Durable outbox plus the worker pool that drains it"""
+
+    def __init__(self, outbox_collection, username: str, password: str, workers: int = MAIL_WORKERS):
+        self.outbox = outbox_collection
+        self.username = username
+        self.password = password
+        self.worker_count = workers
+        self._queue = None
+        self._stopping = None
+        self._workers = []
+        self._poller = None
+
+    async def enqueue(self, to: str, subject: str, body: str):
+        """Persist the message and hand it to the workers"""
+        now = datetime.utcnow()
+        result = await self.outbox.insert_one({
+            "to": to,
+            "subject": subject,
+            "body": body,
+            "status": "pending",
+            "attempts": 0,
+            "next_attempt_at": now,
+            "created_at": now
+        })
+        self._queue.put_nowait(result.inserted_id)
+        return result.inserted_id
+
+    async def start(self):
+        """Recover mail left over from a previous run and start the workers"""
+        self._queue = asyncio.Queue()
+        self._stopping = asyncio.Event()
+        now = datetime.utcnow()
+        await self._release_expired_leases(now)
+
+        recovered = 0
+        async for doc in self.outbox.find({"status": "pending"}, {"next_attempt_at": 1}):
+            self._schedule(doc["_id"], (doc["next_attempt_at"] - now).total_seconds())
+            recovered += 1
+
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.worker_count)]
+        self._poller = asyncio.create_task(self._poll_loop())
+        print(f"✅ Mail queue started ({self.worker_count} workers, {recovered} queued from outbox)")
+
+    async def stop(self):
+        if self._poller:
+            self._poller.cancel()
+        tasks = self._workers + ([self._poller] if self._poller else [])
+        if self._stopping is not None:
+            self._stopping.set()
+            # Wakes workers idling on the queue
+            for _ in self._workers:
+                self._queue.put_nowait(None)
+
+        if tasks:
+            _, pending = await asyncio.wait(tasks, timeout=MAIL_STOP_TIMEOUT_SECONDS)
+            for task in pending:
+                task.cancel()
+            if pending:
+                print(f"⚠️  {len(pending)} mail tasks did not stop within {MAIL_STOP_TIMEOUT_SECONDS}s, cancelled")
+        self._workers = []
+        self._poller = None
+
+    async def _release_expired_leases(self, now: datetime):
+        await self.outbox.update_many(
+            {"status": "sending", "locked_at": {"$lt": now - SENDING_LEASE}},
+            {"$set": {"status": "pending"}}
+        )
+
+    async def poll_outbox(self) -> int:
+        """
+        Release expired leases and queue every due pending message; returns how
+        many were queued. Ids this process already queued may be queued again,
+        which is harmless because _deliver claims atomically.
+        """
+        now = datetime.utcnow()
+        await self._release_expired_leases(now)
+
+        queued = 0
+        async for doc in self.outbox.find({"status": "pending", "next_attempt_at": {"$lte": now}}, {"_id": 1}):
+            self._queue.put_nowait(doc["_id"])
+            queued += 1
+        return queued
+
+    async def _poll_loop(self):
+        while True:
+            await asyncio.sleep(MAIL_OUTBOX_POLL_SECONDS)
+            try:
+                await self.poll_outbox()
+            except Exception as e:
+                print(f"⚠️  Mail outbox poll failed: {e}")
+
+    def _schedule(self, message_id, delay: float):
+        if delay <= 0:
+            self._queue.put_nowait(message_id)
+        else:
+            asyncio.get_running_loop().call_later(delay, self._queue.put_nowait, message_id)
+
+    async def _worker(self):
+        session = SMTPSession(self.username, self.password)
+        # asyncio.wait() rather than wait_for(): it never swallows a cancel
+        getter = None
+        try:
+            while not self._stopping.is_set():
+                if getter is None:
+                    getter = asyncio.ensure_future(self._queue.get())
+                done, _ = await asyncio.wait([getter], timeout=MAIL_SESSION_IDLE_SECONDS)
+                if not done:
+                    # Nothing to send for a while - let the connection go
+                    await asyncio.to_thread(session.close)
+                    continue
+                message_id, getter = getter.result(), None
+                # None is stop()'s wake-up; unclaimed ids stay pending in the outbox
+                if message_id is None or self._stopping.is_set():
+                    break
+                try:
+                    await self._deliver(session, message_id)
+                except Exception as e:
+                    print(f"⚠️  Mail worker error for {message_id}: {e}")
+        finally:
+            if getter is not None:
+                getter.cancel()
+            session.close()
+
+    async def _deliver(self, session: SMTPSession, message_id):
+        # Claiming atomically means only one worker (in any process) sends it
+        doc = await self.outbox.find_one_and_update(
+            {"_id": message_id, "status": "pending"},
+            {"$set": {"status": "sending", "locked_at": datetime.utcnow()}, "$inc": {"attempts": 1}},
+            return_document=ReturnDocument.AFTER
+        )
+        if not doc:
+            return
+
+        msg = EmailMessage()
+        msg["From"] = self.username
+        msg["To"] = doc["to"]
+        msg["Subject"] = doc["subject"]
+        msg.set_content(doc["body"])
+
+        try:
+            with EMAIL_SECONDS.labels("deliver").time():
+                await asyncio.to_thread(session.send, msg)
+        except Exception as e:
+            await asyncio.to_thread(session.close)
+            if doc["attempts"] >= MAIL_MAX_ATTEMPTS:
+                await self.outbox.update_one(
+                    {"_id": message_id},
+                    {"$set": {"status": "failed", "last_error": str(e)}}
+                )
+                print(f"❌ Giving up on email to {doc['to']} after {doc['attempts']} attempts: {e}")
+                return
+
+            delay = MAIL_RETRY_BASE_SECONDS * 2 ** (doc["attempts"] - 1)
+            await self.outbox.update_one(
+                {"_id": message_id},
+                {"$set": {
+                    "status": "pending",
+                    "last_error": str(e),
+                    "next_attempt_at": datetime.utcnow() + timedelta(seconds=delay)
+                }}
+            )
+            self._schedule(message_id, delay)
+            return
 
-    with smtplib.SMTP_SSL("smtp.gmail.com", 465) as server:
-        server.login("yourmail@gmail.com", "APP_PASSWORD")
-        server.send_message(msg)
+        # Delivered mail leaves the outbox so it stays small
+        await self.outbox.delete_one({"_id": message_id})
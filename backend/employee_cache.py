@@ -0,0 +1,138 @@
+"""
+Employee directory cache
+Keeps the (small, rarely changing) roster in memory, keyed by id and email,
+so attendance and reset handlers don't read Mongo on every request.
+Password hashes are left out: login reads them from Mongo, so a reset on
+one worker is honoured by every other worker straight away.
+
+Writes in this process call invalidate(). With several uvicorn workers,
+EMPLOYEE_CACHE_WATCH=true also invalidates on Mongo change stream events
+(needs a replica set); otherwise entries refresh after EMPLOYEE_CACHE_TTL_SECONDS,
+so an employee deleted through one worker can still mark attendance through
+the others until then.
+"""
+
+import asyncio
+import os
+import time
+
+EMPLOYEE_CACHE_TTL_SECONDS = float(os.getenv("EMPLOYEE_CACHE_TTL_SECONDS", "300"))
+EMPLOYEE_CACHE_WATCH = os.getenv("EMPLOYEE_CACHE_WATCH", "false").lower() == "true"
+
+# Credentials never sit in the cache
+CACHED_FIELDS = {"password_hash": 0}
+
+
+class EmployeeDirectory:
+    """In-memory roster with hit/miss counters"""
+
+    def __init__(self, collection, ttl: float = EMPLOYEE_CACHE_TTL_SECONDS):
+        self.collection = collection
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._by_id = {}
+        self._by_email = {}
+        self._loaded_at = None
+        self._generation = 0
+        self._lock = asyncio.Lock()
+        self._watcher = None
+
+    def _is_fresh(self) -> bool:
+        return self._loaded_at is not None and time.monotonic() - self._loaded_at < self.ttl
+
+    async def _ensure_loaded(self):
+        if self._is_fresh():
+            return
+        async with self._lock:
+            if self._is_fresh():
+                return
+            self.misses += 1
+            generation = self._generation
+            employees = await self.collection.find({}, CACHED_FIELDS).to_list(length=None)
+            self._by_id = {emp["id"]: emp for emp in employees}
+            self._by_email = {emp["email"]: emp for emp in employees if emp.get("email")}
+            # An invalidation during the load means this snapshot may be stale
+            if generation == self._generation:
+                self._loaded_at = time.monotonic()
+
+    async def get(self, employee_id: int):
+        """Employee document by id, or None"""
+        await self._ensure_loaded()
+        employee = self._by_id.get(employee_id)
+        if employee is not None:
+            self.hits += 1
+            return employee
+
+        # Possibly added by another worker since our snapshot
+        self.misses += 1
+        employee = await self.collection.find_one({"id": employee_id}, CACHED_FIELDS)
+        if employee is not None:
+            self._by_id[employee["id"]] = employee
+            if employee.get("email"):
+                self._by_email[employee["email"]] = employee
+        return employee
+
+    async def get_by_email(self, email: str):
+        await self._ensure_loaded()
+        employee = self._by_email.get(email)
+        if employee is not None:
+            self.hits += 1
+            return employee
+
+        self.misses += 1
+        return await self.collection.find_one({"email": email}, CACHED_FIELDS)
+
+    async def get_many(self, employee_ids) -> dict:
+        """{id: employee} for the ids that exist"""
+        await self._ensure_loaded()
+        found = {i: self._by_id[i] for i in employee_ids if i in self._by_id}
+        self.hits += len(found)
+
+        missing = [i for i in employee_ids if i not in found]
+        if missing:
+            self.misses += len(missing)
+            async for employee in self.collection.find({"id": {"$in": missing}}, CACHED_FIELDS):
+                found[employee["id"]] = employee
+        return found
+
+    async def all(self) -> list:
+        """Every employee, in insertion order"""
+        await self._ensure_loaded()
+        self.hits += 1
+        return list(self._by_id.values())
+
+    def invalidate(self):
+        self._generation += 1
+        self._loaded_at = None
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            "size": len(self._by_id),
+            "fresh": self._is_fresh(),
+            "watching": self._watcher is not None and not self._watcher.done()
+        }
+
+    async def _watch(self):
+        try:
+            async with self.collection.watch() as stream:
+                async for _ in stream:
+                    self.invalidate()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"⚠️  Employee change stream stopped, falling back to TTL refresh: {e}")
+
+    def start(self):
+        if EMPLOYEE_CACHE_WATCH and self._watcher is None:
+            self._watcher = asyncio.create_task(self._watch())
+
+    async def stop(self):
+        if self._watcher is not None:
+            self._watcher.cancel()
+            await asyncio.gather(self._watcher, return_exceptions=True)
+            self._watcher = None
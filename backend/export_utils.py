@@ -0,0 +1,122 @@
+"""
+Attendance export utility
+Streams attendance rows straight from a Mongo cursor as CSV (optionally
+gzipped on the fly) or XLSX, so memory stays flat regardless of row count.
+"""
+
+import asyncio
+import csv
+import io
+import os
+import tempfile
+import zlib
+
+from attendance_utils import HOURS_WORKED_EXPR, day_range_query, serialize_record
+
+EXPORT_COLUMNS = [
+    "employee_id", "employee_name", "email", "date",
+    "in_time", "out_time", "hours_worked", "status"
+]
+
+CURSOR_BATCH_SIZE = 1000
+ROWS_PER_CHUNK = 500
+FILE_CHUNK_SIZE = 64 * 1024
+# Excel's sheet size; write_row() past it silently drops the row
+XLSX_MAX_ROWS = 1048576
+
+
+async def attendance_rows(attendance_collection, employees_by_id: dict, start_date_str: str, end_date_str: str):
+    """Yield one export row per attendance record, oldest first"""
+    cursor = attendance_collection.aggregate([
+        {"$match": day_range_query(start_date_str, end_date_str)},
+        {"$sort": {"day": 1, "employee_id": 1}},
+        {"$project": {
+            "_id": 0,
+            "employee_id": 1,
+            "date": 1,
+            "in_time": 1,
+            "out_time": 1,
+            "status": 1,
+            "hours_worked": HOURS_WORKED_EXPR
+        }}
+    ], allowDiskUse=True, batchSize=CURSOR_BATCH_SIZE)
+
+    async for record in cursor:
+        serialize_record(record)
+        employee = employees_by_id.get(record.get("employee_id"), {})
+        yield [
+            record.get("employee_id"),
+            employee.get("name", ""),
+            employee.get("email", ""),
+            record.get("date", ""),
+            record.get("in_time", ""),
+            record.get("out_time", ""),
+            record.get("hours_worked", 0.0),
+            record.get("status", "")
+        ]
+
+
+async def stream_csv(rows, gzip: bool = False):
+    """Encode rows as CSV in small chunks, compressing each chunk if asked"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if gzip else None
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    pending = 1
+
+    async for row in rows:
+        writer.writerow(row)
+        pending += 1
+        if pending >= ROWS_PER_CHUNK:
+            chunk = buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+            if compressor:
+                chunk = compressor.compress(chunk)
+            if chunk:
+                yield chunk
+
+    chunk = buffer.getvalue().encode("utf-8")
+    if compressor:
+        chunk = compressor.compress(chunk) + compressor.flush()
+    if chunk:
+        yield chunk
+
+
+async def stream_xlsx(rows):
+    """
+    Write rows to a temporary XLSX in constant-memory mode, then stream it.
+    XLSX is a zip archive, so the file has to be complete before sending.
+    Rows beyond XLSX_MAX_ROWS continue on "Attendance 2", "Attendance 3", ...
+    """
+    import xlsxwriter
+
+    fd, path = tempfile.mkstemp(suffix=".xlsx")
+    os.close(fd)
+    try:
+        workbook = xlsxwriter.Workbook(path, {"constant_memory": True})
+        worksheet = workbook.add_worksheet("Attendance")
+        worksheet.write_row(0, 0, EXPORT_COLUMNS)
+
+        sheets = 1
+        row_number = 1
+        async for row in rows:
+            if row_number == XLSX_MAX_ROWS:
+                sheets += 1
+                worksheet = workbook.add_worksheet(f"Attendance {sheets}")
+                worksheet.write_row(0, 0, EXPORT_COLUMNS)
+                row_number = 1
+            worksheet.write_row(row_number, 0, row)
+            row_number += 1
+
+        await asyncio.to_thread(workbook.close)
+
+        with open(path, "rb") as f:
+            while True:
+                chunk = await asyncio.to_thread(f.read, FILE_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        os.remove(path)
@@ -0,0 +1,176 @@
+"""
+Index management utility
+Declares the indexes every collection needs and creates them on startup.
+
+Usage (from backend/):
+    python index_utils.py ensure   # create any missing indexes
+    python index_utils.py report   # index usage, missing indexes and query plans
+"""
+
+import asyncio
+import sys
+from datetime import datetime
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+# collection name -> declared indexes
+# news and jobs are only looked up by _id, which Mongo always indexes
+# legacy_id is only set on rows imported by migratedata.py
+INDEXES = {
+    "admins": [
+        {"name": "email_unique", "keys": [("email", ASCENDING)], "unique": True},
+        {"name": "legacy_id_unique", "keys": [("legacy_id", ASCENDING)], "unique": True,
+         "partialFilterExpression": {"legacy_id": {"$exists": True}}},
+    ],
+    "employees": [
+        {"name": "id_unique", "keys": [("id", ASCENDING)], "unique": True},
+        {"name": "email", "keys": [("email", ASCENDING)]},
+    ],
+    "attendance": [
+        {"name": "employee_day_unique", "keys": [("employee_id", ASCENDING), ("day", DESCENDING)], "unique": True},
+        {"name": "day", "keys": [("day", DESCENDING)]},
+        {"name": "employee_updated_at", "keys": [("employee_id", ASCENDING), ("updated_at", ASCENDING)]},
+        {"name": "legacy_id_unique", "keys": [("legacy_id", ASCENDING)], "unique": True,
+         "partialFilterExpression": {"legacy_id": {"$exists": True}}},
+    ],
+    "attendance_rollups": [
+        {"name": "employee_period_key_unique", "keys": [("employee_id", ASCENDING), ("period", ASCENDING), ("key", ASCENDING)], "unique": True},
+        {"name": "period_key", "keys": [("period", ASCENDING), ("key", ASCENDING)]},
+    ],
+    "employee_links": [
+        {"name": "employee_id_unique", "keys": [("employee_id", ASCENDING)], "unique": True},
+    ],
+    "admin_links": [
+        {"name": "created_at", "keys": [("created_at", DESCENDING)]},
+    ],
+    "mail_outbox": [
+        {"name": "status", "keys": [("status", ASCENDING), ("next_attempt_at", ASCENDING)]},
+    ],
+    "reset_tokens": [
+        {"name": "expires_at_ttl", "keys": [("expires_at", ASCENDING)], "expireAfterSeconds": 0},
+    ],
+    "revoked_tokens": [
+        {"name": "expires_at_ttl", "keys": [("expires_at", ASCENDING)], "expireAfterSeconds": 0},
+        {"name": "revoked_at", "keys": [("revoked_at", ASCENDING)]},
+    ],
+    "rate_limits": [
+        {"name": "expires_at_ttl", "keys": [("expires_at", ASCENDING)], "expireAfterSeconds": 0},
+    ],
+    "sync_tombstones": [
+        {"name": "scope_employee_deleted_at", "keys": [("scope", ASCENDING), ("employee_id", ASCENDING), ("deleted_at", ASCENDING)]},
+        {"name": "expires_at_ttl", "keys": [("expires_at", ASCENDING)], "expireAfterSeconds": 0},
+    ],
+    "news": [
+        {"name": "image_path", "keys": [("image_path", ASCENDING)]},
+        {"name": "legacy_id_unique", "keys": [("legacy_id", ASCENDING)], "unique": True,
+         "partialFilterExpression": {"legacy_id": {"$exists": True}}},
+    ],
+    "jobs": [
+        {"name": "legacy_id_unique", "keys": [("legacy_id", ASCENDING)], "unique": True,
+         "partialFilterExpression": {"legacy_id": {"$exists": True}}},
+    ],
+}
+
+# Indexes the write paths depend on for correctness, not just speed:
+# mark-in detects "already marked" only through the unique day index
+REQUIRED_INDEXES = [
+    ("attendance", "employee_day_unique"),
+]
+
+# Queries the API runs on every request, used by the report to check plans
+HOT_QUERIES = [
+    ("attendance", "mark in/out lookup", {"employee_id": 1, "day": 20250101}, None),
+    ("attendance", "employee history", {"employee_id": 1}, [("day", DESCENDING)]),
+    ("attendance", "employee changes since", {"employee_id": 1, "updated_at": {"$gte": datetime(2025, 1, 1)}}, None),
+    ("attendance", "date range", {"day": {"$gte": 20250101, "$lt": 20250201}}, [("day", DESCENDING)]),
+    ("employees", "lookup by id", {"id": 1}, None),
+    ("employee_links", "lookup by employee", {"employee_id": 1}, None),
+    ("admin_links", "list newest first", {}, [("created_at", DESCENDING)]),
+    ("admins", "login", {"email": "admin@example.com"}, None),
+]
+
+
+def _index_model(spec: dict) -> IndexModel:
+    options = {k: v for k, v in spec.items() if k != "keys"}
+    return IndexModel(spec["keys"], **options)
+
+
+def index_models(collection_name: str) -> list:
+    """The declared indexes of one collection, e.g. for a collection built to replace it"""
+    return [_index_model(spec) for spec in INDEXES[collection_name]]
+
+
+async def ensure_indexes(database) -> None:
+    """
+    Idempotently create the declared indexes.
+    A conflicting or unbuildable index (e.g. duplicates blocking a unique
+    index) is reported and skipped so the API still starts.
+    """
+    for collection_name, specs in INDEXES.items():
+        collection = database.get_collection(collection_name)
+        for spec in specs:
+            try:
+                await collection.create_indexes([_index_model(spec)])
+            except OperationFailure as e:
+                print(f"⚠️  Could not create index {collection_name}.{spec['name']}: {e}")
+    print("✅ Indexes verified")
+
+
+async def require_indexes(database) -> None:
+    """Refuse to start when a REQUIRED_INDEXES entry could not be built"""
+    for collection_name, name in REQUIRED_INDEXES:
+        spec = next(s for s in INDEXES[collection_name] if s["name"] == name)
+        existing = (await database.get_collection(collection_name).index_information()).get(name)
+        if existing is None or existing.get("unique", False) != spec.get("unique", False):
+            raise RuntimeError(
+                f"Required index {collection_name}.{name} is missing; "
+                "see the warning above and `python attendance_migration.py dedupe`"
+            )
+
+
+def _plan_stages(plan: dict) -> list:
+    """Flatten a winningPlan into its stage names, outermost first"""
+    stages = []
+    while plan:
+        stages.append(plan.get("stage", "?"))
+        plan = plan.get("inputStage") or (plan.get("inputStages") or [None])[0]
+    return stages
+
+
+async def report(database) -> None:
+    """Print index usage, missing declared indexes and plans for the hot queries"""
+    for collection_name, specs in INDEXES.items():
+        collection = database.get_collection(collection_name)
+        existing = await collection.index_information()
+
+        print(f"\n== {collection_name} ==")
+        for spec in specs:
+            status = "ok" if spec["name"] in existing else "MISSING"
+            print(f"  declared {spec['name']:<24} {status}")
+
+        async for stat in collection.aggregate([{"$indexStats": {}}]):
+            print(f"  usage    {stat['name']:<24} {stat['accesses']['ops']} ops since {stat['accesses']['since']}")
+
+    print("\n== query plans ==")
+    for collection_name, label, query, sort in HOT_QUERIES:
+        cursor = database.get_collection(collection_name).find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        plan = await cursor.explain()
+        winning_plan = plan["queryPlanner"]["winningPlan"]
+        stages = _plan_stages(winning_plan.get("queryPlan", winning_plan))
+        flag = "  <-- collection scan" if "COLLSCAN" in stages else ""
+        print(f"  {collection_name}: {label:<22} {' > '.join(stages)}{flag}")
+
+
+if __name__ == "__main__":
+    from database import database
+
+    command = sys.argv[1] if len(sys.argv) > 1 else "report"
+    if command == "ensure":
+        asyncio.run(ensure_indexes(database))
+    elif command == "report":
+        asyncio.run(report(database))
+    else:
+        print(__doc__)
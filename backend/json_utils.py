@@ -0,0 +1,31 @@
+"""
+JSON response utility
+orjson-backed serialization that encodes ObjectId, datetime and NumPy
+values natively, so handlers can return Mongo documents as they come
+from the driver without stringifying _id in a loop. Returning a
+MongoJSONResponse directly also skips FastAPI's jsonable_encoder pass.
+"""
+
+import orjson
+from bson import ObjectId
+from fastapi.responses import JSONResponse
+
+DUMPS_OPTIONS = orjson.OPT_SERIALIZE_NUMPY
+
+
+def _default(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content) -> bytes:
+    """Compact JSON bytes; naive datetimes render like datetime.isoformat()"""
+    return orjson.dumps(content, default=_default, option=DUMPS_OPTIONS)
+
+
+class MongoJSONResponse(JSONResponse):
+    """JSONResponse that accepts raw Mongo documents"""
+
+    def render(self, content) -> bytes:
+        return dumps(content)
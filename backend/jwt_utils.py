@@ -1,10 +1,191 @@
+"""
+JWT session utility
+Short-lived access tokens and longer-lived refresh tokens, checked by a
+FastAPI dependency without touching the database:
+  - the signing key is parsed once at import
+  - decoded claims are kept in a small LRU keyed by the raw token, so a
+    repeat request costs a dict lookup plus an expiry check
+  - revoked token ids (logout, refresh rotation) live in an in-memory set
+    that only holds unexpired ids, synced from revoked_tokens so every
+    uvicorn worker sees a revocation within JWT_REVOCATION_SYNC_SECONDS
+
+SECRET_KEY signs the tokens and must be set; the API refuses to start without it.
+DEVICE_API_KEYS (comma separated) are accepted from kiosks in an X-Device-Key
+header on the endpoints that allow devices.
+"""
+
+import asyncio
+import calendar
+import hmac
+import os
+import time
+import uuid
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from jose import jwt
+from typing import Optional
 
-SECRET_KEY = "CHANGE_THIS_TO_A_SECRET"
+from fastapi import Depends, Header, HTTPException
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from jose import JWTError, jwk, jwt
+
+SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = "HS256"
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "15"))
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "7"))
+JWT_CLAIMS_CACHE_SIZE = int(os.getenv("JWT_CLAIMS_CACHE_SIZE", "1024"))
+JWT_REVOCATION_SYNC_SECONDS = float(os.getenv("JWT_REVOCATION_SYNC_SECONDS", "30"))
+DEVICE_API_KEYS = [key.strip() for key in os.getenv("DEVICE_API_KEYS", "").split(",") if key.strip()]
+
+# A guessable default would let anyone forge admin tokens
+if not SECRET_KEY:
+    raise RuntimeError("SECRET_KEY environment variable is not set")
+
+# Parsed once instead of on every encode/decode
+_signing_key = jwk.construct(SECRET_KEY, ALGORITHM)
+
+_bearer = HTTPBearer(auto_error=False)
+
+
+def _unauthorized(detail: str) -> HTTPException:
+    return HTTPException(status_code=401, detail=detail, headers={"WWW-Authenticate": "Bearer"})
+
 
 def create_token(data: dict, expires_minutes=30):
     payload = data.copy()
-    payload["exp"] = datetime.utcnow() + timedelta(minutes=expires_minutes)
-    return jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM)
+    now = int(time.time())
+    payload.setdefault("jti", uuid.uuid4().hex)
+    payload["iat"] = now
+    payload["exp"] = now + int(expires_minutes * 60)
+    return jwt.encode(payload, _signing_key, algorithm=ALGORITHM)
+
+
+def _to_epoch(value: datetime) -> int:
+    # Mongo hands back naive UTC datetimes
+    return calendar.timegm(value.utctimetuple())
+
+
+class SessionTokens:
+    """Issues, verifies, rotates and revokes access/refresh token pairs"""
+
+    def __init__(self, revoked_collection, cache_size: int = JWT_CLAIMS_CACHE_SIZE):
+        self.revoked_collection = revoked_collection
+        self.cache_size = cache_size
+        self._claims = OrderedDict()  # token -> decoded claims, least recently used first
+        self._revoked = {}  # jti -> exp (epoch seconds)
+        self._synced_at = None
+        self._sync_task = None
+
+    # ---- issuing ----
+
+    def issue(self, subject, role: str) -> dict:
+        base = {"sub": str(subject), "role": role}
+        return {
+            "access_token": create_token({**base, "type": "access"}, ACCESS_TOKEN_EXPIRE_MINUTES),
+            "refresh_token": create_token({**base, "type": "refresh"}, REFRESH_TOKEN_EXPIRE_DAYS * 24 * 60),
+            "token_type": "bearer",
+            "expires_in": ACCESS_TOKEN_EXPIRE_MINUTES * 60
+        }
+
+    async def refresh(self, refresh_token: str) -> dict:
+        """Swap a refresh token for a new pair; the old refresh token stops working"""
+        claims = self.verify(refresh_token, token_type="refresh")
+        await self.revoke(claims)
+        return self.issue(claims["sub"], claims["role"])
+
+    # ---- verification ----
+
+    def verify(self, token: str, token_type: str = "access") -> dict:
+        claims = self._claims.get(token)
+        if claims is None:
+            try:
+                claims = jwt.decode(token, _signing_key, algorithms=[ALGORITHM])
+            except JWTError:
+                raise _unauthorized("Invalid or expired token")
+            self._claims[token] = claims
+            if len(self._claims) > self.cache_size:
+                self._claims.popitem(last=False)
+        else:
+            self._claims.move_to_end(token)
+            if claims["exp"] <= time.time():
+                del self._claims[token]
+                raise _unauthorized("Invalid or expired token")
+
+        if claims.get("type") != token_type:
+            raise _unauthorized("Invalid token type")
+        if claims.get("jti") in self._revoked:
+            raise _unauthorized("Token has been revoked")
+        return claims
+
+    def require(self, role: str):
+        """Dependency that accepts a valid bearer access token for role and returns its claims"""
+        async def dependency(credentials: Optional[HTTPAuthorizationCredentials] = Depends(_bearer)):
+            if credentials is None:
+                raise _unauthorized("Not authenticated")
+            claims = self.verify(credentials.credentials)
+            if claims.get("role") != role:
+                raise HTTPException(status_code=403, detail="Not allowed")
+            return claims
+        return dependency
+
+    def require_device(self, role: str, device_keys: list = None):
+        """Like require(role), but a known X-Device-Key is accepted instead of a token"""
+        device_keys = [key.encode() for key in (DEVICE_API_KEYS if device_keys is None else device_keys)]
+        check_token = self.require(role)
+
+        async def dependency(
+            x_device_key: Optional[str] = Header(None),
+            credentials: Optional[HTTPAuthorizationCredentials] = Depends(_bearer)
+        ):
+            if x_device_key is not None:
+                if any(hmac.compare_digest(x_device_key.encode(), key) for key in device_keys):
+                    return {"sub": "device", "role": "device"}
+                raise _unauthorized("Invalid device key")
+            return await check_token(credentials)
+        return dependency
+
+    # ---- revocation ----
+
+    async def revoke(self, claims: dict):
+        self._revoked[claims["jti"]] = claims["exp"]
+        await self.revoked_collection.update_one(
+            {"_id": claims["jti"]},
+            {"$set": {
+                "expires_at": datetime.utcfromtimestamp(claims["exp"]),
+                "revoked_at": datetime.utcnow()
+            }},
+            upsert=True
+        )
+
+    async def sync_revocations(self):
+        """Pull revocations made by other workers and forget expired ones"""
+        started = datetime.utcnow()
+        query = {"expires_at": {"$gt": started}}
+        if self._synced_at is not None:
+            # Overlap a little so writes landing mid-sync aren't missed
+            query["revoked_at"] = {"$gte": self._synced_at - timedelta(seconds=5)}
+
+        async for doc in self.revoked_collection.find(query, {"expires_at": 1}):
+            self._revoked[doc["_id"]] = _to_epoch(doc["expires_at"])
+        self._synced_at = started
+
+        now = time.time()
+        self._revoked = {jti: exp for jti, exp in self._revoked.items() if exp > now}
+
+    async def _sync_loop(self):
+        while True:
+            await asyncio.sleep(JWT_REVOCATION_SYNC_SECONDS)
+            try:
+                await self.sync_revocations()
+            except Exception as e:
+                print(f"⚠️  Token revocation sync failed: {e}")
+
+    async def start(self):
+        await self.sync_revocations()
+        if self._sync_task is None:
+            self._sync_task = asyncio.create_task(self._sync_loop())
+
+    async def stop(self):
+        if self._sync_task is not None:
+            self._sync_task.cancel()
+            await asyncio.gather(self._sync_task, return_exceptions=True)
+            self._sync_task = None
@@ -1,15 +1,28 @@
 """
 Location verification utility
 Checks if employee is within acceptable radius of allowed locations
+
+Sites come from ALLOWED_LOCATIONS, a JSON file (GEOFENCE_SITES_FILE) or the
+geofence_sites collection. Each site has its own radius and may instead be
+an outline polygon. Sites are bucketed into a lat/lon grid so a check only
+looks at the few sites near the point. A single check (mark-in/out) walks
+those candidates with plain math, which beats NumPy's per-call overhead
+until a cell holds more than SCALAR_MAX_CANDIDATES sites; check_locations()
+tests whole arrays of coordinates at once with NumPy.
 """
 
+import json
 import math
+import os
+
+import numpy as np
 
 # Allowed locations (extracted from Google Maps share links)
 # Location 1: https://share.google/PseeFBdZLyJWyfzak
 # Location 2: https://share.google/4RJnGZgLBLPSlF8Il
 # Note: You'll need to extract actual lat/long from these links
 # For now, using placeholder coordinates - REPLACE THESE WITH ACTUAL COORDINATES
+# A site may also set "radius_meters", or a "polygon" of [latitude, longitude] points
 
 ALLOWED_LOCATIONS = [
     # {
@@ -24,12 +37,24 @@ ALLOWED_LOCATIONS = [
     },
     {
         "name": "Location 2",
-        "latitude": 9.992306487982402,  
+        "latitude": 9.992306487982402,
         "longitude": 76.2794340490761
     }
 ]
 
-ALLOWED_RADIUS_METERS = 100  # 100 meters radius
+ALLOWED_RADIUS_METERS = 100  # default radius for sites without their own
+
+GEOFENCE_SITES_FILE = os.getenv("GEOFENCE_SITES_FILE")
+
+EARTH_RADIUS_METERS = 6371000
+
+# Grid cell size for the spatial index (~5.5 km of latitude)
+CELL_DEGREES = 0.05
+LON_CELLS = int(round(360 / CELL_DEGREES))
+
+# Above this many candidates in one cell a single check goes through NumPy
+# (measured worst case, no site matching: the math loop wins below ~80)
+SCALAR_MAX_CANDIDATES = 64
 
 
 def calculate_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
@@ -38,46 +63,257 @@ def calculate_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> fl
     Returns distance in meters
     """
     # Radius of Earth in meters
-    R = 6371000
-    
+    R = EARTH_RADIUS_METERS
+
     # Convert to radians
     phi1 = math.radians(lat1)
     phi2 = math.radians(lat2)
     delta_phi = math.radians(lat2 - lat1)
     delta_lambda = math.radians(lon2 - lon1)
-    
+
     # Haversine formula
     a = math.sin(delta_phi / 2) ** 2 + \
         math.cos(phi1) * math.cos(phi2) * math.sin(delta_lambda / 2) ** 2
     c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    
+
     distance = R * c
     return distance
 
 
+def _unit_vectors(latitudes, longitudes) -> np.ndarray:
+    """Points on the unit sphere, shape (n, 3)"""
+    phi = np.radians(np.asarray(latitudes, dtype=float))
+    lam = np.radians(np.asarray(longitudes, dtype=float))
+    cos_phi = np.cos(phi)
+    return np.stack([cos_phi * np.cos(lam), cos_phi * np.sin(lam), np.sin(phi)], axis=-1)
+
+
+def _cell_keys(latitudes, longitudes) -> np.ndarray:
+    lat_cells = np.floor((np.asarray(latitudes, dtype=float) + 90) / CELL_DEGREES).astype(np.int64)
+    lon_cells = np.floor((np.asarray(longitudes, dtype=float) + 180) / CELL_DEGREES).astype(np.int64) % LON_CELLS
+    return lat_cells * LON_CELLS + lon_cells
+
+
+def _cell_key(latitude: float, longitude: float) -> int:
+    lat_cell = math.floor((latitude + 90) / CELL_DEGREES)
+    lon_cell = math.floor((longitude + 180) / CELL_DEGREES) % LON_CELLS
+    return lat_cell * LON_CELLS + lon_cell
+
+
+def _point_in_polygon(latitude: float, longitude: float, polygon) -> bool:
+    """Scalar twin of _points_in_polygon"""
+    inside = False
+    lat_j, lon_j = polygon[-1]
+    for lat_i, lon_i in polygon:
+        if (lat_i > latitude) != (lat_j > latitude):
+            if longitude < (lon_j - lon_i) * (latitude - lat_i) / (lat_j - lat_i) + lon_i:
+                inside = not inside
+        lat_j, lon_j = lat_i, lon_i
+    return inside
+
+
+def _points_in_polygon(latitudes: np.ndarray, longitudes: np.ndarray, polygon: np.ndarray) -> np.ndarray:
+    """Even-odd ray casting in the lat/lon plane (fine at yard scale)"""
+    inside = np.zeros(latitudes.shape, dtype=bool)
+    lat_j, lon_j = polygon[-1]
+    for lat_i, lon_i in polygon:
+        crosses = (lat_i > latitudes) != (lat_j > latitudes)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            lon_at_lat = (lon_j - lon_i) * (latitudes - lat_i) / (lat_j - lat_i) + lon_i
+        inside ^= crosses & (longitudes < lon_at_lat)
+        lat_j, lon_j = lat_i, lon_i
+    return inside
+
+
+class GeofenceSite:
+    """One allowed site: a circle, or a polygon with its bounding circle"""
+
+    def __init__(self, name: str, latitude: float = None, longitude: float = None,
+                 radius_meters: float = ALLOWED_RADIUS_METERS, polygon: list = None):
+        self.name = name
+        self.polygon = np.asarray(polygon, dtype=float) if polygon else None
+        self.polygon_points = [tuple(map(float, point)) for point in polygon] if polygon else None
+
+        if self.polygon is not None:
+            # Index the polygon by a circle around its vertices
+            latitude, longitude = self.polygon.mean(axis=0)
+            radius_meters = max(
+                calculate_distance(latitude, longitude, lat, lon) for lat, lon in self.polygon
+            )
+
+        self.latitude = float(latitude)
+        self.longitude = float(longitude)
+        self.radius_meters = float(radius_meters)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "GeofenceSite":
+        return cls(
+            name=data["name"],
+            latitude=data.get("latitude"),
+            longitude=data.get("longitude"),
+            radius_meters=data.get("radius_meters", ALLOWED_RADIUS_METERS),
+            polygon=data.get("polygon")
+        )
+
+
+class GeofenceIndex:
+    """Sites bucketed by grid cell, checked with vectorised chord distances"""
+
+    def __init__(self, sites: list):
+        self.sites = sites
+        self.names = np.array([site.name for site in sites] + [None], dtype=object)
+        self.vectors = _unit_vectors(
+            [site.latitude for site in sites], [site.longitude for site in sites]
+        ).reshape(-1, 3)
+        # Being within r metres is the same as a chord of at most 2*sin(r / 2R)
+        self.max_chords = np.array(
+            [2 * math.sin(site.radius_meters / (2 * EARTH_RADIUS_METERS)) for site in sites]
+        )
+
+        buckets = {}
+        for index, site in enumerate(sites):
+            for key in self._covered_cells(site):
+                buckets.setdefault(key, []).append(index)
+        self.buckets = {key: np.array(indexes) for key, indexes in buckets.items()}
+        self.bucket_lists = buckets
+
+    @staticmethod
+    def _covered_cells(site: GeofenceSite):
+        """Every grid cell the site's circle can reach"""
+        dlat = math.degrees(site.radius_meters / EARTH_RADIUS_METERS)
+        dlon = min(dlat / max(math.cos(math.radians(site.latitude)), 1e-6), 180)
+
+        lat_lo = math.floor((max(site.latitude - dlat, -90) + 90) / CELL_DEGREES)
+        lat_hi = math.floor((min(site.latitude + dlat, 90) + 90) / CELL_DEGREES)
+        lon_lo = math.floor((site.longitude - dlon + 180) / CELL_DEGREES)
+        lon_hi = math.floor((site.longitude + dlon + 180) / CELL_DEGREES)
+
+        for lat_cell in range(lat_lo, lat_hi + 1):
+            for lon_cell in range(lon_lo, min(lon_hi, lon_lo + LON_CELLS - 1) + 1):
+                yield lat_cell * LON_CELLS + lon_cell % LON_CELLS
+
+    def check_one(self, latitude: float, longitude: float):
+        """Scalar check_many for one point: (site_index or -1, distance or None)"""
+        candidates = self.bucket_lists.get(_cell_key(latitude, longitude))
+        if not candidates:
+            return -1, None
+        if len(candidates) > SCALAR_MAX_CANDIDATES:
+            site_index, distance = self.check_many([latitude], [longitude])
+            return int(site_index[0]), (None if site_index[0] < 0 else float(distance[0]))
+
+        for candidate in candidates:
+            site = self.sites[candidate]
+            distance = calculate_distance(latitude, longitude, site.latitude, site.longitude)
+            if distance > site.radius_meters:
+                continue
+            if site.polygon_points is not None and not _point_in_polygon(latitude, longitude, site.polygon_points):
+                continue
+            return candidate, distance
+        return -1, None
+
+    def check_many(self, latitudes, longitudes):
+        """
+        Returns (site_index, distance) arrays; site_index is -1 and distance
+        NaN where no site matches. The first matching site wins, as in the
+        order sites were configured.
+        """
+        latitudes = np.atleast_1d(np.asarray(latitudes, dtype=float))
+        longitudes = np.atleast_1d(np.asarray(longitudes, dtype=float))
+        points = _unit_vectors(latitudes, longitudes)
+
+        site_index = np.full(latitudes.shape, -1, dtype=np.int64)
+        distance = np.full(latitudes.shape, np.nan)
+
+        # Group the points by cell and test each group against its bucket
+        keys = _cell_keys(latitudes, longitudes)
+        order = np.argsort(keys, kind="stable")
+        unique_keys, starts = np.unique(keys[order], return_index=True)
+        ends = np.append(starts[1:], len(order))
+
+        for key, start, end in zip(unique_keys, starts, ends):
+            candidates = self.buckets.get(int(key))
+            if candidates is None:
+                continue
+
+            members = order[start:end]
+            chords = np.linalg.norm(
+                points[members][:, None, :] - self.vectors[candidates][None, :, :], axis=-1
+            )
+            inside = chords <= self.max_chords[candidates]
+
+            for column, candidate in enumerate(candidates):
+                polygon = self.sites[candidate].polygon
+                if polygon is not None and inside[:, column].any():
+                    inside[:, column] &= _points_in_polygon(
+                        latitudes[members], longitudes[members], polygon
+                    )
+
+            matched = inside.any(axis=1)
+            first = inside.argmax(axis=1)
+            rows = np.nonzero(matched)[0]
+            site_index[members[rows]] = candidates[first[rows]]
+            distance[members[rows]] = EARTH_RADIUS_METERS * 2 * np.arcsin(
+                np.minimum(chords[rows, first[rows]] / 2, 1.0)
+            )
+
+        return site_index, distance
+
+
+def load_configured_sites() -> list:
+    """Sites from GEOFENCE_SITES_FILE when set, otherwise ALLOWED_LOCATIONS"""
+    if GEOFENCE_SITES_FILE:
+        with open(GEOFENCE_SITES_FILE) as f:
+            return [GeofenceSite.from_dict(site) for site in json.load(f)]
+    return [GeofenceSite.from_dict(site) for site in ALLOWED_LOCATIONS]
+
+
+_index = GeofenceIndex(load_configured_sites())
+
+
+def set_sites(sites: list):
+    """Swap in a new site list (rebuilds the spatial index)"""
+    global _index
+    _index = GeofenceIndex(sites)
+
+
+async def load_sites_from_db(collection):
+    """Use the sites stored in Mongo, if any, instead of the configured ones"""
+    sites = [GeofenceSite.from_dict(doc) async for doc in collection.find({}, {"_id": 0})]
+    if sites:
+        set_sites(sites)
+    print(f"✅ Geofence loaded with {len(_index.sites)} site(s)")
+
+
+def check_locations(latitudes, longitudes) -> dict:
+    """
+    Batch check for audits and imports
+    Returns {"allowed": bool array, "location_name": object array, "distance": float array}
+    """
+    site_index, distance = _index.check_many(latitudes, longitudes)
+    return {
+        "allowed": site_index >= 0,
+        "location_name": _index.names[site_index],
+        "distance": np.round(distance, 2)
+    }
+
+
 def is_location_allowed(latitude: float, longitude: float) -> dict:
     """
     Check if the given coordinates are within acceptable radius of any allowed location
     Returns: {"allowed": bool, "location_name": str, "distance": float}
     """
-    for location in ALLOWED_LOCATIONS:
-        distance = calculate_distance(
-            latitude, 
-            longitude, 
-            location["latitude"], 
-            location["longitude"]
-        )
-        
-        if distance <= ALLOWED_RADIUS_METERS:
-            return {
-                "allowed": True,
-                "location_name": location["name"],
-                "distance": round(distance, 2)
-            }
-    
+    site_index, distance = _index.check_one(latitude, longitude)
+
+    if site_index >= 0:
+        return {
+            "allowed": True,
+            "location_name": _index.sites[site_index].name,
+            "distance": round(distance, 2)
+        }
+
     # If not within any allowed location
     return {
         "allowed": False,
         "location_name": None,
         "distance": None
-    }
\ No newline at end of file
+    }
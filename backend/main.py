@@ -1,28 +1,69 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form
-from fastapi.staticfiles import StaticFiles
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Request, Query, BackgroundTasks, Depends
 from fastapi.middleware.cors import CORSMiddleware
-import shutil
+from fastapi.responses import StreamingResponse
 import os
+import asyncio
 from typing import Optional
 from datetime import datetime, date, timedelta
 import uuid
 from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 from dotenv import load_dotenv
 
 import schemas
 from database import (
+    database,
+    connect_db,
+    close_db,
+    get_pool_stats,
     admins_collection,
     news_collection,
     jobs_collection,
     employees_collection,
     attendance_collection,
     employee_links_collection,
-    admin_links_collection
+    admin_links_collection,
+    mail_outbox_collection,
+    attendance_rollups_collection,
+    geofence_sites_collection,
+    reset_tokens_collection,
+    revoked_tokens_collection,
+    rate_limits_collection,
+    sync_tombstones_collection,
+    migration_locks_collection
 )
-from location_utils import is_location_allowed
-
-import smtplib
-from email.message import EmailMessage
+from location_utils import is_location_allowed, check_locations, load_sites_from_db
+from attendance_utils import (
+    day_fields,
+    day_key,
+    day_range_query,
+    fetch_attendance_groups,
+    hours_until_expr,
+    join_attendance,
+    parse_timestamp,
+    render_day
+)
+from attendance_migration import MigrationLock, dedupe_attendance, migrate_attendance
+from rollup_utils import EMPTY_SUMMARY, AttendanceRollups
+from index_utils import ensure_indexes, require_indexes
+from email_utils import MailQueue
+from cache_utils import ResponseCache
+from pagination_utils import MAX_PAGE_SIZE, build_projection, paginate
+from export_utils import attendance_rows, stream_csv, stream_xlsx
+from upload_utils import save_upload, generate_variants, build_srcset, remove_image
+from static_utils import UploadFiles
+from token_store import create_token_store
+from employee_cache import EmployeeDirectory
+from json_utils import MongoJSONResponse
+from compression_utils import CompressionMiddleware
+import sync_utils
+from sync_utils import Tombstones
+import password_utils
+from password_utils import hash_password, verify_password
+from jwt_utils import SessionTokens
+from rate_limit import RateLimitMiddleware, create_bucket_store
+from metrics_utils import EMAIL_SECONDS, GEOFENCE_SECONDS, MetricsMiddleware, metrics_response
 
 # Load environment variables
 load_dotenv()
@@ -30,11 +71,7 @@ load_dotenv()
 # ----------------------------
 # FastAPI App
 # ----------------------------
-app = FastAPI()
-
-SECRET_KEY = "AdminSecretKey"
-ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 60
+app = FastAPI(default_response_class=MongoJSONResponse)
 
 # ✅ Get credentials from environment variables
 SMTP_EMAIL = os.getenv("SMTP_EMAIL")
@@ -46,7 +83,37 @@ ALLOWED_ORIGINS = os.getenv("ALLOWED_ORIGINS", "http://localhost:5173,http://127
 if not SMTP_EMAIL or not SMTP_PASSWORD:
     raise ValueError("SMTP credentials not found in environment variables")
 
-reset_tokens = {}  # token -> email/employee data
+# token -> email/employee data, expiring and shared across workers
+reset_tokens = create_token_store(reset_tokens_collection)
+
+# Bearer tokens for the admin dashboard, verified without a DB round trip
+sessions = SessionTokens(revoked_tokens_collection)
+require_admin = sessions.require("admin")
+# Kiosks send an X-Device-Key (DEVICE_API_KEYS); admins may also upload backlogs
+require_device = sessions.require_device("admin")
+
+# Outbound mail is queued and delivered by background workers
+mail_queue = MailQueue(mail_outbox_collection, SMTP_EMAIL, SMTP_PASSWORD)
+
+# Roster cache for the per-request employee lookups
+employee_directory = EmployeeDirectory(employees_collection)
+
+# Daily/monthly attendance totals behind the summary blocks
+rollups = AttendanceRollups(attendance_collection, attendance_rollups_collection)
+
+# Public news/jobs responses, cleared whenever an admin writes
+news_cache = ResponseCache()
+jobs_cache = ResponseCache()
+
+# Deleted attendance/link ids for the portal's ?since= sync
+tombstones = Tombstones(sync_tombstones_collection)
+migration_lock = MigrationLock(migration_locks_collection)
+
+# Innermost: compress large JSON/CSV bodies (cached news/jobs arrive already encoded)
+app.add_middleware(CompressionMiddleware)
+
+# Throttle the endpoints that send mail (added first so CORS headers wrap its 429s)
+app.add_middleware(RateLimitMiddleware, store=create_bucket_store(rate_limits_collection))
 
 # ✅ Updated CORS with environment variables
 app.add_middleware(
@@ -58,6 +125,9 @@ app.add_middleware(
     expose_headers=["*"],
 )
 
+# Outermost, so the latency histogram covers the whole stack including 429s
+app.add_middleware(MetricsMiddleware)
+
 # ✅ Create uploads directory on startup
 @app.on_event("startup")
 async def startup_event():
@@ -65,11 +135,61 @@ async def startup_event():
     print("✅ Uploads directory created/verified")
     print(f"✅ Frontend URL: {FRONTEND_URL}")
     print(f"✅ Allowed Origins: {ALLOWED_ORIGINS}")
+    await connect_db()
+    # One worker migrates while the others wait; before the indexes, since the
+    # unique day index needs every record converted and one record per employee-day
+    if await migration_lock.acquire():
+        try:
+            await migrate_attendance(attendance_collection)
+            merged = await dedupe_attendance(attendance_collection, tombstones)
+            await ensure_indexes(database)
+            if merged:
+                await rollups.rebuild()
+            else:
+                await rollups.ensure_built()
+        finally:
+            await migration_lock.release()
+    else:
+        await migration_lock.wait()
+    await require_indexes(database)
+    await load_sites_from_db(geofence_sites_collection)
+    employee_directory.start()
+    await sessions.start()
+    await mail_queue.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await mail_queue.stop()
+    await employee_directory.stop()
+    await sessions.stop()
+    password_utils.shutdown()
+    close_db()
+
+
+@app.get("/health/db")
+async def get_db_health():
+    """MongoDB round trip plus connection pool usage, for sizing against worker counts"""
+    started = datetime.utcnow()
+    try:
+        await database.command("ping")
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Database unavailable: {str(e)}")
+    return {
+        "ping_ms": round((datetime.utcnow() - started).total_seconds() * 1000, 2),
+        "pool": get_pool_stats()
+    }
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus scrape endpoint"""
+    return metrics_response()
 
 # ----------------------------
-# Serve uploaded images
+# Serve uploaded images (immutable caching for content-hashed files)
 # ----------------------------
-app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
+app.mount("/uploads", UploadFiles(directory="uploads"), name="uploads")
 
 # ----------------------------
 # Contact Form & Careers Application APIs
@@ -97,7 +217,7 @@ Message:
 {message}
         """
         
-        send_email(
+        await send_email(
             to="sales@magmarine.in",
             subject=f"Contact Form: {subject}",
             body=body
@@ -130,7 +250,7 @@ Position: {job_title}
 Note: Applicant should attach their resume when replying to this email.
 """
         
-        send_email(
+        await send_email(
             to="careers@magmarine.in",
             subject=f"Application for {job_title}",
             body=body
@@ -144,32 +264,23 @@ Note: Applicant should attach their resume when replying to this email.
 # ----------------------------
 # Email Helper
 # ----------------------------
-def send_email(to: str, subject: str, body: str):
-    EMAIL_ADDRESS = SMTP_EMAIL
-    EMAIL_PASSWORD = SMTP_PASSWORD
-
-    msg = EmailMessage()
-    msg["From"] = EMAIL_ADDRESS
-    msg["To"] = to
-    msg["Subject"] = subject
-    msg.set_content(body)
-
-    with smtplib.SMTP_SSL("smtp.gmail.com", 465) as server:
-        server.login(EMAIL_ADDRESS, EMAIL_PASSWORD)
-        server.send_message(msg)
+async def send_email(to: str, subject: str, body: str):
+    """Queue an email; delivery happens in the background mail workers"""
+    with EMAIL_SECONDS.labels("enqueue").time():
+        await mail_queue.enqueue(to, subject, body)
 
 
 # ----------------------------
 # Helper Functions for Attendance
 # ----------------------------
-def calculate_hours(in_time_str: str, out_time_str: Optional[str]) -> float:
-    """Calculate hours worked between in_time and out_time"""
-    if not out_time_str:
+def calculate_hours(in_time, out_time) -> float:
+    """Calculate hours worked between in_time and out_time (datetimes or ISO strings)"""
+    if not out_time:
         return 0.0
     
     try:
-        in_time = datetime.fromisoformat(in_time_str)
-        out_time = datetime.fromisoformat(out_time_str)
+        in_time = parse_timestamp(in_time)
+        out_time = parse_timestamp(out_time)
         
         duration = out_time - in_time
         hours = duration.total_seconds() / 3600
@@ -203,6 +314,40 @@ def get_date_range(filter_type: str):
     return None, None
 
 
+def resolve_date_range(
+    filter: Optional[str],
+    date: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    month: Optional[int] = None,
+    year: Optional[int] = None
+):
+    """
+    Resolve the attendance date options to a [start, end) pair of ISO dates
+    Custom: date, start_date+end_date, month+year - otherwise the filter
+    Returns (None, None) when no range applies
+    """
+    if date:
+        # Single custom date
+        return date, (datetime.fromisoformat(date) + timedelta(days=1)).date().isoformat()
+
+    if start_date and end_date:
+        # Custom week/range
+        return start_date, end_date
+
+    if month and year:
+        # Custom month
+        first_day = datetime(year, month, 1).date()
+        if month == 12:
+            last_day = datetime(year + 1, 1, 1).date()
+        else:
+            last_day = datetime(year, month + 1, 1).date()
+        return first_day.isoformat(), last_day.isoformat()
+
+    # Use filter parameter (today, week, month)
+    return get_date_range(filter)
+
+
 # ----------------------------
 # Admin Auth APIs
 # ----------------------------
@@ -217,11 +362,37 @@ async def admin_login(
     if not admin:
         raise HTTPException(status_code=401, detail="Invalid email or password")
     
-    # Check password
-    if admin["password_hash"] != password:
+    # Check password (bcrypt runs on the hashing pool)
+    matches, new_hash = await verify_password(password, admin.get("password_hash"))
+    if not matches:
         raise HTTPException(status_code=401, detail="Invalid email or password")
 
-    return {"message": "Login successful"}
+    # Upgrade plaintext/outdated hashes; skipped if the password changed meanwhile
+    if new_hash:
+        await admins_collection.update_one(
+            {"_id": admin["_id"], "password_hash": admin["password_hash"]},
+            {"$set": {"password_hash": new_hash}}
+        )
+
+    return {"message": "Login successful", **sessions.issue(admin["email"], "admin")}
+
+
+@app.post("/auth/refresh")
+async def refresh_session(refresh_token: str = Form(...)):
+    """Exchange a refresh token for a new access/refresh pair"""
+    return await sessions.refresh(refresh_token)
+
+
+@app.post("/auth/logout")
+async def logout(refresh_token: str = Form(None), claims: dict = Depends(require_admin)):
+    """Revoke the current access token and, if given, its refresh token"""
+    await sessions.revoke(claims)
+    if refresh_token:
+        try:
+            await sessions.revoke(sessions.verify(refresh_token, token_type="refresh"))
+        except HTTPException:
+            pass
+    return {"message": "Logged out"}
 
 
 @app.post("/auth/forgot-password")
@@ -234,12 +405,12 @@ async def forgot_password():
     
     email = admin["email"]
     token = str(uuid.uuid4())
-    reset_tokens[token] = email
+    await reset_tokens.put(token, {"email": email, "type": "admin"})
 
     # ✅ Use environment variable for frontend URL
     reset_link = f"{FRONTEND_URL}/?token={token}"
 
-    send_email(
+    await send_email(
         to=email,
         subject="Reset Admin Password",
         body=f"""
@@ -261,22 +432,21 @@ async def reset_password(
     token: str = Form(...),
     new_password: str = Form(...)
 ):
-    if token not in reset_tokens:
+    # Claimed up front so two concurrent requests can't both redeem it
+    token_data = await reset_tokens.claim(token, "admin")
+    if not token_data:
         raise HTTPException(status_code=400, detail="Invalid or expired token")
 
-    email = reset_tokens[token]
+    email = token_data["email"]
     
     # Find admin by email and update password
     result = await admins_collection.update_one(
         {"email": email},
-        {"$set": {"password_hash": new_password}}
+        {"$set": {"password_hash": await hash_password(new_password)}}
     )
     
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="Admin not found")
-    
-    # Remove used token
-    del reset_tokens[token]
 
     return {"message": "Password reset successful"}
 
@@ -284,19 +454,41 @@ async def reset_password(
 # ----------------------------
 # News APIs (FIXED DELETE & EDIT)
 # ----------------------------
-@app.post("/news")
+async def process_news_image(news_id: ObjectId, image_path: str):
+    """Background task: build resized variants and record them on the news item"""
+    try:
+        variants = await asyncio.to_thread(generate_variants, image_path)
+    except Exception as e:
+        print(f"Warning: Could not generate image variants for {image_path}: {e}")
+        return
+
+    # Skip if the image was replaced while we were resizing
+    await news_collection.update_one(
+        {"_id": news_id, "image_path": image_path},
+        {"$set": {"image_variants": variants, "image_srcset": build_srcset(variants)}}
+    )
+    news_cache.invalidate()
+
+
+async def remove_news_image_if_unused(image_path: Optional[str], news_id: ObjectId):
+    """Uploads are deduplicated by content, so only delete files no other news uses"""
+    if not image_path or not os.path.exists(image_path):
+        return
+
+    other = await news_collection.find_one({"image_path": image_path, "_id": {"$ne": news_id}}, {"_id": 1})
+    if not other:
+        remove_image(image_path)
+
+
+@app.post("/news", dependencies=[Depends(require_admin)])
 async def add_news(
+    background_tasks: BackgroundTasks,
     title: str = Form(...),
     description: str = Form(...),
     date: str = Form(...),
     image: UploadFile = File(...)
 ):
-    # Create uploads directory if it doesn't exist
-    os.makedirs("uploads/news", exist_ok=True)
-    
-    file_path = f"uploads/news/{image.filename}"
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(image.file, buffer)
+    file_path = await save_upload(image, "uploads/news")
 
     news_data = {
         "title": title,
@@ -306,18 +498,30 @@ async def add_news(
     }
 
     result = await news_collection.insert_one(news_data)
+    news_cache.invalidate()
+    background_tasks.add_task(process_news_image, result.inserted_id, file_path)
     news_data["_id"] = str(result.inserted_id)
     
     return news_data
 
 
 @app.get("/news")
-async def get_news():
-    news_list = []
-    async for news in news_collection.find():
-        news["_id"] = str(news["_id"])
-        news_list.append(news)
-    return news_list
+async def get_news(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    fields: Optional[str] = None
+):
+    async def load_news():
+        return await paginate(
+            news_collection, {}, [("_id", ASCENDING)],
+            limit=limit, after=after, projection=build_projection(fields)
+        )
+
+    # Only the first page of each size is cached; cursors and projections are open-ended
+    cache_key = None if (after or fields) else (limit or "all")
+    entry = await news_cache.get_or_load(cache_key, load_news)
+    return entry.to_response(request)
 
 
 @app.get("/news/{news_id}")
@@ -328,15 +532,15 @@ async def get_single_news(news_id: str):
         if not news:
             raise HTTPException(status_code=404, detail="News not found")
         
-        news["_id"] = str(news["_id"])
-        return news
+        return MongoJSONResponse(news)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Invalid news ID: {str(e)}")
 
 
-@app.put("/news/{news_id}")
+@app.put("/news/{news_id}", dependencies=[Depends(require_admin)])
 async def update_news(
     news_id: str,
+    background_tasks: BackgroundTasks,
     title: str = Form(...),
     description: str = Form(...),
     date: str = Form(...),
@@ -356,38 +560,45 @@ async def update_news(
         }
 
         # Update image if provided
+        old_image = news.get("image_path")
+        file_path = None
         if image and image.filename:
-            # Create uploads directory if it doesn't exist
-            os.makedirs("uploads/news", exist_ok=True)
-            
-            # Delete old image if it exists
-            if news.get("image_path") and os.path.exists(news["image_path"]):
-                try:
-                    os.remove(news["image_path"])
-                except:
-                    pass
-            
-            # Save new image
-            file_path = f"uploads/news/{image.filename}"
-            with open(file_path, "wb") as buffer:
-                shutil.copyfileobj(image.file, buffer)
+            file_path = await save_upload(image, "uploads/news")
             update_data["image_path"] = file_path
-
-        result = await news_collection.update_one(
-            {"_id": ObjectId(news_id)},
-            {"$set": update_data}
-        )
+            update_data["image_variants"] = []
+            update_data["image_srcset"] = {}
+
+        try:
+            result = await news_collection.update_one(
+                {"_id": ObjectId(news_id)},
+                {"$set": update_data}
+            )
+        except Exception:
+            # The document still points at the old image; drop the new upload instead
+            if file_path and file_path != old_image:
+                await remove_news_image_if_unused(file_path, news["_id"])
+            raise
+        news_cache.invalidate()
 
         if result.modified_count == 0 and result.matched_count == 0:
             raise HTTPException(status_code=404, detail="News not found")
 
+        if file_path:
+            # Only now that nothing points at it, delete the old image if no other news uses it
+            if old_image != file_path:
+                await remove_news_image_if_unused(old_image, news["_id"])
+            background_tasks.add_task(process_news_image, news["_id"], file_path)
+
         return {"message": "News updated successfully", "news_id": news_id}
     
+    except HTTPException:
+        # e.g. 404 here or 413 from save_upload, passed through unchanged
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error updating news: {str(e)}")
 
 
-@app.delete("/news/{news_id}")
+@app.delete("/news/{news_id}", dependencies=[Depends(require_admin)])
 async def delete_news(news_id: str):
     """Delete a news item"""
     try:
@@ -395,14 +606,11 @@ async def delete_news(news_id: str):
         if not news:
             raise HTTPException(status_code=404, detail="News not found")
 
-        # Delete image file if it exists
-        if news.get("image_path") and os.path.exists(news["image_path"]):
-            try:
-                os.remove(news["image_path"])
-            except Exception as e:
-                print(f"Warning: Could not delete image file: {e}")
+        # Delete image file (and its variants) if nothing else uses it
+        await remove_news_image_if_unused(news.get("image_path"), news["_id"])
 
         result = await news_collection.delete_one({"_id": ObjectId(news_id)})
+        news_cache.invalidate()
         
         if result.deleted_count == 0:
             raise HTTPException(status_code=404, detail="News not found")
@@ -416,21 +624,32 @@ async def delete_news(news_id: str):
 # ----------------------------
 # Jobs APIs (FIXED DELETE & EDIT)
 # ----------------------------
-@app.post("/jobs")
+@app.post("/jobs", dependencies=[Depends(require_admin)])
 async def add_job(job: schemas.JobCreate):
     job_data = job.dict()
     result = await jobs_collection.insert_one(job_data)
+    jobs_cache.invalidate()
     job_data["_id"] = str(result.inserted_id)
     return job_data
 
 
 @app.get("/jobs")
-async def get_jobs():
-    jobs_list = []
-    async for job in jobs_collection.find():
-        job["_id"] = str(job["_id"])
-        jobs_list.append(job)
-    return jobs_list
+async def get_jobs(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    fields: Optional[str] = None
+):
+    async def load_jobs():
+        return await paginate(
+            jobs_collection, {}, [("_id", ASCENDING)],
+            limit=limit, after=after, projection=build_projection(fields)
+        )
+
+    # Only the first page of each size is cached; cursors and projections are open-ended
+    cache_key = None if (after or fields) else (limit or "all")
+    entry = await jobs_cache.get_or_load(cache_key, load_jobs)
+    return entry.to_response(request)
 
 
 @app.get("/jobs/{job_id}")
@@ -441,13 +660,12 @@ async def get_single_job(job_id: str):
         if not job:
             raise HTTPException(status_code=404, detail="Job not found")
         
-        job["_id"] = str(job["_id"])
-        return job
+        return MongoJSONResponse(job)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Invalid job ID: {str(e)}")
 
 
-@app.put("/jobs/{job_id}")
+@app.put("/jobs/{job_id}", dependencies=[Depends(require_admin)])
 async def update_job(job_id: str, job: schemas.JobCreate):
     """Update an existing job"""
     try:
@@ -455,6 +673,7 @@ async def update_job(job_id: str, job: schemas.JobCreate):
             {"_id": ObjectId(job_id)},
             {"$set": job.dict()}
         )
+        jobs_cache.invalidate()
         
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="Job not found")
@@ -465,11 +684,12 @@ async def update_job(job_id: str, job: schemas.JobCreate):
         raise HTTPException(status_code=400, detail=f"Error updating job: {str(e)}")
 
 
-@app.delete("/jobs/{job_id}")
+@app.delete("/jobs/{job_id}", dependencies=[Depends(require_admin)])
 async def delete_job(job_id: str):
     """Delete a job"""
     try:
         result = await jobs_collection.delete_one({"_id": ObjectId(job_id)})
+        jobs_cache.invalidate()
         
         if result.deleted_count == 0:
             raise HTTPException(status_code=404, detail="Job not found")
@@ -484,13 +704,23 @@ async def delete_job(job_id: str):
 # Employee APIs
 # ----------------------------
 @app.get("/employees")
-async def get_employees():
-    """Get all employees (for portal display)"""
-    employees_list = []
-    async for employee in employees_collection.find():
-        employee["_id"] = str(employee["_id"])
-        employees_list.append(employee)
-    return employees_list
+async def get_employees(
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    fields: Optional[str] = None
+):
+    """Get all employees (for portal display) - password hashes are never returned"""
+    employees_list, headers = await paginate(
+        employees_collection, {}, [("_id", ASCENDING)],
+        limit=limit, after=after, projection=build_projection(fields, exclude=("password_hash",))
+    )
+    return MongoJSONResponse(employees_list, headers=headers)
+
+
+@app.get("/employees/cache-stats", dependencies=[Depends(require_admin)])
+async def get_employee_cache_stats():
+    """Hit/miss counters for the in-memory employee directory"""
+    return employee_directory.stats()
 
 
 @app.post("/employee/login")
@@ -500,18 +730,27 @@ async def employee_login(
     employee_id: int = Form(...)
 ):
     """Employee login - verify credentials"""
-    employee = await employees_collection.find_one({
-        "id": employee_id,
-        "email": email
-    })
+    # Straight from Mongo: the cached roster carries no hashes and may lag a reset on another worker
+    employee = await employees_collection.find_one(
+        {"id": employee_id},
+        {"id": 1, "name": 1, "email": 1, "password_hash": 1}
+    )
     
-    if not employee:
+    if not employee or employee["email"] != email:
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
-    # Check password
-    if employee["password_hash"] != password:
+    # Check password (bcrypt runs on the hashing pool)
+    matches, new_hash = await verify_password(password, employee.get("password_hash"))
+    if not matches:
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
+    # Upgrade plaintext/outdated hashes; skipped if the password changed meanwhile
+    if new_hash:
+        await employees_collection.update_one(
+            {"id": employee["id"], "password_hash": employee["password_hash"]},
+            {"$set": {"password_hash": new_hash}}
+        )
+
     return {
         "message": "Login successful",
         "employee": {
@@ -525,19 +764,20 @@ async def employee_login(
 @app.post("/employee/forgot-password")
 async def employee_forgot_password(employee_id: int = Form(...)):
     """Send password reset email to employee"""
-    employee = await employees_collection.find_one({"id": employee_id})
+    # Read fresh so the link goes to the current address, not a cached one
+    employee = await employees_collection.find_one({"id": employee_id}, {"name": 1, "email": 1})
     
     if not employee:
         raise HTTPException(status_code=404, detail="Employee not found")
     
     email = employee["email"]
     token = str(uuid.uuid4())
-    reset_tokens[token] = {"email": email, "employee_id": employee_id, "type": "employee"}
+    await reset_tokens.put(token, {"email": email, "employee_id": employee_id, "type": "employee"})
 
     # ✅ Use environment variable for frontend URL
     reset_link = f"{FRONTEND_URL}/?token={token}&type=employee"
 
-    send_email(
+    await send_email(
         to=email,
         subject="Reset Employee Password",
         body=f"""
@@ -560,27 +800,21 @@ async def employee_reset_password(
     new_password: str = Form(...)
 ):
     """Reset employee password"""
-    if token not in reset_tokens:
+    # Claimed up front so two concurrent requests can't both redeem it
+    token_data = await reset_tokens.claim(token, "employee")
+    if not token_data:
         raise HTTPException(status_code=400, detail="Invalid or expired token")
-
-    token_data = reset_tokens[token]
-    
-    if token_data.get("type") != "employee":
-        raise HTTPException(status_code=400, detail="Invalid token type")
     
     employee_id = token_data.get("employee_id")
     
     # Update password
     result = await employees_collection.update_one(
         {"id": employee_id},
-        {"$set": {"password_hash": new_password}}
+        {"$set": {"password_hash": await hash_password(new_password)}}
     )
     
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="Employee not found")
-    
-    # Remove used token
-    del reset_tokens[token]
 
     return {"message": "Password reset successful"}
 
@@ -597,7 +831,8 @@ async def mark_attendance_in(
     """Mark attendance IN - check location first"""
     
     # Verify location
-    location_check = is_location_allowed(latitude, longitude)
+    with GEOFENCE_SECONDS.labels("single").time():
+        location_check = is_location_allowed(latitude, longitude)
     
     if not location_check["allowed"]:
         raise HTTPException(
@@ -606,42 +841,38 @@ async def mark_attendance_in(
         )
     
     # Check if employee exists
-    employee = await employees_collection.find_one({"id": employee_id})
+    employee = await employee_directory.get(employee_id)
     if not employee:
         raise HTTPException(status_code=404, detail="Employee not found")
     
-    # Check if attendance already marked today
-    today = date.today()
-    existing_attendance = await attendance_collection.find_one({
-        "employee_id": employee_id,
-        "date": today.isoformat()
-    })
-    
-    if existing_attendance and existing_attendance.get("in_time"):
+    # Create today's record, or fill in_time on one without it, in one atomic
+    # step. If in_time is already set the filter misses, the upsert collides
+    # with the unique (employee_id, date) index and we know it was marked.
+    in_time = datetime.now()
+    today = in_time.date()
+    try:
+        existing_attendance = await attendance_collection.find_one_and_update(
+            {"employee_id": employee_id, "day": day_key(today), "in_time": None},
+            {
+                "$set": {"in_time": in_time, "status": "present", "updated_at": sync_utils.now()},
+                "$setOnInsert": {"date": day_fields(today)["date"]}
+            },
+            projection={"status": 1},
+            upsert=True,
+            return_document=ReturnDocument.BEFORE
+        )
+    except DuplicateKeyError:
         raise HTTPException(status_code=400, detail="Attendance already marked for today")
     
-    # Create or update attendance record
     if not existing_attendance:
-        attendance_data = {
-            "employee_id": employee_id,
-            "date": today.isoformat(),
-            "in_time": datetime.now().isoformat(),
-            "status": "present"
-        }
-        await attendance_collection.insert_one(attendance_data)
-    else:
-        await attendance_collection.update_one(
-            {"_id": existing_attendance["_id"]},
-            {"$set": {
-                "in_time": datetime.now().isoformat(),
-                "status": "present"
-            }}
-        )
+        await rollups.add(employee_id, today.isoformat(), present_days=1, total_days=1)
+    elif existing_attendance.get("status") != "present":
+        await rollups.add(employee_id, today.isoformat(), present_days=1)
     
     return {
         "message": "Attendance marked successfully",
         "location": location_check["location_name"],
-        "time": datetime.now().strftime("%I:%M %p")
+        "time": in_time.strftime("%I:%M %p")
     }
 
 
@@ -654,7 +885,8 @@ async def mark_attendance_out(
     """Mark attendance OUT - check location first"""
     
     # Verify location
-    location_check = is_location_allowed(latitude, longitude)
+    with GEOFENCE_SECONDS.labels("single").time():
+        location_check = is_location_allowed(latitude, longitude)
     
     if not location_check["allowed"]:
         raise HTTPException(
@@ -663,36 +895,37 @@ async def mark_attendance_out(
         )
     
     # Check if employee exists
-    employee = await employees_collection.find_one({"id": employee_id})
+    employee = await employee_directory.get(employee_id)
     if not employee:
         raise HTTPException(status_code=404, detail="Employee not found")
     
-    # Find today's attendance record
-    today = date.today()
-    attendance = await attendance_collection.find_one({
-        "employee_id": employee_id,
-        "date": today.isoformat()
-    })
-    
-    if not attendance or not attendance.get("in_time"):
-        raise HTTPException(status_code=400, detail="Please mark IN time first")
+    # Set out time and hours in one atomic step, only on a record that has
+    # an IN time and no exit yet
+    out_time = datetime.now()
+    today = out_time.date()
+    attendance = await attendance_collection.find_one_and_update(
+        {"employee_id": employee_id, "day": day_key(today), "in_time": {"$ne": None}, "out_time": None},
+        [{"$set": {
+            "out_time": out_time,
+            "hours_worked": hours_until_expr(out_time),
+            "updated_at": sync_utils.now()
+        }}],
+        projection={"hours_worked": 1},
+        return_document=ReturnDocument.AFTER
+    )
     
-    if attendance.get("out_time"):
+    if not attendance:
+        # Only the failure path pays for a second read, to pick the message
+        existing = await attendance_collection.find_one(
+            {"employee_id": employee_id, "day": day_key(today)},
+            {"in_time": 1}
+        )
+        if not existing or not existing.get("in_time"):
+            raise HTTPException(status_code=400, detail="Please mark IN time first")
         raise HTTPException(status_code=400, detail="Exit time already marked for today")
     
-    # Calculate hours worked
-    out_time = datetime.now()
-    in_time = datetime.fromisoformat(attendance["in_time"])
-    hours_worked = calculate_hours(attendance["in_time"], out_time.isoformat())
-    
-    # Update out time and hours
-    await attendance_collection.update_one(
-        {"_id": attendance["_id"]},
-        {"$set": {
-            "out_time": out_time.isoformat(),
-            "hours_worked": hours_worked
-        }}
-    )
+    hours_worked = attendance["hours_worked"]
+    await rollups.add(employee_id, today.isoformat(), hours=hours_worked)
     
     return {
         "message": "Exit time marked successfully",
@@ -701,6 +934,193 @@ async def mark_attendance_out(
         "hours_worked": hours_worked
     }
 
+
+MAX_BATCH_EVENTS = 1000
+
+
+@app.post("/attendance/batch", dependencies=[Depends(require_device)])
+async def mark_attendance_batch(batch: schemas.AttendanceBatch):
+    """
+    Apply a backlog of timestamped IN/OUT events from kiosks or offline phones
+    Locations are checked in bulk, employees and existing records are read
+    with one query each and every change is written with one bulk_write.
+    Returns one result per event, in request order; events whose write lost
+    a race with another tap come back as "conflict".
+    """
+    events = batch.events
+    if len(events) > MAX_BATCH_EVENTS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_EVENTS} events per batch")
+    
+    results = [
+        {"index": i, "employee_id": e.employee_id, "type": e.type, "status": "ok"}
+        for i, e in enumerate(events)
+    ]
+    if not events:
+        return {"results": results}
+    
+    def reject(i, detail):
+        results[i]["status"] = "rejected"
+        results[i]["detail"] = detail
+    
+    with GEOFENCE_SECONDS.labels("batch").time():
+        locations = check_locations([e.latitude for e in events], [e.longitude for e in events])
+    
+    # Timestamps are stored as naive server-local times, like datetime.now(),
+    # at the millisecond precision Mongo keeps (so they can be compared on read-back)
+    timestamps = [
+        e.timestamp.astimezone().replace(tzinfo=None) if e.timestamp.tzinfo else e.timestamp
+        for e in events
+    ]
+    timestamps = [ts.replace(microsecond=ts.microsecond // 1000 * 1000) for ts in timestamps]
+    employee_ids = list({e.employee_id for e in events})
+    days = list({day_key(ts.date()) for ts in timestamps})
+    
+    known_employees, existing_records = await asyncio.gather(
+        employee_directory.get_many(employee_ids),
+        attendance_collection.find({
+            "employee_id": {"$in": employee_ids},
+            "day": {"$in": days}
+        }).to_list(length=None)
+    )
+    known_ids = set(known_employees)
+    records = {(r["employee_id"], r["day"]): r for r in existing_records}
+    original_status = {r["_id"]: r.get("status") for r in existing_records}
+    
+    # Replay events in time order against the current state of each day
+    changes = {}  # (employee_id, day) -> fields to write
+    change_events = {}  # (employee_id, day) -> indexes of the events behind the change
+    now = datetime.now()
+    for i in sorted(range(len(events)), key=lambda i: timestamps[i]):
+        event, ts = events[i], timestamps[i]
+        key = (event.employee_id, day_key(ts.date()))
+        
+        if not locations["allowed"][i]:
+            reject(i, "Not at an allowed location")
+            continue
+        if event.employee_id not in known_ids:
+            reject(i, "Employee not found")
+            continue
+        if ts > now + timedelta(minutes=5):
+            reject(i, "Timestamp is in the future")
+            continue
+        
+        record = records.setdefault(key, {"employee_id": key[0], **day_fields(ts.date())})
+        change = changes.setdefault(key, {})
+        
+        if event.type == "in":
+            if record.get("in_time"):
+                reject(i, "Attendance already marked for today")
+                continue
+            record["in_time"] = change["in_time"] = ts
+            record["status"] = change["status"] = "present"
+        else:
+            if not record.get("in_time"):
+                reject(i, "Please mark IN time first")
+                continue
+            if record.get("out_time"):
+                reject(i, "Exit time already marked for today")
+                continue
+            record["out_time"] = change["out_time"] = ts
+            record["hours_worked"] = change["hours_worked"] = calculate_hours(record["in_time"], ts)
+        
+        change_events.setdefault(key, []).append(i)
+        results[i]["location"] = locations["location_name"][i]
+        results[i]["time"] = ts.strftime("%I:%M %p")
+    
+    # One operation per changed day; op_keys/rollup_changes line up with operations
+    operations = []
+    op_keys = []
+    rollup_changes = []
+    updated_at = sync_utils.now()
+    for (employee_id, day), change in changes.items():
+        if not change:
+            continue
+        record = records[(employee_id, day)]
+        date_str = record["date"].date().isoformat()
+        op_keys.append((employee_id, day))
+        
+        if "_id" not in record:
+            # New day: only create it if nobody else did in the meantime
+            operations.append(UpdateOne(
+                {"employee_id": employee_id, "day": day},
+                {"$setOnInsert": {
+                    "employee_id": employee_id, "day": day, "date": record["date"], **change, "updated_at": updated_at
+                }},
+                upsert=True
+            ))
+            rollup_changes.append((employee_id, date_str, change.get("hours_worked", 0.0), 1, 1))
+        else:
+            # Existing day: guard each field so concurrent taps aren't overwritten
+            # (None matches a missing field too, like the mark-in/out filters)
+            guard = {"_id": record["_id"]}
+            if "in_time" in change:
+                guard["in_time"] = None
+            if "out_time" in change:
+                guard["out_time"] = None
+            operations.append(UpdateOne(guard, {"$set": {**change, "updated_at": updated_at}}))
+            
+            present = 1 if "status" in change and original_status[record["_id"]] != "present" else 0
+            rollup_changes.append((employee_id, date_str, change.get("hours_worked", 0.0), present, 0))
+    
+    if operations:
+        applied_ops = await apply_attendance_operations(operations, op_keys, records, changes)
+        await rollups.add_many([rollup_changes[n] for n in sorted(applied_ops)])
+        
+        for n, key in enumerate(op_keys):
+            if n in applied_ops:
+                continue
+            for i in change_events[key]:
+                results[i]["status"] = "conflict"
+                results[i]["detail"] = "Attendance changed by another request, please retry"
+                results[i].pop("location", None)
+                results[i].pop("time", None)
+    
+    applied = sum(1 for r in results if r["status"] == "ok")
+    return {
+        "message": f"Applied {applied} of {len(events)} events",
+        "applied": applied,
+        "rejected": len(events) - applied,
+        "results": results
+    }
+
+
+async def apply_attendance_operations(operations: list, op_keys: list, records: dict, changes: dict) -> set:
+    """
+    Run the batch's bulk_write and return the indexes of operations that took effect
+    An upsert applied only if it inserted, a guarded update only if it matched;
+    the others lost a race with a concurrent tap and changed nothing.
+    """
+    try:
+        result = await attendance_collection.bulk_write(operations, ordered=False)
+        upserted, modified = set(result.upserted_ids), result.modified_count
+    except BulkWriteError as e:
+        # Upserts racing on the unique day index fail individually; the rest still ran
+        upserted = {u["index"] for u in e.details.get("upserted", [])}
+        modified = e.details.get("nModified", 0)
+    
+    inserts = [n for n, key in enumerate(op_keys) if "_id" not in records[key]]
+    updates = [n for n, key in enumerate(op_keys) if "_id" in records[key]]
+    applied = {n for n in inserts if n in upserted}
+    
+    if modified == len(updates):
+        return applied | set(updates)
+    
+    # Some guarded updates matched nothing: read back which ones hold our times
+    stored = {
+        doc["_id"]: doc
+        async for doc in attendance_collection.find(
+            {"_id": {"$in": [records[op_keys[n]]["_id"] for n in updates]}},
+            {"in_time": 1, "out_time": 1}
+        )
+    }
+    for n in updates:
+        key = op_keys[n]
+        doc = stored.get(records[key]["_id"], {})
+        if all(doc.get(field) == changes[key][field] for field in ("in_time", "out_time") if field in changes[key]):
+            applied.add(n)
+    return applied
+
+
 @app.get("/attendance/all")
 async def get_all_attendance(
     filter: Optional[str] = "today",
@@ -717,94 +1137,88 @@ async def get_all_attendance(
     """
     
     # Determine date range
-    if date:
-        # Single custom date
-        start_date_str = date
-        end_date_str = (datetime.fromisoformat(date) + timedelta(days=1)).date().isoformat()
-    elif start_date and end_date:
-        # Custom week/range
-        start_date_str = start_date
-        end_date_str = end_date
-    elif month and year:
-        # Custom month
-        first_day = datetime(year, month, 1).date()
-        if month == 12:
-            last_day = datetime(year + 1, 1, 1).date()
-        else:
-            last_day = datetime(year, month + 1, 1).date()
-        start_date_str = first_day.isoformat()
-        end_date_str = last_day.isoformat()
-    else:
-        # Use filter parameter (today, week, month)
-        start_date_str, end_date_str = get_date_range(filter)
-        
-        if not start_date_str or not end_date_str:
-            raise HTTPException(status_code=400, detail="Invalid filter")
-    
-    # Get all employees
-    employees = []
-    async for emp in employees_collection.find():
-        employees.append(emp)
-    
-    # Build attendance data
-    attendance_data = []
-    
-    for employee in employees:
-        # Get attendance records for this employee in date range
-        attendance_records = []
-        async for record in attendance_collection.find({
-            "employee_id": employee["id"],
-            "date": {"$gte": start_date_str, "$lt": end_date_str}
-        }).sort("date", -1):
-            record["_id"] = str(record["_id"])
-            
-            # Calculate hours if not already calculated
-            if record.get("in_time") and record.get("out_time"):
-                if not record.get("hours_worked"):
-                    hours = calculate_hours(record["in_time"], record["out_time"])
-                    record["hours_worked"] = hours
-            else:
-                record["hours_worked"] = 0.0
-            
-            # Format times for display
-            if record.get("in_time"):
-                in_dt = datetime.fromisoformat(record["in_time"])
-                record["in_time_display"] = in_dt.strftime("%I:%M %p")
-            else:
-                record["in_time_display"] = "-"
-            
-            if record.get("out_time"):
-                out_dt = datetime.fromisoformat(record["out_time"])
-                record["out_time_display"] = out_dt.strftime("%I:%M %p")
-            else:
-                record["out_time_display"] = "-"
-            
-            attendance_records.append(record)
-        
-        # Calculate summary
-        total_hours = sum(r.get("hours_worked", 0) for r in attendance_records)
-        present_days = len([r for r in attendance_records if r.get("status") == "present"])
-        
-        attendance_data.append({
-            "employee_id": employee["id"],
-            "employee_name": employee["name"],
-            "email": employee["email"],
-            "records": attendance_records,
-            "summary": {
-                "total_hours": round(total_hours, 2),
-                "present_days": present_days,
-                "total_days": len(attendance_records)
-            }
-        })
+    start_date_str, end_date_str = resolve_date_range(filter, date, start_date, end_date, month, year)
     
-    return {
+    if not start_date_str or not end_date_str:
+        raise HTTPException(status_code=400, detail="Invalid filter")
+    
+    # Employees and the grouped attendance come back in two round trips,
+    # regardless of headcount
+    employees, grouped, summaries = await asyncio.gather(
+        employee_directory.all(),
+        fetch_attendance_groups(attendance_collection, start_date_str, end_date_str),
+        rollups.summaries(start_date_str, end_date_str)
+    )
+    attendance_data = join_attendance(employees, grouped, summaries)
+    
+    return MongoJSONResponse({
         "filter": filter or "custom",
         "date_range": {
             "start": start_date_str,
             "end": end_date_str
         },
         "attendance": attendance_data
-    }
+    })
+
+
+@app.get("/attendance/export", dependencies=[Depends(require_admin)])
+async def export_attendance(
+    filter: Optional[str] = "today",
+    date: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    month: Optional[int] = None,
+    year: Optional[int] = None,
+    format: str = "csv",
+    gzip: bool = False
+):
+    """
+    Stream attendance rows for payroll as CSV (gzip=true for .csv.gz) or XLSX
+    Accepts the same date options as /attendance/all
+    """
+    start_date_str, end_date_str = resolve_date_range(filter, date, start_date, end_date, month, year)
+    
+    if not start_date_str or not end_date_str:
+        raise HTTPException(status_code=400, detail="Invalid filter")
+    
+    if format not in ("csv", "xlsx"):
+        raise HTTPException(status_code=400, detail="Invalid format. Use: csv or xlsx")
+    
+    # The roster is small; the attendance rows are what gets streamed
+    employees_by_id = {emp["id"]: emp for emp in await employee_directory.all()}
+    
+    rows = attendance_rows(attendance_collection, employees_by_id, start_date_str, end_date_str)
+    filename = f"attendance_{start_date_str}_{end_date_str}"
+    
+    if format == "xlsx":
+        return StreamingResponse(
+            stream_xlsx(rows),
+            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            headers={"Content-Disposition": f'attachment; filename="{filename}.xlsx"'}
+        )
+    
+    if gzip:
+        return StreamingResponse(
+            stream_csv(rows, gzip=True),
+            media_type="application/gzip",
+            headers={"Content-Disposition": f'attachment; filename="{filename}.csv.gz"'}
+        )
+    
+    return StreamingResponse(
+        stream_csv(rows),
+        media_type="text/csv",
+        headers={"Content-Disposition": f'attachment; filename="{filename}.csv"'}
+    )
+
+
+def render_attendance(attendance: dict):
+    """Render a stored record for the API, filling in hours where missing"""
+    render_day(attendance)
+    if attendance.get("in_time") and attendance.get("out_time"):
+        if not attendance.get("hours_worked"):
+            attendance["hours_worked"] = calculate_hours(attendance["in_time"], attendance["out_time"])
+    else:
+        attendance["hours_worked"] = 0.0
 
 
 @app.get("/attendance/{employee_id}")
@@ -815,80 +1229,88 @@ async def get_attendance(
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
     month: Optional[int] = None,
-    year: Optional[int] = None
+    year: Optional[int] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    fields: Optional[str] = None,
+    since: Optional[int] = None
 ):
     """
     Get attendance records for a specific employee
     Filters: today, week, month, all
     Custom: date, start_date+end_date, month+year
+    Paging: limit + after cursor, fields= projection
+    Sync: since=<next_since from an earlier response> returns only records
+    changed since then plus the ids of deleted ones
     """
     
+    if since is not None:
+        since_at = sync_utils.from_cursor(since)
+        next_since = sync_utils.next_cursor(since_at)
+        changed, deleted = await asyncio.gather(
+            attendance_collection.find(
+                {"employee_id": employee_id, "updated_at": {"$gte": since_at}}
+            ).sort("day", DESCENDING).to_list(length=None),
+            tombstones.since("attendance", employee_id, since_at)
+        )
+        for attendance in changed:
+            render_attendance(attendance)
+        return MongoJSONResponse({
+            "records": changed,
+            "deleted": deleted,
+            "next_since": next_since
+        })
+    
+    # Taken before reading, so a full fetch can seed the client's first sync
+    next_since = sync_utils.next_cursor()
     query = {"employee_id": employee_id}
     
-    # Apply date filters
-    if date:
-        start_date_str = date
-        end_date_str = (datetime.fromisoformat(date) + timedelta(days=1)).date().isoformat()
-        query["date"] = {"$gte": start_date_str, "$lt": end_date_str}
-    elif start_date and end_date:
-        query["date"] = {"$gte": start_date, "$lt": end_date}
-    elif month and year:
-        first_day = datetime(year, month, 1).date()
-        if month == 12:
-            last_day = datetime(year + 1, 1, 1).date()
-        else:
-            last_day = datetime(year, month + 1, 1).date()
-        query["date"] = {"$gte": first_day.isoformat(), "$lt": last_day.isoformat()}
-    elif filter and filter != "all":
-        start_date_str, end_date_str = get_date_range(filter)
-        if start_date_str and end_date_str:
-            query["date"] = {"$gte": start_date_str, "$lt": end_date_str}
-    
-    attendance_list = []
-    async for attendance in attendance_collection.find(query).sort("date", -1):
-        attendance["_id"] = str(attendance["_id"])
-        
-        # Calculate hours if not already calculated
-        if attendance.get("in_time") and attendance.get("out_time"):
-            if not attendance.get("hours_worked"):
-                hours = calculate_hours(attendance["in_time"], attendance["out_time"])
-                attendance["hours_worked"] = hours
-        else:
-            attendance["hours_worked"] = 0.0
-        
-        attendance_list.append(attendance)
+    # Apply date filters ("all" or no filter means the full history)
+    start_date_str, end_date_str = resolve_date_range(filter, date, start_date, end_date, month, year)
+    if start_date_str and end_date_str:
+        query.update(day_range_query(start_date_str, end_date_str))
+    
+    (attendance_list, headers), summaries = await asyncio.gather(
+        paginate(
+            attendance_collection, query, [("day", DESCENDING), ("_id", DESCENDING)],
+            limit=limit, after=after, projection=build_projection(fields)
+        ),
+        rollups.summaries(start_date_str, end_date_str, employee_id=employee_id)
+    )
     
-    # Calculate summary
-    total_hours = sum(a.get("hours_worked", 0) for a in attendance_list)
-    present_days = len([a for a in attendance_list if a.get("status") == "present"])
+    for attendance in attendance_list:
+        if fields:
+            render_day(attendance)
+        else:
+            render_attendance(attendance)
     
-    return {
+    return MongoJSONResponse({
         "filter": filter or "all",
         "records": attendance_list,
-        "summary": {
-            "total_hours": round(total_hours, 2),
-            "present_days": present_days,
-            "total_days": len(attendance_list)
-        }
-    }
+        "summary": summaries.get(employee_id, EMPTY_SUMMARY),
+        "next_since": next_since
+    }, headers=headers)
 
 
-@app.delete("/attendance/{attendance_id}")
+@app.delete("/attendance/{attendance_id}", dependencies=[Depends(require_admin)])
 async def delete_attendance(attendance_id: str):
     """Delete a specific attendance record"""
     try:
-        result = await attendance_collection.delete_one({"_id": ObjectId(attendance_id)})
+        deleted = await attendance_collection.find_one_and_delete({"_id": ObjectId(attendance_id)})
         
-        if result.deleted_count == 0:
+        if not deleted:
             raise HTTPException(status_code=404, detail="Attendance record not found")
         
+        await rollups.subtract_records([deleted])
+        await tombstones.record("attendance", deleted["employee_id"], [deleted["_id"]])
+        
         return {"message": "Attendance record deleted successfully", "deleted_id": attendance_id}
     
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error deleting attendance: {str(e)}")
 
 
-@app.delete("/attendance/employee/{employee_id}")
+@app.delete("/attendance/employee/{employee_id}", dependencies=[Depends(require_admin)])
 async def delete_employee_attendance(
     employee_id: int,
     filter: str = "today",
@@ -902,35 +1324,30 @@ async def delete_employee_attendance(
     Delete all attendance records for an employee based on filter
     """
     # Build query similar to get_all_attendance
-    if date:
-        start_date_str = date
-        end_date_str = (datetime.fromisoformat(date) + timedelta(days=1)).date().isoformat()
-    elif start_date and end_date:
-        start_date_str = start_date
-        end_date_str = end_date
-    elif month and year:
-        first_day = datetime(year, month, 1).date()
-        if month == 12:
-            last_day = datetime(year + 1, 1, 1).date()
-        else:
-            last_day = datetime(year, month + 1, 1).date()
-        start_date_str = first_day.isoformat()
-        end_date_str = last_day.isoformat()
-    else:
-        start_date_str, end_date_str = get_date_range(filter)
-        if not start_date_str or not end_date_str:
-            raise HTTPException(status_code=400, detail="Invalid filter. Use: today, week, or month")
+    start_date_str, end_date_str = resolve_date_range(filter, date, start_date, end_date, month, year)
+    if not start_date_str or not end_date_str:
+        raise HTTPException(status_code=400, detail="Invalid filter. Use: today, week, or month")
     
     query = {
         "employee_id": employee_id,
-        "date": {"$gte": start_date_str, "$lt": end_date_str}
+        **day_range_query(start_date_str, end_date_str)
     }
     
-    result = await attendance_collection.delete_many(query)
+    # One find_one_and_delete per record: only the records this request
+    # actually removed are taken out of the rollups, even when another
+    # delete for the same range runs at the same time
+    ids = [doc["_id"] async for doc in attendance_collection.find(query, {"_id": 1})]
+    deleted = await asyncio.gather(*(
+        attendance_collection.find_one_and_delete({"_id": record_id}) for record_id in ids
+    ))
+    deleted = [record for record in deleted if record is not None]
+    
+    await rollups.subtract_records(deleted)
+    await tombstones.record("attendance", employee_id, [record["_id"] for record in deleted])
     
     return {
-        "message": f"Deleted {result.deleted_count} attendance records",
-        "deleted_count": result.deleted_count,
+        "message": f"Deleted {len(deleted)} attendance records",
+        "deleted_count": len(deleted),
         "filter": filter
     }
 
@@ -939,7 +1356,7 @@ async def delete_employee_attendance(
 # EMPLOYEE CRUD APIs
 # =========================
 
-@app.post("/employees")
+@app.post("/employees", dependencies=[Depends(require_admin)])
 async def add_employee(employee: schemas.EmployeeCreate):
     """Add a new employee"""
     # Check if employee ID already exists
@@ -948,12 +1365,16 @@ async def add_employee(employee: schemas.EmployeeCreate):
         raise HTTPException(status_code=400, detail="Employee ID already exists")
     
     employee_data = employee.dict()
+    # The admin form sends the new password in password_hash; never trust it as a hash
+    employee_data["password_hash"] = await hash_password(employee_data["password_hash"])
     result = await employees_collection.insert_one(employee_data)
+    employee_directory.invalidate()
     employee_data["_id"] = str(result.inserted_id)
+    employee_data.pop("password_hash")
     return employee_data
 
 
-@app.put("/employees/{employee_id}")
+@app.put("/employees/{employee_id}", dependencies=[Depends(require_admin)])
 async def update_employee(employee_id: int, employee: schemas.EmployeeUpdate):
     """Update an employee"""
     update_data = {}
@@ -963,7 +1384,7 @@ async def update_employee(employee_id: int, employee: schemas.EmployeeUpdate):
     if employee.email:
         update_data["email"] = employee.email
     if employee.password_hash:
-        update_data["password_hash"] = employee.password_hash
+        update_data["password_hash"] = await hash_password(employee.password_hash)
     
     if not update_data:
         raise HTTPException(status_code=400, detail="No fields to update")
@@ -972,6 +1393,8 @@ async def update_employee(employee_id: int, employee: schemas.EmployeeUpdate):
         {"id": employee_id},
         {"$set": update_data}
     )
+    if update_data.keys() - {"password_hash"}:
+        employee_directory.invalidate()
     
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Employee not found")
@@ -979,20 +1402,28 @@ async def update_employee(employee_id: int, employee: schemas.EmployeeUpdate):
     return {"message": "Employee updated successfully"}
 
 
-@app.delete("/employees/{employee_id}")
+@app.delete("/employees/{employee_id}", dependencies=[Depends(require_admin)])
 async def delete_employee(employee_id: int):
     """Delete an employee and all their attendance records and links"""
     # Delete employee
     result = await employees_collection.delete_one({"id": employee_id})
+    employee_directory.invalidate()
     
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Employee not found")
     
     # Delete all attendance records for this employee
+    attendance_ids = [
+        doc["_id"] async for doc in attendance_collection.find({"employee_id": employee_id}, {"_id": 1})
+    ]
     attendance_result = await attendance_collection.delete_many({"employee_id": employee_id})
+    await rollups.remove_employee(employee_id)
+    await tombstones.record("attendance", employee_id, attendance_ids)
     
     # Delete all links for this employee
     links_result = await employee_links_collection.delete_many({"employee_id": employee_id})
+    if links_result.deleted_count:
+        await tombstones.record("employee_links", employee_id, [employee_id])
     
     return {
         "message": "Employee deleted successfully",
@@ -1027,21 +1458,38 @@ async def get_links_config():
 
 
 @app.get("/employee-links/{employee_id}")
-async def get_employee_links(employee_id: int):
+async def get_employee_links(employee_id: int, since: Optional[int] = None):
     """Return the links document for one employee.
     If nothing has been saved yet, return empty strings so the
-    frontend always gets a consistent shape."""
+    frontend always gets a consistent shape.
+    With since=<next_since> only report whether the links changed or were
+    deleted since then, including them only when they changed."""
+    if since is not None:
+        since_at = sync_utils.from_cursor(since)
+        next_since = sync_utils.next_cursor(since_at)
+        doc, deleted = await asyncio.gather(
+            employee_links_collection.find_one({"employee_id": employee_id, "updated_at": {"$gte": since_at}}),
+            tombstones.since("employee_links", employee_id, since_at)
+        )
+        result = {"employee_id": employee_id, "changed": doc is not None, "deleted": bool(deleted) and doc is None}
+        if doc is not None:
+            result.update({key: doc.get(key, "") for key in LINKS_KEYS})
+        result["next_since"] = next_since
+        return result
+
+    next_since = sync_utils.next_cursor()
     doc = await employee_links_collection.find_one({"employee_id": employee_id})
 
     # Build a response that always contains every key (default "")
     result = {"employee_id": employee_id}
     for key in LINKS_KEYS:
         result[key] = (doc or {}).get(key, "")
+    result["next_since"] = next_since
 
     return result
 
 
-@app.post("/employee-links")
+@app.post("/employee-links", dependencies=[Depends(require_admin)])
 async def create_employee_links(links: schemas.EmployeeLinksCreate):
     """Create a fresh links document for an employee.
     Returns 400 if one already exists – use PUT to update."""
@@ -1052,11 +1500,11 @@ async def create_employee_links(links: schemas.EmployeeLinksCreate):
             detail="Links already exist for this employee. Use PUT to update."
         )
 
-    await employee_links_collection.insert_one(links.dict())
+    await employee_links_collection.insert_one({**links.dict(), "updated_at": sync_utils.now()})
     return {"message": "Links created", "employee_id": links.employee_id}
 
 
-@app.put("/employee-links/{employee_id}")
+@app.put("/employee-links/{employee_id}", dependencies=[Depends(require_admin)])
 async def update_employee_links(employee_id: int, links: schemas.EmployeeLinksUpdate):
     """Upsert links for an employee.  Only the fields that are provided
     (not None) are written; omitted fields are left untouched.
@@ -1065,6 +1513,7 @@ async def update_employee_links(employee_id: int, links: schemas.EmployeeLinksUp
 
     if not update_data:
         raise HTTPException(status_code=400, detail="No fields to update")
+    update_data["updated_at"] = sync_utils.now()
 
     await employee_links_collection.update_one(
         {"employee_id": employee_id},
@@ -1077,17 +1526,18 @@ async def update_employee_links(employee_id: int, links: schemas.EmployeeLinksUp
     return {"message": "Links saved", "employee_id": employee_id}
 
 
-@app.delete("/employee-links/{employee_id}")
+@app.delete("/employee-links/{employee_id}", dependencies=[Depends(require_admin)])
 async def delete_employee_links(employee_id: int):
     """Remove all links for an employee."""
     result = await employee_links_collection.delete_one({"employee_id": employee_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="No links found for this employee")
+    await tombstones.record("employee_links", employee_id, [employee_id])
     return {"message": "Links deleted", "employee_id": employee_id}
 
 
 # ← NEW: Update individual link
-@app.patch("/employee-links/{employee_id}/{link_key}")
+@app.patch("/employee-links/{employee_id}/{link_key}", dependencies=[Depends(require_admin)])
 async def update_single_link(
     employee_id: int,
     link_key: str,
@@ -1100,7 +1550,7 @@ async def update_single_link(
     result = await employee_links_collection.update_one(
         {"employee_id": employee_id},
         {
-            "$set": {link_key: url},
+            "$set": {link_key: url, "updated_at": sync_utils.now()},
             "$setOnInsert": {"employee_id": employee_id}
         },
         upsert=True
@@ -1119,16 +1569,20 @@ async def update_single_link(
 # =========================
 
 @app.get("/admin-links")
-async def get_admin_links():
-    """Get all admin links"""
-    links_list = []
-    async for link in admin_links_collection.find().sort("created_at", -1):
-        link["_id"] = str(link["_id"])
-        links_list.append(link)
-    return links_list
+async def get_admin_links(
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    fields: Optional[str] = None
+):
+    """Get all admin links, newest first"""
+    links_list, headers = await paginate(
+        admin_links_collection, {}, [("created_at", DESCENDING), ("_id", DESCENDING)],
+        limit=limit, after=after, projection=build_projection(fields)
+    )
+    return MongoJSONResponse(links_list, headers=headers)
 
 
-@app.post("/admin-links")
+@app.post("/admin-links", dependencies=[Depends(require_admin)])
 async def create_admin_link(
     name: str = Form(...),
     url: str = Form(...)
@@ -1157,13 +1611,12 @@ async def get_admin_link(link_id: str):
         if not link:
             raise HTTPException(status_code=404, detail="Link not found")
         
-        link["_id"] = str(link["_id"])
-        return link
+        return MongoJSONResponse(link)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Invalid link ID: {str(e)}")
 
 
-@app.put("/admin-links/{link_id}")
+@app.put("/admin-links/{link_id}", dependencies=[Depends(require_admin)])
 async def update_admin_link(
     link_id: str,
     name: str = Form(...),
@@ -1194,7 +1647,7 @@ async def update_admin_link(
         raise HTTPException(status_code=400, detail=f"Error updating link: {str(e)}")
 
 
-@app.delete("/admin-links/{link_id}")
+@app.delete("/admin-links/{link_id}", dependencies=[Depends(require_admin)])
 async def delete_admin_link(link_id: str):
     """Delete an admin link"""
     try:
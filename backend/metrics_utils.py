@@ -0,0 +1,141 @@
+"""
+Metrics utility
+Prometheus instrumentation cheap enough to leave on in production:
+  - per-route request latency histogram and in-flight gauge (ASGI middleware)
+  - duration of every MongoDB command (pymongo CommandListener) and the
+    number of commands each request made
+  - histograms for mail enqueue/delivery and geofence checks
+
+Exposed on GET /metrics in the Prometheus text format. With several
+uvicorn workers set PROMETHEUS_MULTIPROC_DIR to an empty directory so
+/metrics aggregates every worker.
+"""
+
+import os
+import time
+from contextvars import ContextVar
+
+from fastapi import Response
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess
+)
+from pymongo import monitoring
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+MONGO_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+COMMANDS_PER_REQUEST_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Request latency by route",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight", "Requests currently being handled",
+    ["method"], multiprocess_mode="livesum"
+)
+MONGO_COMMAND_SECONDS = Histogram(
+    "mongodb_command_duration_seconds", "MongoDB command latency",
+    ["command", "collection"], buckets=MONGO_BUCKETS
+)
+MONGO_COMMAND_FAILURES = Counter(
+    "mongodb_command_failures_total", "MongoDB commands that returned an error",
+    ["command", "collection"]
+)
+MONGO_COMMANDS_PER_REQUEST = Histogram(
+    "http_request_mongodb_commands", "MongoDB commands issued while handling one request",
+    ["method", "route"], buckets=COMMANDS_PER_REQUEST_BUCKETS
+)
+EMAIL_SECONDS = Histogram(
+    "email_duration_seconds", "Time spent queueing (send_email) and delivering (SMTP) mail",
+    ["stage"], buckets=LATENCY_BUCKETS
+)
+GEOFENCE_SECONDS = Histogram(
+    "geofence_check_duration_seconds", "Geofence check latency",
+    ["mode"], buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05)
+)
+
+# Commands issued by the current request; Motor copies the context into
+# its executor threads, so the listener sees the request's counter
+_request_commands = ContextVar("request_commands", default=None)
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Feeds MONGO_COMMAND_SECONDS; register via the client's event_listeners"""
+
+    def __init__(self):
+        self._collections = {}  # (connection_id, request_id) -> collection, until the reply arrives
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        self._collections[(event.connection_id, event.request_id)] = (
+            collection if isinstance(collection, str) else ""
+        )
+        counter = _request_commands.get()
+        if counter is not None:
+            counter[0] += 1
+
+    def _finish(self, event):
+        collection = self._collections.pop((event.connection_id, event.request_id), "")
+        MONGO_COMMAND_SECONDS.labels(event.command_name, collection).observe(event.duration_micros / 1e6)
+        return collection
+
+    def succeeded(self, event):
+        self._finish(event)
+
+    def failed(self, event):
+        collection = self._finish(event)
+        MONGO_COMMAND_FAILURES.labels(event.command_name, collection).inc()
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency, in-flight requests and Mongo commands per route"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        method = scope["method"]
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        counter = [0]
+        token = _request_commands.set(counter)
+        in_flight = REQUESTS_IN_FLIGHT.labels(method)
+        in_flight.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            in_flight.dec()
+            _request_commands.reset(token)
+
+            # FastAPI stores the matched route in the scope; use its template
+            # (/news/{news_id}) so label cardinality stays fixed
+            route = scope.get("route")
+            route = getattr(route, "path", None) or ("/uploads" if scope["path"].startswith("/uploads/") else "unmatched")
+            REQUEST_SECONDS.labels(method, route, str(status[0])).observe(elapsed)
+            MONGO_COMMANDS_PER_REQUEST.labels(method, route).observe(counter[0])
+
+
+def metrics_response() -> Response:
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        body = generate_latest(registry)
+    else:
+        body = generate_latest()
+    return Response(body, media_type=CONTENT_TYPE_LATEST)
@@ -1,72 +1,211 @@
+"""
+Migrate the legacy SQLite app.db into MongoDB
+
+Each table is read in fetchmany() chunks and written with
+insert_many(ordered=False), all tables at once. After every batch the last
+migrated id is saved to a checkpoint file, so an interrupted run picks up
+where it stopped. Every document carries its SQLite id (legacy_id, or id for
+employees) and the declared unique indexes are ensured first, so a batch
+re-sent after a crash is not inserted twice. A duplicate-key error is only
+skipped when that same SQLite row is already in Mongo; a genuine duplicate
+(another row with the same key) is merged for attendance - earliest IN,
+latest OUT - and reported for the other tables. Attendance summaries are
+rebuilt at the end.
+A dry run reads and maps every row but writes nothing.
+
+Usage (from backend/):
+    python migratedata.py [--db app.db] [--batch-size 1000] [--dry-run] [--reset]
+"""
+
+import argparse
 import asyncio
+import json
+import os
 import sqlite3
+import time
+
+from pymongo.errors import BulkWriteError
+
 from database import (
+    database,
     admins_collection,
     news_collection,
     jobs_collection,
     employees_collection,
-    attendance_collection
+    attendance_collection,
+    attendance_rollups_collection
 )
+from attendance_migration import merge_day
+from index_utils import ensure_indexes
+from models import Attendance
+from rollup_utils import AttendanceRollups
+
+CHECKPOINT_FILE = "migration_checkpoint.json"
+DUPLICATE_KEY = 11000
 
-async def migrate_data():
-    # Connect to SQLite
-    conn = sqlite3.connect('app.db')
-    cursor = conn.cursor()
-    
-    # Migrate Admins
-    cursor.execute("SELECT * FROM admins")
-    for row in cursor.fetchall():
-        await admins_collection.insert_one({
-            "email": row[1],
-            "password_hash": row[2]
-        })
-    print("✅ Admins migrated")
-    
-    # Migrate News
-    cursor.execute("SELECT * FROM news")
-    for row in cursor.fetchall():
-        await news_collection.insert_one({
-            "title": row[1],
-            "description": row[2],
-            "image_path": row[3],
-            "date": row[4]
-        })
-    print("✅ News migrated")
-    
-    # Migrate Jobs
-    cursor.execute("SELECT * FROM jobs")
-    for row in cursor.fetchall():
-        await jobs_collection.insert_one({
-            "title": row[1],
-            "description": row[2],
-            "location": row[3]
-        })
-    print("✅ Jobs migrated")
-    
-    # Migrate Employees
-    cursor.execute("SELECT * FROM employees")
-    for row in cursor.fetchall():
-        await employees_collection.insert_one({
-            "id": row[0],  # Keep original ID
-            "name": row[1],
-            "email": row[2],
-            "password_hash": row[3]
-        })
-    print("✅ Employees migrated")
-    
-    # Migrate Attendance
-    cursor.execute("SELECT * FROM attendance")
-    for row in cursor.fetchall():
-        await attendance_collection.insert_one({
+# Field holding the SQLite id of the row a document came from
+LEGACY_KEYS = {"employees": "id"}
+
+# table -> (collection, row mapper); rows are SELECT * results
+TABLES = {
+    "admins": (admins_collection, lambda row: {
+        "legacy_id": row[0],
+        "email": row[1],
+        "password_hash": row[2]
+    }),
+    "news": (news_collection, lambda row: {
+        "legacy_id": row[0],
+        "title": row[1],
+        "description": row[2],
+        "image_path": row[3],
+        "date": row[4]
+    }),
+    "jobs": (jobs_collection, lambda row: {
+        "legacy_id": row[0],
+        "title": row[1],
+        "description": row[2],
+        "location": row[3]
+    }),
+    "employees": (employees_collection, lambda row: {
+        "id": row[0],  # Keep original ID
+        "name": row[1],
+        "email": row[2],
+        "password_hash": row[3]
+    }),
+    "attendance": (attendance_collection, lambda row: {
+        "legacy_id": row[0],
+        **Attendance.from_legacy({
             "employee_id": row[1],
             "date": row[2],
             "in_time": row[3],
             "out_time": row[4]
-        })
-    print("✅ Attendance migrated")
-    
-    conn.close()
-    print("✅ Migration complete!")
+        }).to_mongo()
+    }),
+}
+
+
+def load_checkpoint() -> dict:
+    if os.path.exists(CHECKPOINT_FILE):
+        with open(CHECKPOINT_FILE) as f:
+            return json.load(f)
+    return {}
+
+
+def save_checkpoint(checkpoint: dict):
+    tmp_path = CHECKPOINT_FILE + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, CHECKPOINT_FILE)
+
+
+async def insert_batch(table: str, collection, documents: list) -> dict:
+    """
+    Insert one batch; returns how many rejected rows were already migrated
+    (skipped), merged into an existing attendance day, or left out as duplicates
+    """
+    outcome = {"skipped": 0, "merged": 0, "duplicates": 0}
+    try:
+        await collection.insert_many(documents, ordered=False)
+        return outcome
+    except BulkWriteError as e:
+        errors = e.details.get("writeErrors", [])
+        if any(err.get("code") != DUPLICATE_KEY for err in errors):
+            raise
+
+    # Rows an earlier, interrupted run already inserted are safe to skip
+    key = LEGACY_KEYS.get(table, "legacy_id")
+    rejected = [documents[err["index"]] for err in errors]
+    present = {doc[key] async for doc in collection.find({key: {"$in": [d[key] for d in rejected]}}, {key: 1})}
+
+    for document in rejected:
+        if document[key] in present:
+            outcome["skipped"] += 1
+        elif table == "attendance":
+            day = {"employee_id": document["employee_id"], "day": document["day"]}
+            existing = await collection.find_one(day)
+            await collection.update_one(day, {"$set": merge_day([existing, document])})
+            outcome["merged"] += 1
+        else:
+            outcome["duplicates"] += 1
+            print(f"⚠️  {table} row {document[key]} duplicates an existing record, not migrated")
+    return outcome
+
+
+async def migrate_table(table: str, db_path: str, batch_size: int, checkpoint: dict, dry_run: bool) -> int:
+    collection, mapper = TABLES[table]
+    last_id = checkpoint.get(table, 0)
+
+    # One connection per table; reads happen in worker threads
+    conn = sqlite3.connect(db_path, check_same_thread=False)
+    try:
+        total = conn.execute(f"SELECT COUNT(*) FROM {table} WHERE id > ?", (last_id,)).fetchone()[0]
+        cursor = conn.execute(f"SELECT * FROM {table} WHERE id > ? ORDER BY id", (last_id,))
+
+        migrated = 0
+        rejected = {"skipped": 0, "merged": 0, "duplicates": 0}
+        started = time.perf_counter()
+        while True:
+            rows = await asyncio.to_thread(cursor.fetchmany, batch_size)
+            if not rows:
+                break
+
+            # Mapped in both modes, so a dry run catches bad rows too
+            documents = [mapper(row) for row in rows]
+            if not dry_run:
+                outcome = await insert_batch(table, collection, documents)
+                for k in rejected:
+                    rejected[k] += outcome[k]
+                checkpoint[table] = rows[-1][0]
+                save_checkpoint(checkpoint)
+
+            migrated += len(rows)
+            rate = migrated / max(time.perf_counter() - started, 1e-9)
+            print(f"   {table}: {migrated}/{total} rows ({rate:,.0f} rows/s)")
+    finally:
+        conn.close()
+
+    status = "would migrate" if dry_run else "migrated"
+    print(f"✅ {table.capitalize()} {status} ({migrated} rows)")
+    if any(rejected.values()):
+        print(f"   {table}: {rejected['skipped']} already migrated, {rejected['merged']} merged "
+              f"into an existing day, {rejected['duplicates']} duplicates not migrated")
+    return migrated
+
+
+async def migrate_data(db_path: str = "app.db", batch_size: int = 1000, dry_run: bool = False, reset: bool = False):
+    if reset and os.path.exists(CHECKPOINT_FILE):
+        os.remove(CHECKPOINT_FILE)
+
+    checkpoint = load_checkpoint()
+    if checkpoint:
+        print(f"Resuming from checkpoint: {checkpoint}")
+
+    # Unique indexes are what make re-sent batches skip as duplicates
+    if not dry_run:
+        await ensure_indexes(database)
+
+    started = time.perf_counter()
+    counts = await asyncio.gather(*[
+        migrate_table(table, db_path, batch_size, checkpoint, dry_run)
+        for table in TABLES
+    ])
+
+    # Bulk inserts bypass the incremental rollups, and ensure_built() only builds an empty collection
+    if not dry_run and counts[list(TABLES).index("attendance")]:
+        await AttendanceRollups(attendance_collection, attendance_rollups_collection).rebuild()
+        print("✅ Attendance summaries rebuilt")
+    elapsed = time.perf_counter() - started
+
+    total = sum(counts)
+    print(f"✅ Migration complete! {total} rows in {elapsed:.1f}s ({total / max(elapsed, 1e-9):,.0f} rows/s)")
+
 
 if __name__ == "__main__":
-    asyncio.run(migrate_data())
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Migrate app.db (SQLite) into MongoDB")
+    parser.add_argument("--db", default="app.db", help="SQLite database path")
+    parser.add_argument("--batch-size", type=int, default=1000, help="rows per insert_many batch")
+    parser.add_argument("--dry-run", action="store_true", help="read and map rows without writing")
+    parser.add_argument("--reset", action="store_true", help="ignore any saved checkpoint")
+    args = parser.parse_args()
+
+    asyncio.run(migrate_data(args.db, args.batch_size, args.dry_run, args.reset))
@@ -3,6 +3,8 @@ from typing import Optional
 from datetime import datetime, date
 from bson import ObjectId
 
+from attendance_utils import day_fields, parse_timestamp
+
 
 # Custom ObjectId handler
 class PyObjectId(ObjectId):
@@ -16,9 +18,17 @@ class PyObjectId(ObjectId):
             raise ValueError("Invalid ObjectId")
         return ObjectId(v)
 
+    # Pydantic v2 hooks (v1 uses __get_validators__ above)
+    @classmethod
+    def __get_pydantic_core_schema__(cls, source_type, handler):
+        from pydantic_core import core_schema
+        return core_schema.no_info_plain_validator_function(
+            cls.validate, serialization=core_schema.to_string_ser_schema()
+        )
+
     @classmethod
-    def __modify_schema__(cls, field_schema):
-        field_schema.update(type="string")
+    def __get_pydantic_json_schema__(cls, schema, handler):
+        return {"type": "string"}
 
 
 # Admin Model
@@ -75,13 +85,43 @@ class Employee(BaseModel):
 
 # Attendance Model
 class Attendance(BaseModel):
+    """
+    One employee-day as stored in Mongo: BSON Dates plus the integer day
+    key (YYYYMMDD) that range queries and the unique index use
+    """
     id: Optional[PyObjectId] = Field(alias="_id", default=None)
     employee_id: int  # Keep as int to match your employee IDs
-    date: date
+    day: int
+    date: datetime  # Midnight of the day
     in_time: Optional[datetime] = None
     out_time: Optional[datetime] = None
+    hours_worked: Optional[float] = None
+    status: Optional[str] = None
+    updated_at: Optional[datetime] = None  # UTC, stamped by every write for ?since= sync
 
     class Config:
         populate_by_name = True
         arbitrary_types_allowed = True
-        json_encoders = {ObjectId: str, date: lambda v: v.isoformat(), datetime: lambda v: v.isoformat()}
\ No newline at end of file
+        json_encoders = {ObjectId: str, datetime: lambda v: v.isoformat()}
+
+    @classmethod
+    def from_legacy(cls, document: dict) -> "Attendance":
+        """Build from a record that may still hold ISO strings"""
+        day = document["date"]
+        if isinstance(day, str):
+            day = date.fromisoformat(day[:10])
+        elif isinstance(day, datetime):
+            day = day.date()
+
+        return cls(
+            employee_id=document["employee_id"],
+            **day_fields(day),
+            in_time=parse_timestamp(document.get("in_time")),
+            out_time=parse_timestamp(document.get("out_time")),
+            hours_worked=document.get("hours_worked"),
+            status=document.get("status"),
+            updated_at=document.get("updated_at")
+        )
+
+    def to_mongo(self) -> dict:
+        return self.dict(exclude={"id"}, exclude_none=True)
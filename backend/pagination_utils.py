@@ -0,0 +1,87 @@
+"""
+Pagination utility
+Keyset (cursor) pagination and field projection for the list endpoints.
+
+Pages are requested with ?limit=N and continued with ?after=<X-Next-Cursor>.
+Every response carries the total match count in X-Total-Count.
+"""
+
+import asyncio
+import base64
+from typing import Optional
+
+from bson import json_util
+from fastapi import HTTPException
+from pymongo import ASCENDING
+
+MAX_PAGE_SIZE = 500
+
+
+def build_projection(fields: Optional[str], exclude: tuple = ()) -> Optional[dict]:
+    """Turn ?fields=a,b into a Mongo projection; excluded fields are never returned"""
+    if not fields:
+        return {field: 0 for field in exclude} or None
+
+    requested = [f.strip() for f in fields.split(",") if f.strip() and f.strip() not in exclude]
+    if not requested:
+        raise HTTPException(status_code=400, detail="No valid fields requested")
+    return {field: 1 for field in requested}
+
+
+def encode_cursor(document: dict, sort: list) -> str:
+    values = [document.get(field) for field, _ in sort]
+    return base64.urlsafe_b64encode(json_util.dumps(values).encode()).decode()
+
+
+def decode_cursor(after: str, sort: list) -> list:
+    try:
+        values = json_util.loads(base64.urlsafe_b64decode(after.encode()))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    if not isinstance(values, list) or len(values) != len(sort):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+
+def keyset_query(sort: list, values: list) -> dict:
+    """Match documents that sort strictly after the cursor position"""
+    clauses = []
+    for i, (field, direction) in enumerate(sort):
+        clause = {f: v for (f, _), v in zip(sort[:i], values[:i])}
+        clause[field] = {"$gt" if direction == ASCENDING else "$lt": values[i]}
+        clauses.append(clause)
+    return {"$or": clauses}
+
+
+async def paginate(collection, query: dict, sort: list, limit: Optional[int] = None,
+                   after: Optional[str] = None, projection: Optional[dict] = None):
+    """
+    Fetch one page of raw documents (render them with MongoJSONResponse).
+    sort must end with a unique field (normally _id) so cursors are stable.
+    Without a limit the whole result is returned, as before pagination existed.
+    Returns (documents, headers).
+    """
+    if projection and any(v == 1 for v in projection.values()):
+        # Sort keys have to come back for the next cursor to be built
+        projection = {**projection, **{field: 1 for field, _ in sort}}
+
+    find_query = query
+    if after:
+        find_query = {"$and": [query, keyset_query(sort, decode_cursor(after, sort))]}
+
+    cursor = collection.find(find_query, projection).sort(sort)
+    if limit:
+        cursor = cursor.limit(limit + 1)
+
+    documents, total = await asyncio.gather(
+        cursor.to_list(length=None),
+        collection.count_documents(query)
+    )
+
+    headers = {"X-Total-Count": str(total)}
+    if limit and len(documents) > limit:
+        documents = documents[:limit]
+        headers["X-Next-Cursor"] = encode_cursor(documents[-1], sort)
+
+    return documents, headers
@@ -0,0 +1,65 @@
+"""
+Password hashing utility
+bcrypt hashing and verification on a bounded thread pool (bcrypt releases
+the GIL), so a burst of logins doesn't stall the event loop.
+
+Records still holding a plaintext password are upgraded on their next
+successful login; hashes made with an older BCRYPT_ROUNDS are rehashed
+the same way.
+
+BCRYPT_ROUNDS sets the cost factor (default 12),
+PASSWORD_HASH_WORKERS the pool size (default: CPU count, at most 4).
+"""
+
+import asyncio
+import hmac
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from passlib.context import CryptContext
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(os.cpu_count() or 1, 4))))
+
+BCRYPT_PREFIXES = ("$2a$", "$2b$", "$2y$")
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+
+
+def is_hashed(value: str) -> bool:
+    return bool(value) and value.startswith(BCRYPT_PREFIXES)
+
+
+async def _run(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(_executor, fn, *args)
+
+
+async def hash_password(password: str) -> str:
+    return await _run(pwd_context.hash, password)
+
+
+async def verify_password(password: str, stored: str):
+    """
+    Check password against a stored value.
+    Returns (matches, new_hash); new_hash is set when the stored value is
+    plaintext or uses an outdated cost and should be replaced.
+    """
+    if not stored:
+        return False, None
+
+    if not is_hashed(stored):
+        if not hmac.compare_digest(password.encode(), stored.encode()):
+            return False, None
+        return True, await hash_password(password)
+
+    try:
+        return await _run(pwd_context.verify_and_update, password, stored)
+    except ValueError:
+        # Malformed hash
+        return False, None
+
+
+def shutdown():
+    _executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,221 @@
+"""
+Rate limiting middleware
+Token buckets per route and client for the endpoints that send mail, so one
+scripted client can't flood SMTP. Over the limit the request gets a 429 with
+Retry-After before the handler runs.
+
+Each rule has a key:
+    "ip"           - the client address (X-Forwarded-For when RATE_LIMIT_TRUST_PROXY=true)
+    "form:<field>" - a submitted form field such as email or employee_id
+    "route"        - one bucket shared by every caller
+
+RATE_LIMIT_STORE=memory|mongo picks the bucket backend (default memory,
+which limits per worker; mongo shares buckets across workers).
+RATE_LIMITS overrides rules per route as JSON, e.g.
+    {"POST /api/send-contact": [{"key": "ip", "rate": "10/hour"}]}
+"""
+
+import json
+import math
+import os
+import time
+from collections import OrderedDict
+
+from fastapi.responses import JSONResponse
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from starlette.requests import Request
+
+RATE_LIMIT_STORE = os.getenv("RATE_LIMIT_STORE", "memory")
+RATE_LIMIT_TRUST_PROXY = os.getenv("RATE_LIMIT_TRUST_PROXY", "false").lower() == "true"
+MAX_IN_MEMORY_BUCKETS = 100000
+# Form bodies bigger than this are not parsed for form:<field> keys
+MAX_FORM_KEY_BODY_BYTES = 64 * 1024
+
+PERIOD_SECONDS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+DEFAULT_RATE_LIMITS = {
+    "POST /api/send-contact": [{"key": "ip", "rate": "5/hour"}],
+    "POST /api/send-application": [{"key": "ip", "rate": "5/hour"}],
+    # Always mails the single admin, so cap it globally as well
+    "POST /auth/forgot-password": [{"key": "ip", "rate": "3/hour"}, {"key": "route", "rate": "10/hour"}],
+    "POST /employee/forgot-password": [{"key": "ip", "rate": "10/hour"}, {"key": "form:employee_id", "rate": "3/hour"}],
+}
+
+
+class RateRule:
+    """rate "N/period" refills N tokens per period; burst is the bucket size (defaults to N)"""
+
+    def __init__(self, key: str = "ip", rate: str = "5/minute", burst: int = None):
+        count, period = rate.split("/")
+        self.key = key
+        self.capacity = int(burst or count)
+        self.refill_per_second = int(count) / PERIOD_SECONDS[period]
+
+
+def load_rules() -> dict:
+    rules = dict(DEFAULT_RATE_LIMITS)
+    rules.update(json.loads(os.getenv("RATE_LIMITS", "{}")))
+    return {route: [RateRule(**spec) for spec in specs] for route, specs in rules.items()}
+
+
+class MemoryBuckets:
+    """Buckets in a bounded dict, for a single process"""
+
+    def __init__(self, max_entries: int = MAX_IN_MEMORY_BUCKETS):
+        self.max_entries = max_entries
+        self._buckets = OrderedDict()  # key -> (tokens, updated_at)
+
+    async def take(self, key: str, capacity: int, refill_per_second: float) -> float:
+        """Spend one token; returns 0 if allowed, else seconds until one is available"""
+        now = time.monotonic()
+        tokens, updated_at = self._buckets.pop(key, (capacity, now))
+        tokens = min(capacity, tokens + (now - updated_at) * refill_per_second)
+
+        retry_after = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            retry_after = (1 - tokens) / refill_per_second
+
+        self._buckets[key] = (tokens, now)
+        while len(self._buckets) > self.max_entries:
+            self._buckets.popitem(last=False)
+        return retry_after
+
+
+class MongoBuckets:
+    """Buckets shared by every worker; one atomic update per check, TTL index cleans up"""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    @staticmethod
+    def _pipeline(capacity: int, refill_per_second: float) -> list:
+        elapsed_seconds = {"$divide": [{"$subtract": ["$$NOW", {"$ifNull": ["$updated_at", "$$NOW"]}]}, 1000]}
+        full_after_ms = math.ceil(capacity / refill_per_second * 1000)
+        return [
+            {"$set": {
+                "tokens": {"$min": [
+                    capacity,
+                    {"$add": [{"$ifNull": ["$tokens", capacity]}, {"$multiply": [elapsed_seconds, refill_per_second]}]}
+                ]},
+                "updated_at": "$$NOW"
+            }},
+            {"$set": {"allowed": {"$gte": ["$tokens", 1]}}},
+            {"$set": {
+                "tokens": {"$cond": ["$allowed", {"$subtract": ["$tokens", 1]}, "$tokens"]},
+                # An untouched bucket is full again by then, so it can go
+                "expires_at": {"$add": ["$$NOW", full_after_ms]}
+            }}
+        ]
+
+    async def take(self, key: str, capacity: int, refill_per_second: float) -> float:
+        pipeline = self._pipeline(capacity, refill_per_second)
+        try:
+            bucket = await self.collection.find_one_and_update(
+                {"_id": key}, pipeline, upsert=True, return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # Lost an upsert race with another worker; the bucket exists now
+            bucket = await self.collection.find_one_and_update(
+                {"_id": key}, pipeline, return_document=ReturnDocument.AFTER
+            )
+        if bucket["allowed"]:
+            return 0.0
+        return (1 - bucket["tokens"]) / refill_per_second
+
+
+def create_bucket_store(collection):
+    if RATE_LIMIT_STORE == "mongo":
+        return MongoBuckets(collection)
+    return MemoryBuckets()
+
+
+def _client_ip(scope) -> str:
+    if RATE_LIMIT_TRUST_PROXY:
+        for name, value in scope.get("headers", []):
+            if name == b"x-forwarded-for":
+                return value.decode("latin-1").split(",")[0].strip()
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+class RateLimitMiddleware:
+    """ASGI middleware applying token-bucket rules to selected routes"""
+
+    def __init__(self, app, store, rules: dict = None):
+        self.app = app
+        self.store = store
+        self.rules = rules if rules is not None else load_rules()
+
+    async def _read_form(self, scope, receive):
+        """Buffer the body so the form can be read here and replayed to the handler"""
+        messages = []
+        size = 0
+        while True:
+            message = await receive()
+            messages.append(message)
+            size += len(message.get("body", b""))
+            if message["type"] != "http.request" or not message.get("more_body", False):
+                break
+            if size > MAX_FORM_KEY_BODY_BYTES:
+                # Too big to key on; the handler reads the rest itself
+                break
+
+        replay = list(messages)
+
+        async def replay_receive():
+            if replay:
+                return replay.pop(0)
+            return await receive()
+
+        form = {}
+        if size <= MAX_FORM_KEY_BODY_BYTES:
+            buffered = list(messages)
+
+            async def buffered_receive():
+                return buffered.pop(0) if buffered else {"type": "http.request", "body": b"", "more_body": False}
+
+            try:
+                form = dict(await Request(scope, buffered_receive).form())
+            except Exception:
+                form = {}
+        return form, replay_receive
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        route = f"{scope['method']} {scope['path']}"
+        rules = self.rules.get(route)
+        if not rules:
+            return await self.app(scope, receive, send)
+
+        form = None
+        retry_after = 0.0
+        for index, rule in enumerate(rules):
+            if rule.key == "ip":
+                identity = _client_ip(scope)
+            elif rule.key == "route":
+                identity = "*"
+            else:
+                if form is None:
+                    form, receive = await self._read_form(scope, receive)
+                value = form.get(rule.key.split(":", 1)[1])
+                if not isinstance(value, str) or not value:
+                    continue
+                identity = value.strip().lower()
+
+            wait = await self.store.take(f"{route}|{index}|{identity}", rule.capacity, rule.refill_per_second)
+            retry_after = max(retry_after, wait)
+
+        if retry_after > 0:
+            response = JSONResponse(
+                {"detail": "Too many requests, please try again later"},
+                status_code=429,
+                headers={"Retry-After": str(math.ceil(retry_after))}
+            )
+            return await response(scope, receive, send)
+
+        return await self.app(scope, receive, send)
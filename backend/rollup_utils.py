@@ -0,0 +1,160 @@
+"""
+Attendance rollup utility
+Keeps per-employee daily and monthly totals in attendance_rollups so that
+summary blocks are lookups instead of scans over raw attendance records.
+
+Rollup documents:
+    {"employee_id": 1, "period": "day",   "key": "2025-01-15", "total_hours": 8.5, "present_days": 1, "total_days": 1}
+    {"employee_id": 1, "period": "month", "key": "2025-01",    "total_hours": 170.0, ...}
+
+Usage (from backend/):
+    python rollup_utils.py rebuild
+"""
+
+import asyncio
+import sys
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from attendance_utils import HOURS_WORKED_EXPR, iso_from_day_key, record_hours
+from index_utils import index_models
+
+EMPTY_SUMMARY = {"total_hours": 0.0, "present_days": 0, "total_days": 0}
+
+
+class AttendanceRollups:
+    """Incrementally maintained daily/monthly attendance totals"""
+
+    def __init__(self, attendance_collection, rollups_collection):
+        self.attendance = attendance_collection
+        self.rollups = rollups_collection
+
+    @staticmethod
+    def _increments(employee_id: int, date_str: str, hours: float, present_days: int, total_days: int) -> list:
+        inc = {"total_hours": hours, "present_days": present_days, "total_days": total_days}
+        return [
+            UpdateOne(
+                {"employee_id": employee_id, "period": period, "key": key},
+                {"$inc": inc},
+                upsert=True
+            )
+            for period, key in (("day", date_str), ("month", date_str[:7]))
+        ]
+
+    async def add(self, employee_id: int, date_str: str, hours: float = 0.0,
+                  present_days: int = 0, total_days: int = 0):
+        """Apply a change to one attendance day (negative values subtract)"""
+        await self.rollups.bulk_write(
+            self._increments(employee_id, date_str, hours, present_days, total_days),
+            ordered=False
+        )
+
+    async def add_many(self, changes: list):
+        """Apply several add() changes in one round trip: [(employee_id, date_str, hours, present_days, total_days)]"""
+        operations = []
+        for change in changes:
+            operations.extend(self._increments(*change))
+        if operations:
+            await self.rollups.bulk_write(operations, ordered=False)
+
+    async def subtract_records(self, records: list):
+        """
+        Take deleted records out of the totals. Pass the documents the delete
+        returned, so a record removed by two concurrent deletes counts once.
+        """
+        await self.add_many([
+            (record["employee_id"], iso_from_day_key(record["day"]),
+             -record_hours(record), -int(record.get("status") == "present"), -1)
+            for record in records
+        ])
+
+    async def remove_employee(self, employee_id: int):
+        await self.rollups.delete_many({"employee_id": employee_id})
+
+    async def summaries(self, start_date_str=None, end_date_str=None, employee_id=None) -> dict:
+        """
+        Summary blocks keyed by employee_id for [start, end).
+        Month-aligned ranges read the monthly docs, anything else the daily ones.
+        """
+        if not start_date_str or not end_date_str:
+            query = {"period": "month"}
+        elif start_date_str.endswith("-01") and end_date_str.endswith("-01"):
+            query = {"period": "month", "key": {"$gte": start_date_str[:7], "$lt": end_date_str[:7]}}
+        else:
+            query = {"period": "day", "key": {"$gte": start_date_str, "$lt": end_date_str}}
+
+        if employee_id is not None:
+            query["employee_id"] = employee_id
+
+        summaries = {}
+        async for doc in self.rollups.aggregate([
+            {"$match": query},
+            {"$group": {
+                "_id": "$employee_id",
+                "total_hours": {"$sum": "$total_hours"},
+                "present_days": {"$sum": "$present_days"},
+                "total_days": {"$sum": "$total_days"}
+            }}
+        ]):
+            summaries[doc["_id"]] = {
+                "total_hours": round(doc["total_hours"], 2),
+                "present_days": doc["present_days"],
+                "total_days": doc["total_days"]
+            }
+        return summaries
+
+    @staticmethod
+    def _day_totals_pipeline(query: dict) -> list:
+        return [
+            {"$match": query},
+            {"$group": {
+                "_id": {"employee_id": "$employee_id", "day": "$day"},
+                "total_hours": {"$sum": HOURS_WORKED_EXPR},
+                "present_days": {"$sum": {"$cond": [{"$eq": ["$status", "present"]}, 1, 0]}},
+                "total_days": {"$sum": 1}
+            }}
+        ]
+
+    async def rebuild(self):
+        """
+        Recompute every rollup from the raw attendance records.
+        The totals are built in a scratch collection and renamed over the
+        live one, so readers never see missing or half-written totals.
+        """
+        days = []
+        months = {}
+        async for day in self.attendance.aggregate(self._day_totals_pipeline({}), allowDiskUse=True):
+            employee_id, date_str = day["_id"]["employee_id"], iso_from_day_key(day["_id"]["day"])
+            totals = {k: day[k] for k in EMPTY_SUMMARY}
+            days.append({"employee_id": employee_id, "period": "day", "key": date_str, **totals})
+
+            month = months.setdefault((employee_id, date_str[:7]), dict(EMPTY_SUMMARY))
+            for k in EMPTY_SUMMARY:
+                month[k] += totals[k]
+
+        documents = days + [
+            {"employee_id": employee_id, "period": "month", "key": key, **totals}
+            for (employee_id, key), totals in months.items()
+        ]
+        # Unique per run, so rebuilds started by two processes don't collide
+        scratch = self.rollups.database.get_collection(f"{self.rollups.name}_rebuild_{ObjectId()}")
+        await scratch.create_indexes(index_models(self.rollups.name))
+        if documents:
+            await scratch.insert_many(documents, ordered=False)
+        await scratch.rename(self.rollups.name, dropTarget=True)
+        print(f"✅ Rebuilt {len(days)} daily and {len(months)} monthly attendance rollups")
+
+    async def ensure_built(self):
+        """Build the rollups the first time the API runs against existing data"""
+        if await self.rollups.find_one({}) is None and await self.attendance.find_one({}) is not None:
+            await self.rebuild()
+
+
+if __name__ == "__main__":
+    from database import attendance_collection, attendance_rollups_collection
+
+    if len(sys.argv) > 1 and sys.argv[1] == "rebuild":
+        asyncio.run(AttendanceRollups(attendance_collection, attendance_rollups_collection).rebuild())
+    else:
+        print(__doc__)
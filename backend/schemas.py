@@ -1,7 +1,7 @@
 
 from pydantic import BaseModel, EmailStr
 from datetime import datetime, date
-from typing import Optional
+from typing import List, Literal, Optional
 
 
 class AdminLogin(BaseModel):
@@ -56,6 +56,18 @@ class AttendanceMarkOut(BaseModel):
     longitude: float
 
 
+class AttendanceEvent(BaseModel):
+    employee_id: int
+    type: Literal["in", "out"]
+    timestamp: datetime
+    latitude: float
+    longitude: float
+
+
+class AttendanceBatch(BaseModel):
+    events: List[AttendanceEvent]
+
+
 class AttendanceResponse(BaseModel):
     id: int
     employee_id: int
@@ -0,0 +1,162 @@
+"""
+Upload serving utility
+StaticFiles for /uploads with long-lived caching: content-hashed files
+(see upload_utils) are served as immutable with strong ETags, small hot
+files come from an in-memory LRU, and byte ranges are honoured.
+A small file missing from the LRU is read in a worker thread when the
+response is sent. Large files go through FileResponse, which uses
+zero-copy sends when the ASGI server offers them.
+"""
+
+import asyncio
+import os
+import re
+from collections import OrderedDict
+from email.utils import formatdate
+from mimetypes import guess_type
+from pathlib import Path
+
+from fastapi import Response
+from fastapi.responses import FileResponse
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+
+UPLOAD_CACHE_BYTES = int(os.getenv("UPLOAD_CACHE_MB", "32")) * 1024 * 1024
+UPLOAD_CACHE_MAX_FILE_BYTES = 256 * 1024
+
+# <sha256>.<ext> originals and <sha256>_<width>.<ext> variants never change
+CONTENT_HASHED_NAME = re.compile(r"^([0-9a-f]{64}(?:_\d+)?)\.[A-Za-z0-9]+$")
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+DEFAULT_CACHE_CONTROL = "public, max-age=300"
+
+RANGE_HEADER = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class FileLRU:
+    """Bytes of recently served small files, bounded by total size"""
+
+    def __init__(self, max_bytes: int = UPLOAD_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+
+    def get(self, path: str, stat_result: os.stat_result):
+        entry = self._entries.get(path)
+        if entry is None:
+            return None
+        mtime_ns, body = entry
+        if mtime_ns != stat_result.st_mtime_ns or len(body) != stat_result.st_size:
+            self._drop(path)
+            return None
+        self._entries.move_to_end(path)
+        return body
+
+    def put(self, path: str, stat_result: os.stat_result, body: bytes):
+        self._drop(path)
+        self._entries[path] = (stat_result.st_mtime_ns, body)
+        self.size += len(body)
+        while self.size > self.max_bytes and self._entries:
+            self._drop(next(iter(self._entries)))
+
+    def _drop(self, path: str):
+        entry = self._entries.pop(path, None)
+        if entry is not None:
+            self.size -= len(entry[1])
+
+
+def _parse_range(header: str, size: int):
+    """(start, end) inclusive for a single bytes range, None if unsupported, False if unsatisfiable"""
+    match = RANGE_HEADER.match(header.strip())
+    if not match or match.group(1) == match.group(2) == "":
+        return None
+
+    first, last = match.groups()
+    if first == "":
+        length = int(last)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+class _ReadingResponse(Response):
+    """Loads the body off the event loop when sent, then hands over to respond(body)"""
+
+    def __init__(self, load, respond):
+        super().__init__()
+        self.load = load
+        self.respond = respond
+
+    async def __call__(self, scope, receive, send):
+        body = await self.load()
+        await self.respond(body)(scope, receive, send)
+
+
+class UploadFiles(StaticFiles):
+    """Drop-in StaticFiles with cache-friendly headers for uploaded images"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cache = FileLRU()
+
+    def file_response(self, full_path, stat_result: os.stat_result, scope, status_code: int = 200) -> Response:
+        request_headers = Headers(scope=scope)
+        name = os.path.basename(full_path)
+        hashed = CONTENT_HASHED_NAME.match(name)
+
+        if hashed:
+            etag = f'"{hashed.group(1)}"'
+            cache_control = IMMUTABLE_CACHE_CONTROL
+        else:
+            etag = f'"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"'
+            cache_control = DEFAULT_CACHE_CONTROL
+
+        headers = {
+            "ETag": etag,
+            "Cache-Control": cache_control,
+            "Last-Modified": formatdate(stat_result.st_mtime, usegmt=True),
+            "Accept-Ranges": "bytes"
+        }
+
+        if_none_match = request_headers.get("if-none-match")
+        if if_none_match and (if_none_match.strip() == "*" or etag in [t.strip() for t in if_none_match.split(",")]):
+            return Response(status_code=304, headers=headers)
+
+        if stat_result.st_size > UPLOAD_CACHE_MAX_FILE_BYTES:
+            # Starlette's FileResponse handles Range and zero-copy sends itself
+            return FileResponse(full_path, status_code=status_code, stat_result=stat_result, headers=headers)
+
+        full_path = str(full_path)
+        media_type = guess_type(name)[0] or "application/octet-stream"
+        range_header = request_headers.get("range")
+        if_range = request_headers.get("if-range")
+
+        def respond(body: bytes) -> Response:
+            if range_header and (not if_range or if_range == etag):
+                byte_range = _parse_range(range_header, len(body))
+                if byte_range is False:
+                    return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{len(body)}"})
+                if byte_range:
+                    start, end = byte_range
+                    headers["Content-Range"] = f"bytes {start}-{end}/{len(body)}"
+                    return Response(body[start:end + 1], status_code=206, media_type=media_type, headers=headers)
+
+            return Response(body, status_code=status_code, media_type=media_type, headers=headers)
+
+        body = self.cache.get(full_path, stat_result)
+        if body is not None:
+            return respond(body)
+
+        # file_response() is sync, so the read happens when the response is sent
+        async def load() -> bytes:
+            body = await asyncio.to_thread(Path(full_path).read_bytes)
+            self.cache.put(full_path, stat_result, body)
+            return body
+
+        return _ReadingResponse(load, respond)
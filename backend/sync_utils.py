@@ -0,0 +1,84 @@
+"""
+Incremental sync utility
+Every write to attendance and employee_links stamps updated_at, and
+deletions leave a tombstone, so the employee portal can ask for
+"what changed since my last cursor" instead of re-pulling whole histories.
+
+Cursors are opaque integers (epoch milliseconds, UTC). Each response hands
+back the next cursor, held back by SYNC_SAFETY_SECONDS so a write that was
+stamped but not yet visible when we read is picked up on the next sync.
+Re-delivered records are harmless: clients upsert by _id.
+
+Tombstones expire after SYNC_TOMBSTONE_DAYS; an older cursor gets 410 and
+the client falls back to a full fetch.
+"""
+
+import os
+from datetime import datetime, timedelta
+
+from fastapi import HTTPException
+
+SYNC_SAFETY_SECONDS = float(os.getenv("SYNC_SAFETY_SECONDS", "5"))
+SYNC_TOMBSTONE_DAYS = int(os.getenv("SYNC_TOMBSTONE_DAYS", "90"))
+# Cursors we handed out are never ahead of our clock by more than this
+CURSOR_CLOCK_SLACK = timedelta(minutes=5)
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def now() -> datetime:
+    """Timestamp for updated_at, truncated to what BSON Dates store"""
+    stamp = datetime.utcnow()
+    return stamp.replace(microsecond=stamp.microsecond // 1000 * 1000)
+
+
+def to_cursor(stamp: datetime) -> int:
+    return int((stamp - EPOCH) / timedelta(milliseconds=1))
+
+
+def from_cursor(cursor: int) -> datetime:
+    """since= value back to a datetime, rejecting cursors older than our tombstones"""
+    # Checked before building the datetime, which overflows for huge values
+    if cursor < 0 or cursor > to_cursor(datetime.utcnow() + CURSOR_CLOCK_SLACK):
+        raise HTTPException(status_code=400, detail="Invalid since cursor")
+    stamp = EPOCH + timedelta(milliseconds=cursor)
+    if stamp < datetime.utcnow() - timedelta(days=SYNC_TOMBSTONE_DAYS):
+        raise HTTPException(status_code=410, detail="Sync cursor expired, fetch the full history")
+    return stamp
+
+
+def next_cursor(since: datetime = None) -> int:
+    """
+    Cursor to hand back with a response; take it before reading so nothing
+    written during the read is skipped
+    """
+    cursor = datetime.utcnow() - timedelta(seconds=SYNC_SAFETY_SECONDS)
+    if since is not None and since > cursor:
+        cursor = since
+    return to_cursor(cursor)
+
+
+class Tombstones:
+    """Deletion records for synced collections, expired by a TTL index"""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def record(self, scope: str, employee_id: int, ids: list):
+        if not ids:
+            return
+        deleted_at = now()
+        expires_at = deleted_at + timedelta(days=SYNC_TOMBSTONE_DAYS)
+        await self.collection.insert_many([
+            {"scope": scope, "employee_id": employee_id, "doc_id": doc_id,
+             "deleted_at": deleted_at, "expires_at": expires_at}
+            for doc_id in ids
+        ], ordered=False)
+
+    async def since(self, scope: str, employee_id: int, since: datetime) -> list:
+        """ids deleted at or after since"""
+        cursor = self.collection.find(
+            {"scope": scope, "employee_id": employee_id, "deleted_at": {"$gte": since}},
+            {"doc_id": 1, "_id": 0}
+        )
+        return [doc["doc_id"] async for doc in cursor]
@@ -0,0 +1,55 @@
+"""
+Shared fixtures
+Tests run against a real MongoDB (MONGODB_URL, default localhost) in a
+scratch database (TEST_MONGODB_DB, default myapp_db_test) that is dropped
+before and after the session; they are skipped when no server answers.
+
+Run from backend/:  python -m pytest tests
+"""
+
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Point the app at the scratch database before database.py is imported
+TEST_DB = os.getenv("TEST_MONGODB_DB", "myapp_db_test")
+os.environ["MONGODB_DB"] = TEST_DB
+os.environ.setdefault("MONGODB_URL", "mongodb://localhost:27017")
+os.environ.setdefault("MONGODB_SERVER_SELECTION_TIMEOUT_MS", "2000")
+os.environ.setdefault("SMTP_EMAIL", "test@example.com")
+os.environ.setdefault("SMTP_PASSWORD", "test")
+os.environ.setdefault("SECRET_KEY", "test-secret")
+
+
+@pytest.fixture(scope="session")
+def loop():
+    """One loop for the session, since the Motor client binds to the first one it sees"""
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture(scope="session")
+def mongo(loop):
+    from database import client, database
+
+    try:
+        loop.run_until_complete(client.admin.command("ping"))
+    except Exception as e:
+        pytest.skip(f"MongoDB not reachable: {e}")
+
+    loop.run_until_complete(client.drop_database(TEST_DB))
+    yield database
+    loop.run_until_complete(client.drop_database(TEST_DB))
+
+
+@pytest.fixture
+def db(mongo, loop):
+    """The scratch database, emptied after each test"""
+    yield mongo
+    for name in loop.run_until_complete(mongo.list_collection_names()):
+        loop.run_until_complete(mongo.get_collection(name).delete_many({}))
@@ -0,0 +1,143 @@
+"""
+Parallel mark-ins: exactly one may win per employee-day, and a missing
+unique day index must stop the API from starting.
+"""
+
+import asyncio
+from datetime import date, datetime
+
+import httpx
+import pytest
+
+import location_utils
+import main
+from attendance_migration import dedupe_attendance
+from attendance_utils import day_fields, day_key
+from index_utils import ensure_indexes, require_indexes
+
+PARALLEL_TAPS = 25
+
+
+def site_coordinates():
+    sites = location_utils._index.sites
+    site = next((s for s in sites if s.polygon is None), sites[0])
+    return site.latitude, site.longitude
+
+
+async def mark_in_many(employee_ids: list) -> list:
+    latitude, longitude = site_coordinates()
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+        return await asyncio.gather(*(
+            http.post("/attendance/mark-in", data={
+                "employee_id": employee_id, "latitude": latitude, "longitude": longitude
+            })
+            for employee_id in employee_ids
+        ))
+
+
+@pytest.fixture
+def seeded(db, loop):
+    async def seed():
+        await ensure_indexes(db)
+        await db.employees.insert_many([
+            {"id": i, "name": f"Employee {i}", "email": f"emp{i}@example.com", "password_hash": "x"}
+            for i in range(1, 11)
+        ])
+        await main.rollups.rebuild()
+        main.employee_directory.invalidate()
+
+    loop.run_until_complete(seed())
+    return db
+
+
+def test_parallel_mark_ins_for_one_employee_record_one_day(seeded, loop):
+    responses = loop.run_until_complete(mark_in_many([1] * PARALLEL_TAPS))
+
+    statuses = sorted(r.status_code for r in responses)
+    assert statuses == [200] + [400] * (PARALLEL_TAPS - 1)
+    assert all(
+        r.json()["detail"] == "Attendance already marked for today"
+        for r in responses if r.status_code == 400
+    )
+
+    today = day_key(date.today())
+    assert loop.run_until_complete(seeded.attendance.count_documents({"employee_id": 1, "day": today})) == 1
+
+    summary = loop.run_until_complete(main.rollups.summaries(employee_id=1))[1]
+    assert summary["present_days"] == 1
+    assert summary["total_days"] == 1
+
+
+def test_parallel_mark_ins_for_different_employees_all_succeed(seeded, loop):
+    responses = loop.run_until_complete(mark_in_many(list(range(1, 11))))
+
+    assert [r.status_code for r in responses] == [200] * 10
+    today = day_key(date.today())
+    assert loop.run_until_complete(seeded.attendance.count_documents({"day": today})) == 10
+
+
+def test_duplicate_days_are_merged_before_the_unique_index_is_built(db, loop):
+    async def scenario():
+        await db.attendance.drop()
+        day = date(2025, 3, 3)
+        await db.attendance.insert_many([
+            {"employee_id": 1, **day_fields(day), "in_time": datetime(2025, 3, 3, 9, 5), "status": "present"},
+            {"employee_id": 1, **day_fields(day), "in_time": datetime(2025, 3, 3, 9, 0), "status": "present"},
+            {"employee_id": 1, **day_fields(day), "in_time": datetime(2025, 3, 3, 9, 2),
+             "out_time": datetime(2025, 3, 3, 17, 30), "status": "present"},
+        ])
+
+        assert await dedupe_attendance(db.attendance) == 2
+        await ensure_indexes(db)
+        await require_indexes(db)
+
+        record = await db.attendance.find_one({"employee_id": 1})
+        assert record["in_time"] == datetime(2025, 3, 3, 9, 0)
+        assert record["out_time"] == datetime(2025, 3, 3, 17, 30)
+        assert record["hours_worked"] == 8.5
+
+    loop.run_until_complete(scenario())
+
+
+def test_startup_refuses_to_run_without_the_unique_day_index(db, loop):
+    async def scenario():
+        await db.attendance.drop()
+        await db.attendance.insert_one({"employee_id": 1, **day_fields(date(2025, 3, 3))})
+        with pytest.raises(RuntimeError, match="employee_day_unique"):
+            await require_indexes(db)
+
+    loop.run_until_complete(scenario())
+
+
+def test_concurrent_deletes_take_each_record_out_of_the_rollups_once(db, loop):
+    async def scenario():
+        await ensure_indexes(db)
+        await db.attendance.insert_many([
+            {"employee_id": 1, **day_fields(date(2025, 3, day)), "in_time": datetime(2025, 3, day, 9, 0),
+             "out_time": datetime(2025, 3, day, 17, 0), "status": "present"}
+            for day in range(3, 8)
+        ])
+        await main.rollups.rebuild()
+
+        results = await asyncio.gather(*(
+            main.delete_employee_attendance(1, start_date="2025-03-01", end_date="2025-04-01")
+            for _ in range(3)
+        ))
+        assert sum(result["deleted_count"] for result in results) == 5
+        return await main.rollups.summaries("2025-03-01", "2025-04-01", employee_id=1)
+
+    assert loop.run_until_complete(scenario()).get(1, {"total_days": 0})["total_days"] == 0
+
+
+def test_records_without_a_day_are_left_out_of_the_merge(db, loop):
+    async def scenario():
+        await db.attendance.drop()
+        await db.attendance.insert_many([
+            {"employee_id": 1, "date": "not-a-date", "status": "present"},
+            {"employee_id": 1, "date": "also-bad", "status": "present"},
+        ])
+        assert await dedupe_attendance(db.attendance) == 0
+        assert await db.attendance.count_documents({"employee_id": 1}) == 2
+
+    loop.run_until_complete(scenario())
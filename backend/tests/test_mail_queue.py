@@ -0,0 +1,179 @@
+"""
+MailQueue against a local aiosmtpd server: delivery over a reused session,
+retry with backoff, and recovery of mail abandoned by another process.
+"""
+
+import asyncio
+import socket
+from datetime import datetime, timedelta
+
+import pytest
+from aiosmtpd.controller import Controller
+
+import email_utils
+from email_utils import MailQueue
+
+
+class RecordingHandler:
+    """Collects delivered messages; the first fail_first DATA commands get a 451"""
+
+    def __init__(self, fail_first: int = 0):
+        self.fail_first = fail_first
+        self.messages = []
+        self.peers = set()
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.fail_first > 0:
+            self.fail_first -= 1
+            return "451 Try again later"
+        self.peers.add(session.peer)
+        self.messages.append((envelope.rcpt_tos, envelope.content.decode()))
+        return "250 OK"
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def smtp_server(monkeypatch):
+    def start(handler):
+        port = free_port()
+        controller = Controller(handler, hostname="127.0.0.1", port=port)
+        controller.start()
+        servers.append(controller)
+        monkeypatch.setattr(email_utils, "SMTP_HOST", "127.0.0.1")
+        monkeypatch.setattr(email_utils, "SMTP_PORT", port)
+        monkeypatch.setattr(email_utils, "SMTP_USE_SSL", False)
+        return handler
+
+    servers = []
+    monkeypatch.setattr(email_utils, "MAIL_RETRY_BASE_SECONDS", 0.05)
+    yield start
+    for controller in servers:
+        controller.stop()
+
+
+async def wait_until_sent(outbox, timeout: float = 5.0):
+    """Delivered mail is deleted, so an empty outbox means everything went out"""
+    deadline = asyncio.get_running_loop().time() + timeout
+    while await outbox.count_documents({}):
+        assert asyncio.get_running_loop().time() < deadline, "mail was not delivered in time"
+        await asyncio.sleep(0.05)
+
+
+def test_enqueued_mail_is_delivered_over_one_session(db, loop, smtp_server):
+    handler = smtp_server(RecordingHandler())
+    queue = MailQueue(db.mail_outbox, "sender@example.com", "", workers=1)
+
+    async def scenario():
+        await queue.start()
+        try:
+            for i in range(3):
+                await queue.enqueue(f"user{i}@example.com", f"Subject {i}", "Hello")
+            await wait_until_sent(db.mail_outbox)
+        finally:
+            await queue.stop()
+
+    loop.run_until_complete(scenario())
+
+    assert sorted(rcpt for rcpts, _ in handler.messages for rcpt in rcpts) == [
+        "user0@example.com", "user1@example.com", "user2@example.com"
+    ]
+    assert len(handler.peers) == 1
+
+
+def test_failed_delivery_is_retried_with_backoff(db, loop, smtp_server):
+    handler = smtp_server(RecordingHandler(fail_first=2))
+    queue = MailQueue(db.mail_outbox, "sender@example.com", "", workers=1)
+
+    async def scenario():
+        await queue.start()
+        try:
+            await queue.enqueue("user@example.com", "Retry", "Hello")
+            await wait_until_sent(db.mail_outbox)
+        finally:
+            await queue.stop()
+
+    loop.run_until_complete(scenario())
+
+    assert len(handler.messages) == 1
+    assert "Subject: Retry" in handler.messages[0][1]
+
+
+def test_mail_is_given_up_after_max_attempts(db, loop, smtp_server, monkeypatch):
+    monkeypatch.setattr(email_utils, "MAIL_MAX_ATTEMPTS", 2)
+    handler = smtp_server(RecordingHandler(fail_first=10))
+    queue = MailQueue(db.mail_outbox, "sender@example.com", "", workers=1)
+
+    async def scenario():
+        await queue.start()
+        try:
+            message_id = await queue.enqueue("user@example.com", "Doomed", "Hello")
+            for _ in range(100):
+                doc = await db.mail_outbox.find_one({"_id": message_id})
+                if doc["status"] == "failed":
+                    return doc
+                await asyncio.sleep(0.05)
+        finally:
+            await queue.stop()
+
+    doc = loop.run_until_complete(scenario())
+    assert doc is not None and doc["status"] == "failed"
+    assert doc["attempts"] == 2
+    assert handler.messages == []
+
+
+def test_poll_picks_up_mail_abandoned_by_another_process(db, loop, smtp_server):
+    handler = smtp_server(RecordingHandler())
+    queue = MailQueue(db.mail_outbox, "sender@example.com", "", workers=1)
+    now = datetime.utcnow()
+
+    async def scenario():
+        await queue.start()
+        try:
+            # Written by processes that died: one mid-send, one before its worker saw it
+            await db.mail_outbox.insert_many([
+                {"to": "leased@example.com", "subject": "Leased", "body": "Hello", "status": "sending",
+                 "attempts": 1, "locked_at": now - timedelta(minutes=10), "next_attempt_at": now, "created_at": now},
+                {"to": "pending@example.com", "subject": "Pending", "body": "Hello", "status": "pending",
+                 "attempts": 0, "next_attempt_at": now, "created_at": now},
+                {"to": "live@example.com", "subject": "Live", "body": "Hello", "status": "sending",
+                 "attempts": 1, "locked_at": now, "next_attempt_at": now, "created_at": now},
+            ])
+            assert await queue.poll_outbox() == 2
+            while await db.mail_outbox.count_documents({"to": {"$in": ["leased@example.com", "pending@example.com"]}}):
+                await asyncio.sleep(0.05)
+            # A lease still inside SENDING_LEASE belongs to a live worker and is left alone
+            return await db.mail_outbox.find_one({"to": "live@example.com"})
+        finally:
+            await queue.stop()
+
+    live = loop.run_until_complete(asyncio.wait_for(scenario(), 5))
+
+    assert sorted(rcpt for rcpts, _ in handler.messages for rcpt in rcpts) == [
+        "leased@example.com", "pending@example.com"
+    ]
+    assert live["status"] == "sending"
+
+
+def test_stop_returns_promptly_and_leaves_unsent_mail_in_the_outbox(db, loop, smtp_server):
+    smtp_server(RecordingHandler())
+    queue = MailQueue(db.mail_outbox, "sender@example.com", "", workers=2)
+
+    async def scenario():
+        await queue.start()
+        # Nothing is due yet, so both workers sit idle on the queue
+        await db.mail_outbox.insert_one({
+            "to": "later@example.com", "subject": "Later", "body": "Hello", "status": "pending",
+            "attempts": 0, "next_attempt_at": datetime.utcnow() + timedelta(hours=1),
+            "created_at": datetime.utcnow()
+        })
+        started = asyncio.get_running_loop().time()
+        await queue.stop()
+        return asyncio.get_running_loop().time() - started
+
+    assert loop.run_until_complete(asyncio.wait_for(scenario(), 5)) < email_utils.MAIL_STOP_TIMEOUT_SECONDS
+    assert loop.run_until_complete(db.mail_outbox.count_documents({"status": "pending"})) == 1
@@ -0,0 +1,118 @@
+"""
+migratedata.py against a small SQLite fixture: full run, resume after a
+crash between insert and checkpoint, and dry runs.
+"""
+
+import sqlite3
+from datetime import datetime
+
+import pytest
+
+import migratedata
+from migratedata import migrate_data
+
+SCHEMA = """
+CREATE TABLE admins (id INTEGER PRIMARY KEY, email TEXT, password_hash TEXT);
+CREATE TABLE news (id INTEGER PRIMARY KEY, title TEXT, description TEXT, image_path TEXT, date TEXT);
+CREATE TABLE jobs (id INTEGER PRIMARY KEY, title TEXT, description TEXT, location TEXT);
+CREATE TABLE employees (id INTEGER PRIMARY KEY, name TEXT, email TEXT, password_hash TEXT);
+CREATE TABLE attendance (id INTEGER PRIMARY KEY, employee_id INTEGER, date TEXT, in_time TEXT, out_time TEXT);
+"""
+
+
+def build_fixture(path, attendance_rows=None):
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    conn.execute("INSERT INTO admins VALUES (1, 'admin@example.com', 'hash')")
+    conn.executemany("INSERT INTO news VALUES (?, ?, ?, ?, ?)", [
+        (i, f"News {i}", "Body", None, "2025-01-01") for i in range(1, 8)
+    ])
+    conn.executemany("INSERT INTO jobs VALUES (?, ?, ?, ?)", [
+        (i, f"Job {i}", "Body", "Kochi") for i in range(1, 6)
+    ])
+    conn.executemany("INSERT INTO employees VALUES (?, ?, ?, ?)", [
+        (i, f"Employee {i}", f"emp{i}@example.com", "hash") for i in range(1, 4)
+    ])
+    conn.executemany("INSERT INTO attendance VALUES (?, ?, ?, ?, ?)", attendance_rows or [
+        (1, 1, "2025-01-02", "2025-01-02T09:00:00", "2025-01-02T17:30:00"),
+        (2, 2, "2025-01-02", "2025-01-02T09:15:00", None),
+        (3, 1, "2025-01-03", "2025-01-03T09:00:00", "2025-01-03T17:00:00"),
+    ])
+    conn.commit()
+    conn.close()
+
+
+@pytest.fixture
+def sqlite_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(migratedata, "CHECKPOINT_FILE", str(tmp_path / "checkpoint.json"))
+    path = str(tmp_path / "app.db")
+    build_fixture(path)
+    return path
+
+
+async def counts(db) -> dict:
+    return {table: await db.get_collection(table).count_documents({}) for table in migratedata.TABLES}
+
+
+def test_migrates_every_table_in_batches_and_rebuilds_summaries(db, loop, sqlite_db):
+    loop.run_until_complete(migrate_data(sqlite_db, batch_size=2))
+
+    assert loop.run_until_complete(counts(db)) == {
+        "admins": 1, "news": 7, "jobs": 5, "employees": 3, "attendance": 3
+    }
+
+    record = loop.run_until_complete(db.attendance.find_one({"employee_id": 1, "day": 20250102}))
+    assert record["in_time"] == datetime(2025, 1, 2, 9, 0)
+    assert record["out_time"] == datetime(2025, 1, 2, 17, 30)
+
+    rollup = loop.run_until_complete(
+        db.attendance_rollups.find_one({"employee_id": 1, "period": "month", "key": "2025-01"})
+    )
+    assert rollup["total_days"] == 2
+    assert rollup["total_hours"] == 16.5
+
+
+def test_resume_after_crash_does_not_duplicate_rows(db, loop, sqlite_db, tmp_path):
+    loop.run_until_complete(migrate_data(sqlite_db, batch_size=3))
+    # A crash after insert_many but before save_checkpoint: the checkpoint is behind
+    migratedata.save_checkpoint({"news": 3, "jobs": 0})
+
+    loop.run_until_complete(migrate_data(sqlite_db, batch_size=3))
+
+    assert loop.run_until_complete(counts(db)) == {
+        "admins": 1, "news": 7, "jobs": 5, "employees": 3, "attendance": 3
+    }
+
+
+def test_dry_run_writes_nothing(db, loop, sqlite_db, tmp_path):
+    loop.run_until_complete(migrate_data(sqlite_db, dry_run=True))
+
+    assert sum(loop.run_until_complete(counts(db)).values()) == 0
+    assert not (tmp_path / "checkpoint.json").exists()
+
+
+def test_dry_run_catches_rows_that_cannot_be_mapped(db, loop, tmp_path, monkeypatch):
+    monkeypatch.setattr(migratedata, "CHECKPOINT_FILE", str(tmp_path / "checkpoint.json"))
+    path = str(tmp_path / "bad.db")
+    build_fixture(path, attendance_rows=[(1, 1, "not-a-date", None, None)])
+
+    with pytest.raises(ValueError):
+        loop.run_until_complete(migrate_data(path, dry_run=True))
+
+
+def test_duplicate_attendance_days_are_merged_not_dropped(db, loop, tmp_path, monkeypatch):
+    monkeypatch.setattr(migratedata, "CHECKPOINT_FILE", str(tmp_path / "checkpoint.json"))
+    path = str(tmp_path / "dupes.db")
+    build_fixture(path, attendance_rows=[
+        (1, 1, "2025-01-02", "2025-01-02T09:10:00", None),
+        (2, 1, "2025-01-02", "2025-01-02T09:00:00", "2025-01-02T17:00:00"),
+        (3, 1, "2025-01-02", None, "2025-01-02T18:00:00"),
+    ])
+
+    loop.run_until_complete(migrate_data(path, batch_size=2))
+
+    records = loop.run_until_complete(db.attendance.find({"employee_id": 1}).to_list(length=None))
+    assert len(records) == 1
+    assert records[0]["in_time"] == datetime(2025, 1, 2, 9, 0)
+    assert records[0]["out_time"] == datetime(2025, 1, 2, 18, 0)
+    assert records[0]["hours_worked"] == 9.0
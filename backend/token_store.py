@@ -0,0 +1,105 @@
+"""
+Reset token store
+Password-reset tokens with automatic expiry. The Mongo store is shared by
+every uvicorn worker; the in-memory store is for single-process runs.
+
+RESET_TOKEN_STORE=mongo|memory picks the implementation (default mongo),
+RESET_TOKEN_TTL_MINUTES sets the lifetime (default 30).
+"""
+
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+RESET_TOKEN_STORE = os.getenv("RESET_TOKEN_STORE", "mongo")
+RESET_TOKEN_TTL_MINUTES = int(os.getenv("RESET_TOKEN_TTL_MINUTES", "30"))
+MAX_IN_MEMORY_TOKENS = 10000
+
+
+class InMemoryTokenStore:
+    """LRU-bounded dict with per-entry expiry, for a single process"""
+
+    def __init__(self, ttl_seconds: float, max_entries: int = MAX_IN_MEMORY_TOKENS):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # token -> (expires_at, data), oldest first
+
+    def _purge_expired(self):
+        # Every entry has the same TTL, so insertion order is expiry order
+        now = time.monotonic()
+        while self._entries:
+            token, (expires_at, _) = next(iter(self._entries.items()))
+            if expires_at > now:
+                break
+            del self._entries[token]
+
+    async def put(self, token: str, data: dict):
+        self._purge_expired()
+        self._entries[token] = (time.monotonic() + self.ttl_seconds, data)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get(self, token: str):
+        entry = self._entries.get(token)
+        if entry is None:
+            return None
+        expires_at, data = entry
+        if expires_at <= time.monotonic():
+            del self._entries[token]
+            return None
+        return data
+
+    async def pop(self, token: str):
+        data = await self.get(token)
+        self._entries.pop(token, None)
+        return data
+
+    async def claim(self, token: str, token_type: str):
+        """Remove and return the token's data if it is live and of token_type"""
+        # No await between the check and the removal, so no other request interleaves
+        entry = self._entries.get(token)
+        if entry is None or entry[0] <= time.monotonic() or entry[1].get("type") != token_type:
+            return None
+        del self._entries[token]
+        return entry[1]
+
+
+class MongoTokenStore:
+    """Shared across workers; a TTL index on expires_at deletes old tokens"""
+
+    def __init__(self, collection, ttl_seconds: float):
+        self.collection = collection
+        self.ttl_seconds = ttl_seconds
+
+    async def put(self, token: str, data: dict):
+        await self.collection.insert_one({
+            "_id": token,
+            "data": data,
+            "expires_at": datetime.utcnow() + timedelta(seconds=self.ttl_seconds)
+        })
+
+    async def get(self, token: str):
+        # The TTL monitor runs about once a minute, so check expiry here too
+        doc = await self.collection.find_one({"_id": token, "expires_at": {"$gt": datetime.utcnow()}})
+        return doc["data"] if doc else None
+
+    async def pop(self, token: str):
+        doc = await self.collection.find_one_and_delete({"_id": token, "expires_at": {"$gt": datetime.utcnow()}})
+        return doc["data"] if doc else None
+
+    async def claim(self, token: str, token_type: str):
+        """Remove and return the token's data if it is live and of token_type"""
+        doc = await self.collection.find_one_and_delete({
+            "_id": token,
+            "data.type": token_type,
+            "expires_at": {"$gt": datetime.utcnow()}
+        })
+        return doc["data"] if doc else None
+
+
+def create_token_store(collection):
+    ttl_seconds = RESET_TOKEN_TTL_MINUTES * 60
+    if RESET_TOKEN_STORE == "memory":
+        return InMemoryTokenStore(ttl_seconds)
+    return MongoTokenStore(collection, ttl_seconds)
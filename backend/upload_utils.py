@@ -0,0 +1,134 @@
+"""
+Upload utility
+Streams uploaded images to disk off the event loop under content-hash
+filenames (identical uploads share one file) and builds resized
+WebP/AVIF variants for responsive srcset markup.
+"""
+
+import asyncio
+import glob
+import hashlib
+import os
+import tempfile
+
+from fastapi import HTTPException, UploadFile
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_MB", "10")) * 1024 * 1024
+
+VARIANT_WIDTHS = [320, 640, 1280]
+VARIANT_FORMATS = ["webp", "avif"]
+VARIANT_QUALITY = 80
+
+
+def _write_chunk(out, digest, chunk: bytes):
+    digest.update(chunk)
+    out.write(chunk)
+
+
+async def save_upload(upload: UploadFile, directory: str) -> str:
+    """
+    Stream an upload into directory as <sha256><ext> and return its path.
+    Raises 413 past MAX_UPLOAD_BYTES; an identical file is reused.
+    """
+    os.makedirs(directory, exist_ok=True)
+    extension = os.path.splitext(upload.filename or "")[1].lower()
+
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > MAX_UPLOAD_BYTES:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"File too large (max {MAX_UPLOAD_BYTES // (1024 * 1024)} MB)"
+                    )
+                await asyncio.to_thread(_write_chunk, out, digest, chunk)
+
+        file_path = f"{directory}/{digest.hexdigest()}{extension}"
+        if os.path.exists(file_path):
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, file_path)
+        return file_path
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _avif_supported() -> bool:
+    from PIL import Image
+
+    try:
+        import pillow_avif  # noqa: F401 - registers the AVIF plugin on older Pillow
+    except ImportError:
+        pass
+    Image.init()
+    return "AVIF" in Image.SAVE
+
+
+def generate_variants(file_path: str) -> list:
+    """
+    Resize file_path to each VARIANT_WIDTHS (never upscaling) in every
+    supported VARIANT_FORMATS. Blocking - run it in a thread.
+    Returns [{"path", "width", "height", "format"}, ...]
+    """
+    from PIL import Image, ImageOps
+
+    formats = [f for f in VARIANT_FORMATS if f != "avif" or _avif_supported()]
+    base_path = os.path.splitext(file_path)[0]
+    variants = []
+
+    with Image.open(file_path) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+
+        widths = [w for w in VARIANT_WIDTHS if w < image.width] or [image.width]
+        for width in widths:
+            resized = image.copy()
+            resized.thumbnail((width, image.height))
+            for fmt in formats:
+                variant_path = f"{base_path}_{resized.width}.{fmt}"
+                if not os.path.exists(variant_path):
+                    resized.save(variant_path, fmt.upper(), quality=VARIANT_QUALITY)
+                variants.append({
+                    "path": variant_path,
+                    "width": resized.width,
+                    "height": resized.height,
+                    "format": fmt
+                })
+
+    return variants
+
+
+def build_srcset(variants: list) -> dict:
+    """{"webp": "uploads/news/x_320.webp 320w, ...", ...}"""
+    srcset = {}
+    for variant in variants:
+        srcset.setdefault(variant["format"], []).append(f"{variant['path']} {variant['width']}w")
+    return {fmt: ", ".join(entries) for fmt, entries in srcset.items()}
+
+
+def remove_image(file_path: str):
+    """Delete an uploaded image together with its generated variants"""
+    base_path = os.path.splitext(file_path)[0]
+    variant_paths = [
+        path for fmt in VARIANT_FORMATS
+        for path in glob.glob(f"{glob.escape(base_path)}_*.{fmt}")
+        if path[len(base_path) + 1:-len(fmt) - 1].isdigit()
+    ]
+    for path in [file_path] + variant_paths:
+        if not os.path.exists(path):
+            continue
+        try:
+            os.remove(path)
+        except OSError as e:
+            print(f"Warning: Could not delete image file: {e}")
@@ -4,4 +4,54 @@ const API = axios.create({
   baseURL: import.meta.env.VITE_API_URL || "http://localhost:8000",
 });
 
+// Send the admin access token with every request once logged in
+API.interceptors.request.use((config) => {
+  const token = localStorage.getItem("admin_token");
+  if (token) {
+    config.headers.Authorization = `Bearer ${token}`;
+  }
+  return config;
+});
+
+// Access tokens are short-lived: on a 401, swap the refresh token for a
+// new pair once and replay the request
+let refreshing = null;
+
+API.interceptors.response.use(
+  (response) => response,
+  async (error) => {
+    const original = error.config;
+    const refreshToken = localStorage.getItem("admin_refresh_token");
+
+    if (
+      error.response?.status !== 401 ||
+      !refreshToken ||
+      original._retried ||
+      original.url === "/auth/refresh"
+    ) {
+      throw error;
+    }
+    original._retried = true;
+
+    try {
+      if (!refreshing) {
+        const formData = new FormData();
+        formData.append("refresh_token", refreshToken);
+        refreshing = API.post("/auth/refresh", formData).finally(() => {
+          refreshing = null;
+        });
+      }
+      const res = await refreshing;
+      localStorage.setItem("admin_token", res.data.access_token);
+      localStorage.setItem("admin_refresh_token", res.data.refresh_token);
+    } catch {
+      localStorage.removeItem("admin_token");
+      localStorage.removeItem("admin_refresh_token");
+      throw error;
+    }
+
+    return API(original);
+  }
+);
+
 export default API;
@@ -102,8 +102,16 @@ const AdminDashboard = ({ newsEvents, setNewsEvents, careers, setCareers }) => {
   // =========================
   // LOGOUT
   // =========================
-  const handleLogout = () => {
+  const handleLogout = async () => {
+    try {
+      const formData = new FormData();
+      formData.append("refresh_token", localStorage.getItem("admin_refresh_token") || "");
+      await API.post("/auth/logout", formData);
+    } catch (err) {
+      console.error("Logout error:", err);
+    }
     localStorage.removeItem("admin_token");
+    localStorage.removeItem("admin_refresh_token");
     window.location.href = "/";
   };
 
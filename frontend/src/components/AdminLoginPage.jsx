@@ -18,6 +18,7 @@ const AdminLoginPage = ({ setCurrentPage }) => {
 
       const res = await API.post("/auth/login", formData);
       localStorage.setItem("admin_token", res.data.access_token);
+      localStorage.setItem("admin_refresh_token", res.data.refresh_token);
 
       setCurrentPage("admin-dashboard");
     } catch {